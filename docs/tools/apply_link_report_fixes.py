@@ -1,46 +1,76 @@
 #!/usr/bin/env python3
 """
-Apply fixes listed in docs/BROKEN_LINKS_REPORT.md.
+Apply fixes listed in the report of find_and_remove_broken_links.py.
 
 Behavior:
 - Reads the report and for each entry replaces the markdown link in the listed source
   file with plain text and a short note (e.g. "[BROKEN-LINK: href]").
+- By default the JSON report (.cache/broken_links.jsonl in the repository root) is read. It
+  gives the offset of every broken link, so exactly the reported links are rewritten, in one
+  pass over each page. An entry whose offset no longer holds a link to its href is stale: it is
+  skipped, never matched by href instead. --report docs/BROKEN_LINKS_REPORT.md reads the
+  Markdown report instead, e.g. after editing it by hand; its links are matched by href (never
+  by their text alone).
 - Skips mailto: links by default. Use --remove-mailto to also replace mailto links.
 - If a mapping JSON file is provided (--map map.json) it will update links to the
-  provided new href instead of removing them.
+  provided new href instead of removing them. Besides exact pairs the mapping may hold prefix
+  and regex rules (see scripts/linkrewrite.py, which applies a mapping to every link of the
+  docs, reported broken or not).
 
-Backups are stored under docs/.link_check_backups with timestamped suffixes.
+Each patched page is backed up first in the shared backup store (see scripts/backupstore.py).
+
+With --changed-since REF or --staged only report entries for files git reports as changed (or
+whose links point at a page the change added or deleted) are applied; see scripts/gitselect.py.
+--profile [REPORT] writes a JSON run report with per-file timings (see scripts/runprofile.py).
 
 Usage examples:
   python docs/tools/apply_link_report_fixes.py
   python docs/tools/apply_link_report_fixes.py --remove-mailto
   python docs/tools/apply_link_report_fixes.py --map mymap.json
+  python docs/tools/apply_link_report_fixes.py --report docs/BROKEN_LINKS_REPORT.md
+  python docs/tools/apply_link_report_fixes.py --changed-since origin/master
 
 """
 from __future__ import annotations
 
 import argparse
+import collections
 import json
 import re
-import shutil
-from datetime import datetime
+import sys
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 MD_ROOT = Path(__file__).parents[1]
 REPORT = MD_ROOT / "BROKEN_LINKS_REPORT.md"
-BACKUP_DIR = MD_ROOT / ".link_check_backups"
-LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+# what find_and_remove_broken_links.py appends to an href in the Markdown report's notes
+NOTE_RE = re.compile(r" \((?:malformed|missing anchor|HTTP \d+|external check failed: .*)\)$")
+AUTH_RE = re.compile(r"HTTP (?:Error )?40[13]\b")
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "scripts"))
+import atomicio  # noqa: E402
+import backupstore  # noqa: E402
+import gitselect  # noqa: E402
+import linkgraph  # noqa: E402
+import linkrewrite  # noqa: E402
+import runprofile  # noqa: E402
+
+import find_and_remove_broken_links  # noqa: E402
 
+REPORT_JSON = find_and_remove_broken_links.REPORT_JSON
+# text, href and note of a reported link; offset (where the link starts) and kind (see
+# linkgraph.py) only come with a JSON report
+ReportEntry = collections.namedtuple("ReportEntry", "text href note offset kind", defaults=(None, None))
 
-def parse_report() -> Dict[Path, List[Tuple[str, str, str]]]:
-    # returns mapping: file -> list of (link_text, href, raw_note)
-    if not REPORT.exists():
-        raise SystemExit(f"Report not found: {REPORT}")
-    content = REPORT.read_text(encoding="utf-8")
+
+def parse_report(path: Path = REPORT) -> Dict[Path, List[ReportEntry]]:
+    """Entries of the human-readable report (no positions), per file."""
+    if not path.exists():
+        raise SystemExit(f"Report not found: {path}")
+    content = path.read_text(encoding="utf-8")
     lines = content.splitlines()
     cur_file = None
-    out: Dict[Path, List[Tuple[str, str, str]]] = {}
+    out: Dict[Path, List[ReportEntry]] = {}
     entry_re = re.compile(r"- Link text: `([^`]+)` — href: `([^`]+)` — (.*)")
     file_re = re.compile(r"##\s+(.*)")
     for ln in lines:
@@ -51,88 +81,166 @@ def parse_report() -> Dict[Path, List[Tuple[str, str, str]]]:
             continue
         m = entry_re.match(ln)
         if m and cur_file is not None:
-            txt = m.group(1)
-            href = m.group(2)
-            note = m.group(3)
-            out[cur_file].append((txt, href, note))
+            note = m.group(2)
+            # the report shows the href with the reason appended, e.g. "page.md#x (missing anchor)"
+            href = NOTE_RE.sub("", note)
+            if href.startswith("<") and href.endswith(">"):
+                href = href[1:-1]
+            out[cur_file].append(ReportEntry(m.group(1), href, note))
     return out
 
 
-def backup_file(path: Path) -> Path:
-    rel = path.relative_to(MD_ROOT)
-    dst = BACKUP_DIR / rel
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    backup = dst.with_suffix(dst.suffix + f".bak.{ts}")
-    shutil.copy2(path, backup)
-    return backup
+def load_json_report(path: Path) -> Dict[Path, List[ReportEntry]]:
+    """Entries of a JSON (.json) or JSON Lines (.jsonl) report by find_and_remove_broken_links.py,
+    per file."""
+    if not path.exists():
+        raise SystemExit(f"Report not found: {path}")
+    content = path.read_text(encoding="utf-8")
+    if path.suffix == ".jsonl":
+        records = [json.loads(ln) for ln in content.splitlines() if ln.strip()]
+    else:
+        records = json.loads(content)["links"]
+    out: Dict[Path, List[ReportEntry]] = {}
+    for r in records:
+        entry = ReportEntry(r["text"], r["href"], r.get("note", r["href"]), r.get("offset"), r.get("kind"))
+        out.setdefault((MD_ROOT / r["file"]).resolve(), []).append(entry)
+    return out
 
 
-def apply_changes(report_map: Dict[Path, List[Tuple[str, str, str]]], remove_mailto: bool, mapping: Dict[str, str]) -> None:
-    for md_file, entries in report_map.items():
-        if not md_file.exists():
-            print(f"Warning: source file not found: {md_file}")
+def load_report(path: Optional[Path]) -> Dict[Path, List[ReportEntry]]:
+    """The report at path (JSON if it ends in .json/.jsonl); by default the JSON report."""
+    if path is None:
+        if not REPORT_JSON.exists():
+            raise SystemExit(f"Report not found: {REPORT_JSON} (run find_and_remove_broken_links.py, "
+                             f"or pass --report {REPORT} for the Markdown report)")
+        path = REPORT_JSON
+    if path.suffix in (".json", ".jsonl"):
+        return load_json_report(path)
+    return parse_report(path)
+
+
+def backup_file(path: Path, text: str) -> str:
+    """Back up path's current text; return a short reference to the backup."""
+    return backupstore.describe(backupstore.backup(path, text, "apply_link_report_fixes"))
+
+
+def index_entries(entries: List[ReportEntry]) -> Tuple[Dict[int, ReportEntry], Dict[str, ReportEntry]]:
+    """(offset -> entry, href -> entry) for one file's report entries: entries with a position
+    are only found by it, the others by href."""
+    by_offset: Dict[int, ReportEntry] = {}
+    by_href: Dict[str, ReportEntry] = {}
+    for e in entries:
+        if e.offset is not None:
+            by_offset[e.offset] = e
+        else:
+            by_href.setdefault(e.href, e)
+    return by_offset, by_href
+
+
+def replacement(m: re.Match, entry: ReportEntry, remove_mailto: bool, mapping: Optional[linkrewrite.Rewriter]) -> Optional[str]:
+    """What the inline link m that entry reports becomes, or None to keep it."""
+    bang, txt, href = m.group(1), m.group(2).strip(), entry.href
+    # if a mapping rule matches, update
+    hit = mapping.rewrite(href) if mapping is not None else None
+    if hit is not None:
+        return f"{bang}[{m.group(2)}]({hit[1]})"
+    # mailto handling
+    if href.startswith("mailto:") and not remove_mailto:
+        return None
+    # if note indicates 401/403, mark requires auth
+    if AUTH_RE.search(entry.note):
+        return f"{txt} (link requires authentication: {href})"
+    # default: replace with plain text and BROKEN-LINK marker
+    return f"{txt} [BROKEN-LINK: {href}]"
+
+
+def apply_file(md_file: Path, entries: List[ReportEntry], remove_mailto: bool, mapping: Optional[linkrewrite.Rewriter]) -> bool:
+    """Apply the report entries for one file; return True if it was patched.
+
+    A link is fixed when the entry's offset is where a link to the entry's href starts; entries
+    from a report without positions match the links with the same href. An entry whose offset
+    holds no such link any more (the page changed since the report) is skipped and counted.
+    Only inline links and images can be rewritten (the report also lists reference, autolink
+    and HTML links, to fix by hand)."""
+    if not md_file.exists():
+        print(f"Warning: source file not found: {md_file}")
+        return False
+    text = atomicio.read_text(md_file)
+    by_offset, by_href = index_entries(entries)
+    starts = linkgraph.line_starts(text)
+    pieces: List[str] = []
+    pos = 0
+    found = set()
+    for link in linkgraph.extract_links(text):
+        if link.kind not in ("inline", "image"):
+            continue
+        offset = starts[link.line - 1] + link.col - 1
+        entry = by_offset.get(offset)
+        if entry is not None and entry.href == link.href.strip():
+            found.add(offset)
+        else:
+            entry = by_href.get(link.href)
+        if entry is None or offset < pos:
+            # not reported, or inside a link that was already rewritten
             continue
-        text = md_file.read_text(encoding="utf-8")
-        original = text
-
-        def repl(m: re.Match) -> str:
-            link_text = m.group(1).strip()
-            href_raw = m.group(2).strip()
-            href = href_raw
-            # find matching entry
-            matched = None
-            for (txt, h, note) in entries:
-                # allow match by href or by link text
-                if h == href or txt == link_text:
-                    matched = (txt, h, note)
-                    break
-            if not matched:
-                return m.group(0)
-            txt, h, note = matched
-            # if mapping provided, update
-            if h in mapping:
-                new_href = mapping[h]
-                return f"[{txt}]({new_href})"
-            # mailto handling
-            if href.startswith("mailto:") and not remove_mailto:
-                return m.group(0)
-            # if note indicates 401/403, mark requires auth
-            if "HTTP Error 401" in note or "HTTP Error 403" in note:
-                return f"{txt} (link requires authentication: {href})"
-            # default: replace with plain text and BROKEN-LINK marker
-            return f"{txt} [BROKEN-LINK: {href}]"
-
-        new_text = LINK_RE.sub(repl, text)
-        if new_text != original:
-            bkp = backup_file(md_file)
-            md_file.write_text(new_text, encoding="utf-8")
-            print(f"Patched {md_file} (backup: {bkp})")
-
-
-def load_mapping(path: Path) -> Dict[str, str]:
+        m = linkgraph.INLINE_RE.match(text, offset)
+        new = replacement(m, entry, remove_mailto, mapping) if m else None
+        if new is not None:
+            pieces += [text[pos:offset], new]
+            pos = m.end()
+    stale = sum(1 for offset, e in by_offset.items() if offset not in found and e.kind in ("inline", "image"))
+    if stale:
+        print(f"Warning: {md_file}: {stale} report entries no longer match the page, skipped "
+              "(re-run find_and_remove_broken_links.py)")
+    if not pieces:
+        return False
+    new_text = "".join(pieces) + text[pos:]
+    bkp = backup_file(md_file, text)
+    atomicio.write_text(md_file, new_text, original=text)
+    print(f"Patched {md_file} (backup: {bkp})")
+    return True
+
+
+def apply_changes(report_map: Dict[Path, List[ReportEntry]], remove_mailto: bool, mapping: Optional[linkrewrite.Rewriter]) -> None:
+    for md_file, entries in report_map.items():
+        with runprofile.file_timer(md_file) as entry:
+            entry["changed"] = apply_file(md_file, entries, remove_mailto, mapping)
+
+
+def load_mapping(path: Path) -> linkrewrite.Rewriter:
+    """The rules of a mapping file (exact, prefix and regex, see scripts/linkrewrite.py)."""
     if not path.exists():
         raise SystemExit(f"Mapping file not found: {path}")
-    data = json.loads(path.read_text(encoding="utf-8"))
-    return {k: v for k, v in data.items()}
+    return linkrewrite.Rewriter(linkrewrite.load_rules(path))
 
 
 def main() -> None:
     p = argparse.ArgumentParser(description="Apply fixes from BROKEN_LINKS_REPORT.md")
+    p.add_argument("--report", type=str,
+                   help=f"Report to apply: JSON (.json/.jsonl) or Markdown (default: {REPORT_JSON})")
     p.add_argument("--remove-mailto", action="store_true", help="Also remove mailto links listed in the report")
-    p.add_argument("--map", type=str, help="JSON file mapping old_href -> new_href to update links instead of removing")
+    p.add_argument("--map", type=str,
+                   help="JSON file of old_href -> new_href rules (exact, prefix or regex) to update links instead of removing")
+    gitselect.add_git_args(p)
+    runprofile.add_profile_args(p, "apply_link_report_fixes")
     args = p.parse_args()
+    runprofile.start(args, "apply_link_report_fixes", [(sys.modules[__name__], ("load_report", "apply_file"), "links.")])
 
-    mapping = {}
+    mapping = None
     if args.map:
         mapping = load_mapping(Path(args.map))
 
-    report_map = parse_report()
+    report_map = load_report(Path(args.report) if args.report else None)
+    selection = gitselect.from_args(args, [str(MD_ROOT)])
+    if selection is not None:
+        scope = selection.link_scope([str(MD_ROOT)])
+        report_map = {md: entries for md, entries in report_map.items() if str(md) in scope}
     if not any(report_map.values()):
         print("No entries found in report. Nothing to do.")
+        runprofile.finish(args)
         return
-    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
     apply_changes(report_map, args.remove_mailto, mapping)
+    runprofile.finish(args)
 
 
 if __name__ == "__main__":
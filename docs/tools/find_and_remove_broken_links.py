@@ -4,33 +4,74 @@ Scan Markdown files under docs/ for broken links and optionally remove them.
 
 Behavior:
 - By default, scans and writes a report to docs/BROKEN_LINKS_REPORT.md but does not modify files.
-- Use --remove to backup and modify files (backups stored in --backup-dir).
-- External links (http/https/mailto) are not checked unless --check-externals is provided.
+- Use --remove to backup and modify files (backups go to the shared store in --backup-dir, see
+  scripts/backupstore.py).
+- Every kind of link counts: inline and image links, reference links ([text][ref] with a
+  `[ref]: href` definition), autolinks (<https://...>) and HTML <a href>; links in code do not
+  (see scripts/linkgraph.py). The links of each page are kept in the link graph
+  (.cache/linkgraph.json), so only pages that changed since the last run are parsed again.
+- Links to a section (page.md#section, or #section on the same page) must name an anchor the page
+  really has: a heading's toc ID, an explicit {#id} or an HTML id (see scripts/anchors.py).
+- External links (http/https) are not checked unless --check-externals is provided. Each unique URL
+  is then checked once, concurrently, with per-host limits, a per-request --timeout and a --deadline
+  for all of them (see scripts/linkcheck.py), and the result applies to every occurrence.
+  Results are kept in a link status cache (.cache/links.sqlite, see scripts/linkcache.py): links
+  checked recently are not checked again. --max-age overrides how long results stay fresh,
+  --refresh re-checks everything and --offline checks nothing, using cached results of any age.
+- With --changed-since REF or --staged only the Markdown files git reports as changed are scanned,
+  plus the files whose relative links point at a page the change added or deleted (see
+  scripts/gitselect.py). --check prints the broken links instead of writing the report and exits
+  with status 1 if there are any; scripts/pre-commit.sh runs it with --staged.
+- --profile [REPORT] times every file and link check and writes a JSON run report
+  (see scripts/runprofile.py).
 
 This script intentionally avoids network checks by default to be safe in restricted
 environments. It focuses on local relative links and obvious malformed URLs.
 
 Usage:
   python docs/tools/find_and_remove_broken_links.py [--remove] [--backup-dir BACKUP] [--check-externals]
+  python docs/tools/find_and_remove_broken_links.py --check-externals --per-host 2 --deadline 300
+  python docs/tools/find_and_remove_broken_links.py --check-externals --offline --changed-since origin/master --check
+  python docs/tools/find_and_remove_broken_links.py --changed-since origin/master --check
 
 Output:
 - docs/BROKEN_LINKS_REPORT.md : human-readable report with notes and suggested fixes.
+- .cache/broken_links.jsonl : the same links for apply_link_report_fixes.py, one JSON object per
+  link with its file, line, column, offset, href, text, kind and reason (--json-report PATH
+  writes it elsewhere, as a single JSON document if PATH ends in .json). It is kept in the
+  repository root wherever the script is run from.
 
 """
 from __future__ import annotations
 
 import argparse
-import shutil
-import re
+import collections
+import json
+import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Set
 
 MD_ROOT = Path(__file__).parents[1]  # docs/
 REPORT_PATH = MD_ROOT / "BROKEN_LINKS_REPORT.md"
-BACKUP_DEFAULT = MD_ROOT / ".link_check_backups"
+# machine-readable report with the position of every broken link (see write_json_report())
+REPORT_JSON = Path(__file__).parents[2] / ".cache" / "broken_links.jsonl"
 
-LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+sys.path.insert(0, str(Path(__file__).parents[2] / "scripts"))
+import anchors  # noqa: E402
+import atomicio  # noqa: E402
+import backupstore  # noqa: E402
+import gitselect  # noqa: E402
+import linkcache  # noqa: E402
+import linkcheck  # noqa: E402
+import linkgraph  # noqa: E402
+import runprofile  # noqa: E402
+
+
+# One broken link: its text, the note the report shows, the href, where it starts in its page
+# (1-based line and column, 0-based character offset), the linkgraph kind of link and why it is
+# broken: malformed, missing, missing-anchor, or the linkcheck kind of a failed external check.
+BrokenLink = collections.namedtuple("BrokenLink", "text note href line col offset kind reason")
 
 
 def normalize_href(href: str) -> str:
@@ -57,123 +98,248 @@ def resolve_local_target(md_file: Path, href: str) -> Path:
     return (md_file.parent / href_path).resolve()
 
 
-def scan_docs(check_externals: bool = False) -> Dict[Path, List[Tuple[str, str]]]:
-    """Return mapping: md_file -> list of (link_text, href, reason) for broken/malformed links."""
-    broken: Dict[Path, List[Tuple[str, str]]] = {}
-    for md in MD_ROOT.rglob("*.md"):
-        try:
-            text = md.read_text(encoding="utf-8")
-        except Exception:
+def check_external(href: str) -> Optional[str]:
+    """Check one external link; return the broken-link note, or None if it is fine."""
+    result = linkcheck.check_urls([href]).get(href)
+    return result.note if result is not None and result.broken else None
+
+
+def external_urls(texts: Iterable[str]) -> Set[str]:
+    """The unique external hrefs linked from the given page texts."""
+    return {link.href for text in texts for link in linkgraph.extract_links(text) if is_external(link.href)}
+
+
+def scan_file(md: Path, text: str, check_externals: bool = False,
+              external: Optional[Dict[str, "linkcheck.Result"]] = None,
+              anchor_index: Optional[anchors.AnchorIndex] = None,
+              links: Optional[List["linkgraph.Link"]] = None) -> List[BrokenLink]:
+    """Return the BrokenLink entries for the broken/malformed links in one file.
+
+    external holds the results of checking the external links (see scan_docs()); with
+    check_externals and no results, each external link is checked on its own. With an
+    anchor_index, #fragments of links to pages (and to md itself) must name an anchor there.
+    links are md's links from the link graph; by default they are extracted from text."""
+    entries: List[BrokenLink] = []
+    starts: List[int] = []
+
+    def add(link: "linkgraph.Link", href: str, note: str, reason: str) -> None:
+        if not starts:
+            starts.extend(linkgraph.line_starts(text))
+        offset = starts[link.line - 1] + link.col - 1
+        entries.append(BrokenLink(link.text, note, href, link.line, link.col, offset, link.kind, reason))
+
+    for link in (linkgraph.extract_links(text) if links is None else links):
+        href = normalize_href(link.href)
+
+        # Obvious malformed
+        if href == "" or href in ("http://", "https://", "http://)"):
+            add(link, href, href + " (malformed)", "malformed")
             continue
-        for m in LINK_RE.finditer(text):
-            txt = m.group(1).strip()
-            href_raw = m.group(2).strip()
-            href = normalize_href(href_raw)
-
-            # Obvious malformed
-            if href == "" or href in ("http://", "https://", "http://)"):
-                reason = "malformed or empty URL"
-                broken.setdefault(md, []).append((txt, href + " (malformed)"))
-                continue
 
-            if is_external(href):
-                if check_externals:
-                    # Try a HEAD request if user asked for external checks.
-                    # We avoid adding third-party deps; use urllib with timeout.
-                    import urllib.request
-
-                    try:
-                        req = urllib.request.Request(href, method="HEAD")
-                        with urllib.request.urlopen(req, timeout=5) as resp:
-                            code = resp.getcode()
-                        if code >= 400:
-                            broken.setdefault(md, []).append((txt, f"{href} (HTTP {code})"))
-                    except Exception as e:
-                        broken.setdefault(md, []).append((txt, f"{href} (external check failed: {e})"))
+        if is_external(href):
+            if check_externals and linkcheck.is_checkable(href):
+                if external is not None and href in external:
+                    if external[href].broken:
+                        add(link, href, external[href].note, external[href].kind)
                 else:
-                    # Mark as external - not checked. Not considered broken for automatic removal.
-                    continue
-            else:
-                target = resolve_local_target(md, href)
-                if not target or not target.exists():
-                    broken.setdefault(md, []).append((txt, href))
-
+                    note = check_external(href)
+                    if note:
+                        add(link, href, note, "external")
+            # Otherwise external links are not checked and not considered broken for automatic removal.
+        else:
+            target = resolve_local_target(md, href)
+            if not target or not target.exists():
+                add(link, href, href, "missing")
+            elif anchor_index is not None and "#" in href:
+                page = md if href.startswith("#") else target
+                _path, fragment = anchors.split_fragment(href)
+                if fragment and (page.suffix == ".md" or page.is_dir()) and not anchor_index.has_anchor(page, fragment):
+                    add(link, href, f"{href} (missing anchor)", "missing-anchor")
+    return entries
+
+
+def scan_docs(check_externals: bool = False, files: Optional[Iterable[Path]] = None,
+              check_options: Optional[dict] = None, link_cache: Optional[linkcache.LinkCache] = None,
+              cache_options: Optional[dict] = None) -> Dict[Path, List[BrokenLink]]:
+    """Return mapping: md_file -> list of (link_text, href) for broken/malformed links.
+
+    files limits the scan to the given Markdown files (default: every file under docs/). With
+    check_externals every unique external URL is checked once, concurrently, before the pages
+    are scanned; check_options are passed on to linkcheck.check_urls(). With a link_cache only
+    the URLs without a fresh cached result are checked (cache_options: max_age, refresh and
+    offline, see linkcache.check_urls())."""
+    texts: Dict[Path, str] = {}
+    for md in (MD_ROOT.rglob("*.md") if files is None else files):
+        try:
+            texts[md] = atomicio.read_text(md)
+        except Exception:
+            continue
+    external = None
+    if check_externals:
+        urls = external_urls(texts.values())
+        print(f"Checking {len(urls)} unique external URLs")
+        if link_cache is not None:
+            external, stats = linkcache.check_urls(urls, link_cache, **(cache_options or {}), **(check_options or {}))
+            print(f"Link cache: {stats['cached']} cached, {stats['checked']} checked, {stats['uncached']} not cached")
+        else:
+            external = linkcheck.check_urls(urls, **(check_options or {}))
+        counts = collections.Counter(r.kind for r in external.values())
+        print("External links: " + (", ".join(f"{k} {counts[k]}" for k in linkcheck.KINDS if counts[k]) or "none"))
+    anchor_index = anchors.AnchorIndex()
+    graph = linkgraph.LinkGraph(str(MD_ROOT))
+    graph.update(None if files is None else [str(md) for md in texts])
+    broken: Dict[Path, List[BrokenLink]] = {}
+    for md, text in texts.items():
+        with runprofile.file_timer(md):
+            links = graph.links(str(md.absolute()))
+            entries = scan_file(md, text, check_externals, external, anchor_index, links or None)
+        if entries:
+            broken[md] = entries
+    anchor_index.save()
+    graph.save()
     return broken
 
 
-def make_backup(md: Path, backup_dir: Path) -> Path:
-    rel = md.relative_to(MD_ROOT)
-    dst = backup_dir / rel
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    backup_path = dst.with_suffix(dst.suffix + f".bak.{ts}")
-    shutil.copy2(md, backup_path)
-    return backup_path
+def make_backup(md: Path, text: str, backup_dir: Path) -> str:
+    """Back up md's current text in the backup store at backup_dir; return a short reference."""
+    entry = backupstore.backup(md, text, "find_and_remove_broken_links", str(backup_dir))
+    return backupstore.describe(entry)
+
 
+def remove_broken_links(broken_map: Dict[Path, List[BrokenLink]], backup_dir: Path) -> None:
+    """Replace each reported inline link or image by its text and a [BROKEN-LINK: href] marker.
 
-def remove_broken_links(broken_map: Dict[Path, List[Tuple[str, str]]], backup_dir: Path) -> None:
+    A link is only replaced when it starts at the offset of an entry with the same href, so a
+    valid link next to a broken one to the same page is kept. Reference, autolink and HTML links
+    cannot be rewritten this way and are left to fix by hand."""
     for md, entries in broken_map.items():
-        text = md.read_text(encoding="utf-8")
-        # Build a set of hrefs to treat as broken in this file for quick checks
-        broken_hrefs = {e[1] for e in entries}
-
-        def repl(m: re.Match) -> str:
-            txt = m.group(1).strip()
-            href_raw = m.group(2).strip()
-            href = normalize_href(href_raw)
-            tag = href
-            # For entries marked with '(malformed)' we keep original
-            if any(href in bh or (href + " (malformed)") in bh for bh in broken_hrefs):
-                # Replace the markdown link with plain text and append a note
-                return f"{txt} [BROKEN-LINK: {href}]"
-            return m.group(0)
-
-        # backup
-        backup_path = make_backup(md, backup_dir)
-        new_text = LINK_RE.sub(repl, text)
-        if new_text != text:
-            md.write_text(new_text, encoding="utf-8")
-            print(f"Patched {md} (backup: {backup_path})")
-
-
-def write_report(broken_map: Dict[Path, List[Tuple[str, str]]]) -> None:
+        text = atomicio.read_text(md)
+        broken = {(e.offset, e.href) for e in entries}
+        starts = linkgraph.line_starts(text)
+        pieces: List[str] = []
+        pos = 0
+        for link in linkgraph.extract_links(text):
+            if link.kind not in ("inline", "image"):
+                continue
+            offset = starts[link.line - 1] + link.col - 1
+            href = normalize_href(link.href)
+            if (offset, href) not in broken or offset < pos:
+                continue
+            m = linkgraph.INLINE_RE.match(text, offset)
+            if m:
+                pieces += [text[pos:offset], f"{m.group(2).strip()} [BROKEN-LINK: {href}]"]
+                pos = m.end()
+        skipped = sum(1 for e in entries if e.kind not in ("inline", "image"))
+        if skipped:
+            print(f"{md}: {skipped} reference, autolink or HTML links left to fix by hand")
+        if not pieces:
+            continue
+        new_text = "".join(pieces) + text[pos:]
+        # backup only the pages that are about to change
+        backup_path = make_backup(md, text, backup_dir)
+        atomicio.write_text(md, new_text, original=text)
+        print(f"Patched {md} (backup: {backup_path})")
+
+
+def write_report(broken_map: Dict[Path, List[BrokenLink]]) -> None:
     lines: List[str] = []
     lines.append("# Broken Links Report\n")
     lines.append(f"Generated: {datetime.utcnow().isoformat()}Z\n")
     if not broken_map:
         lines.append("No broken local links detected (external links were not checked).\n")
-        REPORT_PATH.write_text("\n".join(lines), encoding="utf-8")
+        atomicio.write_text(REPORT_PATH, "\n".join(lines))
         print(f"Wrote report: {REPORT_PATH}")
         return
 
     for md, entries in sorted(broken_map.items()):
         rel = md.relative_to(MD_ROOT)
         lines.append(f"## {rel}\n")
-        for txt, href in entries:
+        for e in entries:
             suggestion = "Check target path or update to correct URL. If external, run script with --check-externals to test HTTP status."
-            lines.append(f"- Link text: `{txt}` — href: `{href}` — {suggestion}\n")
+            lines.append(f"- Link text: `{e.text}` — href: `{e.note}` — {suggestion}\n")
 
-    REPORT_PATH.write_text("\n".join(lines), encoding="utf-8")
+    atomicio.write_text(REPORT_PATH, "\n".join(lines))
     print(f"Wrote report: {REPORT_PATH}")
 
 
+def write_json_report(broken_map: Dict[Path, List[BrokenLink]], path: Path) -> None:
+    """Write the broken links for apply_link_report_fixes.py: one JSON object per link with its
+    file (relative to docs/), line, column, offset, href, text, kind, reason and note. A .jsonl
+    path gets JSON Lines, any other a single {"generated": ..., "links": [...]} document."""
+    records = [{"file": md.relative_to(MD_ROOT).as_posix(), "line": e.line, "column": e.col, "offset": e.offset,
+                "href": e.href, "text": e.text, "kind": e.kind, "reason": e.reason, "note": e.note}
+               for md, entries in sorted(broken_map.items()) for e in entries]
+    if path.suffix == ".jsonl":
+        content = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+    else:
+        content = json.dumps({"generated": datetime.utcnow().isoformat() + "Z", "links": records},
+                             ensure_ascii=False, indent=1) + "\n"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomicio.write_text(path, content)
+    print(f"Wrote {len(records)} entries to: {path}")
+
+
 def main() -> None:
     p = argparse.ArgumentParser(description="Find and optionally remove broken links in docs/")
     p.add_argument("--remove", action="store_true", help="Backup and remove/replace broken links in-place")
-    p.add_argument("--backup-dir", default=str(BACKUP_DEFAULT), help="Directory to store backups when --remove is used")
-    p.add_argument("--check-externals", action="store_true", help="Attempt HTTP HEAD checks for external links (slow/network required)")
+    p.add_argument("--backup-dir", default=backupstore.DEFAULT_STORE,
+                   help=f"Backup store used when --remove is used (default: {backupstore.DEFAULT_STORE})")
+    p.add_argument("--check-externals", action="store_true", help="Check external links over HTTP (network required)")
+    p.add_argument("--per-host", type=int, default=linkcheck.PER_HOST,
+                   help=f"With --check-externals, requests in flight per host at most (default: {linkcheck.PER_HOST})")
+    p.add_argument("--workers", type=int, default=linkcheck.WORKERS,
+                   help=f"With --check-externals, requests in flight at most (default: {linkcheck.WORKERS})")
+    p.add_argument("--timeout", type=float, default=linkcheck.TIMEOUT,
+                   help=f"With --check-externals, seconds per request (default: {linkcheck.TIMEOUT:g})")
+    p.add_argument("--deadline", type=float, default=linkcheck.DEADLINE,
+                   help=f"With --check-externals, seconds for all external checks; 0 for none (default: {linkcheck.DEADLINE:g})")
+    p.add_argument("--check", action="store_true", help="Print broken links instead of writing the report; exit with status 1 if any")
+    p.add_argument("--json-report", metavar="PATH",
+                   help=f"Also write the broken links as JSON (.json) or JSON Lines (.jsonl) for apply_link_report_fixes.py "
+                        f"(default: {REPORT_JSON}; with --check only when given)")
+    linkcache.add_cache_args(p)
+    gitselect.add_git_args(p)
+    runprofile.add_profile_args(p, "find_and_remove_broken_links")
     args = p.parse_args()
+    runprofile.start(args, "find_and_remove_broken_links",
+                     [(sys.modules[__name__], ("scan_file", "check_external", "resolve_local_target"), "links."),
+                      (linkcheck, linkcheck.PROFILED, "linkcheck.")])
 
     backup_dir = Path(args.backup_dir)
-    if args.remove:
-        backup_dir.mkdir(parents=True, exist_ok=True)
 
-    print("Scanning markdown files under:", MD_ROOT)
-    broken = scan_docs(check_externals=args.check_externals)
+    selection = gitselect.from_args(args, [str(MD_ROOT)])
+    files = None
+    if selection is not None:
+        files = [Path(f) for f in sorted(selection.link_scope([str(MD_ROOT)]))]
+        print(f"Scanning {len(files)} changed or affected markdown files under:", MD_ROOT)
+    else:
+        print("Scanning markdown files under:", MD_ROOT)
+    check_options = {"workers": args.workers, "per_host": args.per_host, "timeout": args.timeout,
+                     "deadline": args.deadline}
+    cache_options = {"max_age": args.max_age, "refresh": args.refresh, "offline": args.offline}
+    link_cache = None
+    if args.check_externals and args.link_cache != "none":
+        link_cache = linkcache.LinkCache(args.link_cache)
+    try:
+        broken = scan_docs(check_externals=args.check_externals, files=files, check_options=check_options,
+                           link_cache=link_cache, cache_options=cache_options)
+    finally:
+        if link_cache is not None:
+            link_cache.close()
+    if args.check:
+        for md, entries in sorted(broken.items()):
+            for e in entries:
+                print(f"{md.relative_to(MD_ROOT)}: broken link `{e.text}` -> {e.note}")
+        if args.json_report:
+            write_json_report(broken, Path(args.json_report))
+        runprofile.finish(args)
+        sys.exit(1 if broken else 0)
     write_report(broken)
+    write_json_report(broken, Path(args.json_report or REPORT_JSON))
 
     if args.remove and broken:
         remove_broken_links(broken, backup_dir)
+    runprofile.finish(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Fix the indentation of mkdocs admonition bodies and of the fences nested in them.
+
+All the admonition fixers use this one engine. It replaces five detection schemes: a linear scan
+over every admonition for each fence, an 8-line lookback for '!!!', a 10-line lookback for
+preformatted context, and hard-coded line edits. The nesting tree (admonitions, list items and
+the fences inside them) comes from the shared block model (mdblocks.py), which builds it once per
+file. Every block records its innermost container, so the target indent of each fence is known
+in one walk over the blocks, and the whole file costs time linear in its length.
+
+Policies:
+
+  conservative  Dedent over-indented backtick fences to one level (4 spaces) inside their
+                innermost admonition or list item, or to column 0 at the top level. Only fences
+                indented more than 4 spaces are touched. A fence whose previous non-blank line is
+                an indented non-list line sits in a preformatted block and goes to column 0. The
+                fence's content moves with it. This is the docsfix 'admonition-indent' rule.
+  aggressive    Everything conservative does, without the 4-space floor and the preformatted
+                special case. Also, an admonition with an empty body takes the paragraph that
+                follows its header (directly or after one blank line) into its body by indenting
+                it, unless the header line itself carries body text. With until_boundary, it takes
+                every paragraph, quote and HTML block up to the next heading, rule, list,
+                admonition or fence at its own level, as fix_admonition_indent.py always has.
+
+Usage (library):
+    new_text, changes = admonitions.fix_text(text, policy='conservative')
+    new_text, changes = admonitions.fix_text(text, policy='aggressive', until_boundary=True)
+"""
+
+import re
+
+import mdblocks
+
+CONSERVATIVE, AGGRESSIVE = 'conservative', 'aggressive'
+POLICIES = (CONSERVATIVE, AGGRESSIVE)
+# one nesting level of an admonition or list item body
+STEP = 4
+# the passes timed separately when a fixer runs with --profile (see runprofile.py)
+PROFILED = ('plan', 'apply_plan')
+# a complete admonition header: a type and at most a quoted title. Anything else on the line is
+# body text typed onto the header, and the lines after it are that text's continuation.
+HEADER_RE = re.compile(r'^\s*(?:!!!|\?\?\?\+?)\s+[\w-]+(?:\s+"[^"]*")?\s*$')
+# the blocks an empty admonition takes into its body when adopting up to the next boundary
+ADOPTED = ('paragraph', 'quote', 'html')
+
+
+def _prev_nonblank(doc):
+    """prev[i]: index of the last non-blank line before line i, or None."""
+    prev = [None] * (len(doc.lines) + 1)
+    last = None
+    for i, info in enumerate(doc.line_info):
+        prev[i] = last
+        if info.kind != 'blank':
+            last = i
+    return prev
+
+
+def fence_target(doc, fence, policy=CONSERVATIVE, prev=None):
+    """Indent fence should have: one level inside its innermost container, 0 at the top level."""
+    container = doc.blocks[fence.parent] if fence.parent is not None else None
+    target = container.indent + STEP if container is not None else 0
+    if policy == CONSERVATIVE and target == STEP:
+        # an indented non-list line right before the fence: the fence is inside a preformatted
+        # block and has to come out to the top level to be parsed as a fence at all
+        j = prev[fence.start] if prev is not None else None
+        if j is not None and doc.lines[j].startswith(' ' * STEP) and doc.line_info[j].kind != 'list':
+            target = 0
+    return target
+
+
+def _adopted(doc, idx, until_boundary):
+    """The blocks after the empty admonition blocks[idx] that belong in its body."""
+    blocks, adm = doc.blocks, doc.blocks[idx]
+    k = idx + 1
+    if not until_boundary:
+        if k < len(blocks) and blocks[k].kind == 'blank' and blocks[k].end - blocks[k].start == 1:
+            k += 1
+        if k < len(blocks) and blocks[k].kind == 'paragraph' and blocks[k].indent <= adm.indent:
+            return [blocks[k]]
+        return []
+    adopted = []
+    while k < len(blocks):
+        b = blocks[k]
+        if b.kind != 'blank':
+            if b.kind not in ADOPTED or b.indent > adm.indent or b.parent != adm.parent:
+                break
+            adopted.append(b)
+        k += 1
+    return adopted
+
+
+def plan(doc, policy=CONSERVATIVE, until_boundary=False):
+    """Indentation edits for a document: (first line, end line, current indent, shift) tuples in
+    line order; a negative shift removes spaces, a positive one adds them. until_boundary makes
+    the aggressive policy indent everything up to the next boundary under an empty admonition,
+    not just the first paragraph."""
+    if policy not in POLICIES:
+        raise ValueError(f"unknown policy: {policy} (choose from {', '.join(POLICIES)})")
+    prev = _prev_nonblank(doc) if policy == CONSERVATIVE else None
+    edits = []
+    for idx, b in enumerate(doc.blocks):
+        if b.kind == 'fence':
+            if b.fence_char != '`' or not b.closed:
+                continue
+            target = fence_target(doc, b, policy, prev)
+            if b.indent <= target or (policy == CONSERVATIVE and b.indent <= STEP):
+                continue
+            edits.append((b.start, b.end, b.indent, target - b.indent))
+        elif b.kind == 'admonition' and policy == AGGRESSIVE and b.end == b.head_end \
+                and HEADER_RE.match(doc.lines[b.start]):
+            # nothing indented under the header: adopt what follows it
+            for para in _adopted(doc, idx, until_boundary):
+                edits.append((para.start, para.end, 0, b.indent + STEP))
+    edits.sort()
+    return edits
+
+
+def apply_plan(lines, edits):
+    """Apply plan() edits to a list of lines (with or without line endings) in place; return the
+    number of lines changed. A dedent only touches lines indented at least as far as the edit's
+    first line, so content that is less indented than its fence is left alone."""
+    changes = 0
+    for start, end, indent, shift in edits:
+        for i in range(start, end):
+            line = lines[i]
+            if shift < 0:
+                if line.startswith(' ' * indent):
+                    lines[i] = line[-shift:]
+                    changes += 1
+            elif line.strip():
+                lines[i] = ' ' * shift + line
+                changes += 1
+    return changes
+
+
+def fix_text(text, policy=CONSERVATIVE, until_boundary=False):
+    """Return (new_text, changes): text with the policy's indentation fixes applied, and the
+    number of lines changed."""
+    doc = mdblocks.parse(text)
+    edits = plan(doc, policy, until_boundary)
+    if not edits:
+        return text, 0
+    lines = text.splitlines(True)
+    changes = apply_plan(lines, edits)
+    return ''.join(lines), changes
+
+
+def line_changes(text, new_text):
+    """(line number, old, new) for every line fix_text() changed; it never adds or removes lines."""
+    return [(i + 1, old, new) for i, (old, new) in enumerate(zip(text.splitlines(), new_text.splitlines()))
+            if old != new]
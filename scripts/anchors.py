@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Index of the anchor IDs mkdocs generates for each docs page, to validate #fragment links.
+
+The link tools only checked that a link's target file exists, so a link to a section that was
+renamed or removed passed silently. AnchorIndex maps every page to the set of IDs its HTML page
+will have, so checking a fragment is one set lookup:
+
+  - headings (ATX and setext, skipping fenced code) get the ID the Python-Markdown toc extension
+    gives them: the heading's text without markup (code spans, links, images, emphasis, HTML tags
+    and entities), slugified by toc's default slugify() with the separator from mkdocs.yml, and
+    made unique with _1, _2, ... exactly like toc does for repeated headings;
+  - an explicit `{#id}` at the end of a heading (attr_list) replaces the generated ID;
+  - id="..." attributes and <a name="..."> in HTML, outside code, are IDs too.
+
+Pages are parsed once per run, with the shared block model (mdblocks.py). Across runs the IDs are
+cached in .cache/anchors.json by content hash: a page whose stat is unchanged is not even read,
+and one whose content was seen before is not parsed again.
+
+Usage (library):
+    index = anchors.AnchorIndex()
+    if not index.has_anchor('docs/perfsonar/installation.md', 'firewall'): ...
+    index.save()
+Usage (debug): python3 scripts/anchors.py docs/perfsonar/installation.md
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import unicodedata
+import urllib.parse
+
+import atomicio
+import mdblocks
+
+DEFAULT_CACHE = os.path.join('.cache', 'anchors.json')
+CACHE_VERSION = 1
+MKDOCS_YML = 'mkdocs.yml'
+# toc's default separator; mkdocs.yml may set another one
+SEPARATOR = '-'
+# pages a link to a directory resolves to (as in gitselect.py)
+INDEX_NAMES = ('index.md', 'README.md')
+
+ATTR_ID_RE = re.compile(r"\s*\{[^}]*#([\w:.-]+)[^}]*\}\s*$")
+ATTR_LIST_RE = re.compile(r"\s*\{:?[^}]*\}\s*$")
+HTML_ID_RE = re.compile(r"<[A-Za-z][^>]*?\s(?:id|name)\s*=\s*[\"']([^\"']+)[\"']")
+_CODE_RE = re.compile(r"(`+)(.+?)\1")
+_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK_RE = re.compile(r"\[([^\]]*)\](?:\([^)]*\)|\[[^\]]*\])")
+_TAG_RE = re.compile(r"</?[A-Za-z][^>]*>")
+_EMPHASIS_RE = re.compile(r"(\*{1,3}|_{1,3})(?=\S)(.+?)(?<=\S)\1")
+_IDCOUNT_RE = re.compile(r"^(.*)_([0-9]+)$")
+
+
+def slugify(value, separator=SEPARATOR):
+    """Python-Markdown's toc slugify(): ASCII-fold, drop punctuation, lowercase, join words."""
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    value = re.sub(r"[^\w\s-]", '', value).strip().lower()
+    return re.sub(r"[%s\s]+" % re.escape(separator), separator, value)
+
+
+def unique(id_, ids):
+    """toc's unique(): add _1, _2, ... until id_ is not in ids; record and return it."""
+    while id_ in ids or not id_:
+        m = _IDCOUNT_RE.match(id_)
+        id_ = f"{m.group(1)}_{int(m.group(2)) + 1}" if m else f"{id_}_1"
+    ids.add(id_)
+    return id_
+
+
+def heading_text(text):
+    """The plain text toc sees for a heading's Markdown source."""
+    spans = []
+
+    def stash(m):
+        spans.append(m.group(2).strip())
+        return f"\0{len(spans) - 1}\0"
+
+    text = _CODE_RE.sub(stash, text)
+    text = _IMAGE_RE.sub(r"\1", text)
+    text = _LINK_RE.sub(r"\1", text)
+    text = _TAG_RE.sub('', text)
+    prev = None
+    while prev != text:
+        prev, text = text, _EMPHASIS_RE.sub(r"\2", text)
+    text = re.sub(r"\\([\\`*_{}\[\]()#+\-.!])", r"\1", text)
+    text = re.sub(r"\0(\d+)\0", lambda m: spans[int(m.group(1))], text)
+    return html.unescape(text)
+
+
+def page_anchors(text, separator=SEPARATOR):
+    """The set of anchor IDs of one page's Markdown text."""
+    doc = mdblocks.parse(text)
+    ids = set()
+    for i, line in enumerate(doc.lines):
+        if '=' in line and not doc.is_code(i):
+            ids.update(HTML_ID_RE.findall(line))
+    for b in doc.iter('heading'):
+        if b.parent is None and b.indent >= 4:
+            # indented code, not a heading
+            continue
+        m = ATTR_ID_RE.search(b.info)
+        if m:
+            ids.add(m.group(1))
+            continue
+        title = ATTR_LIST_RE.sub('', b.info)
+        unique(slugify(heading_text(title), separator), ids)
+    return ids
+
+
+def toc_separator(mkdocs_yml=MKDOCS_YML):
+    """The toc separator configured in mkdocs.yml, or toc's default."""
+    try:
+        text = atomicio.read_text(mkdocs_yml)
+    except OSError:
+        return SEPARATOR
+    m = re.search(r"^\s*-?\s*toc:\s*\n((?:\s{4,}.*\n)*)", text, re.M)
+    if m:
+        sep = re.search(r"^\s*separator:\s*['\"]?([^'\"\s]+)", m.group(1), re.M)
+        if sep:
+            return sep.group(1)
+    return SEPARATOR
+
+
+def split_fragment(href):
+    """(path part, decoded fragment or '') of a link target."""
+    path, _, fragment = href.partition('#')
+    return path.split('?', 1)[0], urllib.parse.unquote(fragment)
+
+
+class AnchorIndex:
+    """Anchor IDs per page, computed once per page and cached by content hash. Call save() to
+    persist the cache."""
+
+    def __init__(self, cache_path=DEFAULT_CACHE, separator=None):
+        self.cache_path = cache_path
+        self.separator = toc_separator() if separator is None else separator
+        self._pages = {}
+        self._dirty = False
+        self._data = {'version': CACHE_VERSION, 'separator': self.separator, 'files': {}, 'digests': {}}
+        if cache_path:
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as fh:
+                    data = json.load(fh)
+                if data.get('version') == CACHE_VERSION and data.get('separator') == self.separator:
+                    self._data = data
+            except (OSError, ValueError):
+                pass
+        # path -> [mtime_ns, size, digest]; digest -> sorted anchor IDs
+        self._files = self._data['files']
+        self._digests = self._data['digests']
+
+    def anchors(self, path):
+        """The anchor IDs of the page at path (a directory means its index page); empty if there
+        is no such page."""
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for name in INDEX_NAMES:
+                if os.path.isfile(os.path.join(path, name)):
+                    path = os.path.join(path, name)
+                    break
+        if path in self._pages:
+            return self._pages[path]
+        ids = self._load(path)
+        self._pages[path] = ids
+        return ids
+
+    def _load(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return frozenset()
+        entry = self._files.get(path)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size and entry[2] in self._digests:
+            return frozenset(self._digests[entry[2]])
+        try:
+            text = atomicio.read_text(path, errors='replace')
+        except OSError:
+            return frozenset()
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        if digest not in self._digests:
+            self._digests[digest] = sorted(page_anchors(text, self.separator))
+        self._files[path] = [st.st_mtime_ns, st.st_size, digest]
+        self._dirty = True
+        return frozenset(self._digests[digest])
+
+    def has_anchor(self, path, fragment):
+        return fragment in self.anchors(path)
+
+    def save(self):
+        if not self._dirty or not self.cache_path:
+            return
+        # drop pages that are gone and anchor sets no page refers to any more
+        for path in [p for p in self._files if not os.path.exists(p)]:
+            del self._files[path]
+        live = {entry[2] for entry in self._files.values()}
+        for d in [d for d in self._digests if d not in live]:
+            del self._digests[d]
+        if os.path.dirname(self.cache_path):
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        atomicio.write_text(self.cache_path, json.dumps(self._data, sort_keys=True))
+        self._dirty = False
+
+
+def main():
+    if len(sys.argv) < 2:
+        print('Usage: anchors.py PAGE.md [...]')
+        sys.exit(1)
+    index = AnchorIndex(cache_path=None)
+    for path in sys.argv[1:]:
+        print(path)
+        for id_ in sorted(index.anchors(path)):
+            print(f"  #{id_}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,114 +1,89 @@
 #!/usr/bin/env python3
 """Assign a likely language to opening fenced code blocks that have no language.
 
-This is conservative: it uses simple heuristics to detect shell/bash, yaml, json,
-html blocks and otherwise defaults to a neutral 'text' language so markdownlint's
-MD040 and similar rules will be satisfied without changing semantics.
+This is conservative: fencelang.py scores the first lines of each block for shell, console
+output, yaml, json, ini, toml, nft, python, html and apache config, and anything it is not
+sure of gets a neutral 'text' language, so markdownlint's MD040 and similar rules will be
+satisfied without changing semantics.
 
-Usage: python3 scripts/assign_fence_language.py <docs-root>
+Usage: python3 scripts/assign_fence_language.py <docs-root> [--check | --diff]
 """
+import argparse
 import sys
-import os
-import re
 from pathlib import Path
 
+import atomicio
+import fencelang
+import gitselect
+import mdblocks
+import mdwalk
+import runprofile
+
+# timed separately under --profile (see runprofile.py)
+PROFILED = ('detect_lang',)
+
 
 def detect_lang(lines):
-    """Heuristic detection of language from a list of lines (code block content).
-    Returns: language string (bash|yaml|json|html|text)
-    """
-    joined = '\n'.join(lines).strip()
-    if not joined:
-        return 'text'
-    # Common shell hints
-    if re.search(r'(^|\n)\s*(sudo |\$ |#\!|apt-get|yum |dnf |systemctl |service )', joined):
-        return 'bash'
-    if re.search(r'(^|\n)\s*(apiVersion:|kind:|metadata:|---\n|: )', joined):
-        return 'yaml'
-    if re.search(r'\{\s*"|"\s*:\s*|}\s*$', joined):
-        # naive json detection: contains quotes and colon or braces
-        if re.search(r'["\{\}\[\]]', joined):
-            return 'json'
-    if re.search(r'<\/?[a-zA-Z]+[^>]*>', joined):
-        return 'html'
-    # detectable code pattern: package.json, npm, etc
-    if re.search(r'(npm install|pip install|python -m|node -v|npm -v)', joined):
-        return 'bash'
-    return 'text'
+    """Language for a code block's content lines (see fencelang.py)."""
+    return fencelang.classify(lines)
 
 
-def process_file(p: Path):
-    text = p.read_text(encoding='utf-8')
-    lines = text.splitlines()
-    out = []
+def assign_languages(text):
+    """Return (new_text, changed) with a guessed language on every unlabelled opening fence."""
+    doc = mdblocks.parse(text)
+    out = list(doc.lines)
     changed = False
-    i = 0
-    fence_re = re.compile(r'^(\s*)(`{3,}|~{3,})(\s*)(\w+)?\s*$')
-    while i < len(lines):
-        line = lines[i]
-        m = fence_re.match(line)
-        if m:
-            indent, fence, spaces, lang = m.groups()
-            if lang:
-                out.append(line)
-                i += 1
-                # inside fence until closing
-                while i < len(lines) and not fence_re.match(lines[i]):
-                    out.append(lines[i])
-                    i += 1
-                if i < len(lines):
-                    # closing fence
-                    out.append(lines[i])
-                    i += 1
-                continue
-            else:
-                # gather block content until closing fence
-                content_lines = []
-                j = i + 1
-                while j < len(lines) and not fence_re.match(lines[j]):
-                    content_lines.append(lines[j])
-                    j += 1
-                lang_guess = detect_lang(content_lines)
-                out.append(f"{indent}{fence} {lang_guess}")
-                changed = True
-                # append content lines
-                while i + 1 < len(lines) and not fence_re.match(lines[i + 1]):
-                    i += 1
-                    out.append(lines[i])
-                # now we expect a closing fence possibly
-                if i + 1 < len(lines) and fence_re.match(lines[i + 1]):
-                    i += 1
-                    out.append(lines[i])
-                i += 1
-                continue
-        out.append(line)
-        i += 1
-    if changed:
-        p.write_text('\n'.join(out) + '\n', encoding='utf-8')
+    for b in doc.iter('fence'):
+        if b.info:
+            continue
+        lang_guess = detect_lang([doc.lines[k] for k in b.content])
+        out[b.start] = f"{doc.lines[b.start][:b.indent]}{b.marker} {lang_guess}"
+        changed = True
+    if not changed:
+        return text, False
+    return '\n'.join(out) + '\n', True
+
+
+def process_file(p: Path):
+    original = atomicio.read_text(p)
+    text, changed = assign_languages(original)
+    if changed and atomicio.write_text(p, text, original=original):
         print('Patched fence languages in', p)
     return changed
 
 
+def _assign_transform(text):
+    return assign_languages(text)[0], None
+
+
 def main():
-    if len(sys.argv) < 2:
-        print('Usage: assign_fence_language.py <docs-root>')
-        sys.exit(1)
-    root = Path(sys.argv[1])
+    parser = argparse.ArgumentParser(description='Assign a likely language to unlabelled opening fences')
+    parser.add_argument('root', help='Docs root, e.g. docs')
+    mdwalk.add_mode_args(parser)
+    gitselect.add_git_args(parser)
+    runprofile.add_profile_args(parser, 'assign_fence_language')
+    args = parser.parse_args()
+    mode = mdwalk.mode_from_args(args)
+    runprofile.start(args, 'assign_fence_language',
+                     [(sys.modules[__name__], ('assign_languages',) + PROFILED, 'assign_fence_language.'),
+                      (mdblocks, mdblocks.PROFILED, 'mdblocks.')])
+    paths = mdwalk.iter_markdown_files([args.root], skip_hidden=False, selection=gitselect.from_args(args, [args.root]))
     changed = []
-    for dirpath, _, filenames in os.walk(root):
-        for f in filenames:
-            if not f.endswith('.md'):
-                continue
-            p = Path(dirpath) / f
-            try:
-                if process_file(p):
-                    changed.append(str(p))
-            except Exception as e:
-                print('Error', p, e)
+    for r in mdwalk.iter_process_files(paths, _assign_transform, mode=mode):
+        if r.error:
+            print('Error', r.path, r.error)
+        elif r.changed:
+            changed.append(r.path)
+            if mode == mdwalk.WRITE:
+                print('Patched fence languages in', r.path)
+            else:
+                mdwalk.report_pending(r, mode)
     if changed:
-        print('Files changed:')
+        print('Files changed:' if mode == mdwalk.WRITE else 'Files that would change:')
         for c in changed:
             print(' -', c)
+    runprofile.finish(args)
+    sys.exit(mdwalk.exit_status(args, changed))
 
 
 if __name__ == '__main__':
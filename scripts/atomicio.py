@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Read a file once and rewrite it atomically, only when its content changes.
+
+read_text() reads a file's bytes in a single call and decodes them the way open(path, 'r')
+does, with universal newlines. Files of MMAP_THRESHOLD bytes or more are read through mmap.
+write_text() compares the new text with the original (passed in, or read from disk once) and
+does nothing when they are equal. Otherwise it writes a temporary file next to the target, fsyncs
+it, copies the target's permission bits, renames it over the target and fsyncs the directory.
+
+A crash mid-write therefore leaves either the old page or the new one, never a truncated one.
+Pages that need no fix keep their mtime, so mkdocs serve and rsync deploys do not see a change.
+Symlinked pages are replaced at the file they point to.
+
+Usage:
+    text = atomicio.read_text(path)
+    if atomicio.write_text(path, fix(text), original=text):
+        print('Fixed', path)
+"""
+
+import contextlib
+import mmap
+import os
+import shutil
+import tempfile
+
+# files this large are read through mmap instead of a growing read() buffer
+MMAP_THRESHOLD = 1 << 20
+
+# permission bits for files that did not exist before (mkstemp creates them 0600)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def read_bytes(path):
+    with open(path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[:]
+        return fh.read()
+
+
+def decode(data, encoding='utf-8', errors='strict'):
+    """Decode file bytes like text-mode open(): \\r\\n and \\r become \\n."""
+    text = data.decode(encoding, errors)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def read_text(path, encoding='utf-8', errors='strict'):
+    return decode(read_bytes(path), encoding, errors)
+
+
+def read_lines(path, encoding='utf-8', errors='strict'):
+    """The file's lines with their line endings, as text-mode readlines() returns them."""
+    parts = read_text(path, encoding, errors).split('\n')
+    lines = [p + '\n' for p in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def temp_file(path):
+    """Create a temporary file next to path (same filesystem, so it can be renamed over it);
+    return (fd, name)."""
+    real = os.path.realpath(path)
+    return tempfile.mkstemp(prefix='.' + os.path.basename(real) + '.', suffix='.tmp',
+                            dir=os.path.dirname(real))
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        # some filesystems cannot fsync a directory; the rename itself is still atomic
+        pass
+    finally:
+        os.close(fd)
+
+
+def install(tmp, path):
+    """Rename the already fsynced temporary file tmp over path, keeping path's permission bits."""
+    real = os.path.realpath(path)
+    try:
+        shutil.copymode(real, tmp)
+    except FileNotFoundError:
+        os.chmod(tmp, 0o666 & ~_UMASK)
+    os.replace(tmp, real)
+    _fsync_dir(os.path.dirname(real))
+
+
+def replace_bytes(path, data):
+    """Atomically replace path's content with data."""
+    fd, tmp = temp_file(path)
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        install(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def write_text(path, text, original=None, encoding='utf-8'):
+    """Atomically write text to path unless the content is unchanged; return True if written.
+
+    original is the text read_text() returned for path; without it the file is read once to
+    compare bytes. A missing file is created.
+    """
+    if original is not None and text == original:
+        return False
+    data = text.encode(encoding)
+    if original is None:
+        try:
+            if read_bytes(path) == data:
+                return False
+        except FileNotFoundError:
+            pass
+    replace_bytes(path, data)
+    return True
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Content-addressed backup store shared by the fixers that back up pages before rewriting them.
+
+Backups used to be whole-file copies with timestamp suffixes in .indent_fix_backups/ and
+.link_check_backups/ directories next to the docs, one more copy per run. Now each backed-up
+version is stored once, gzip-compressed, under its SHA-256:
+
+    .cache/backups/blobs/ab/ab12...ef.gz
+    .cache/backups/index.jsonl      one {"path", "time", "tool", "blob", "size"} per backup
+    .cache/backups/index.lock       held (flock) while a blob and its index line are added or
+                                    the store is pruned, so concurrent fixers lose no entries
+
+Backing up content that is already the latest backup of that page adds nothing. Backing up the
+same content for another page, or again later, adds one index line and no new blob, so disk use
+grows with actual changes, not with the number of runs. The first backup a process makes prunes
+the store: for each page only the KEEP newest backups are kept, and of those the ones older than
+MAX_AGE_DAYS are dropped, except the newest backup of each page. Blobs that no backup refers to any
+more are deleted.
+
+Usage:
+  python3 scripts/backupstore.py list [PATH ...] [--tool TOOL]
+  python3 scripts/backupstore.py restore PATH [--at TIME | --blob PREFIX] [--to FILE]
+  python3 scripts/backupstore.py prune [--keep N] [--max-age-days N]
+  python3 scripts/backupstore.py import docs [--remove]   # ingest legacy *.bak* backup directories
+
+Library:
+  backupstore.backup(path, text, 'fix_fence_mismatch')
+"""
+
+import argparse
+import calendar
+import contextlib
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+import atomicio
+
+DEFAULT_STORE = os.path.join('.cache', 'backups')
+# retention: newest backups kept per page, and the age after which backups are dropped
+KEEP = 5
+MAX_AGE_DAYS = 30
+TIME_FORMAT = '%Y%m%dT%H%M%SZ'
+# backup directories the fixers used to write, and their file name suffixes
+LEGACY_DIRS = ('.indent_fix_backups', '.link_check_backups')
+LEGACY_RE = re.compile(r"^(?P<name>.+?)\.bak(?:\.(?P<stamp>\d{8}T\d{6}Z|auto))?$")
+
+
+def _stamp(seconds):
+    return time.strftime(TIME_FORMAT, time.gmtime(seconds))
+
+
+def _seconds(stamp):
+    return calendar.timegm(time.strptime(stamp, TIME_FORMAT))
+
+
+class BackupStore:
+    """A blob directory plus an append-only index; see the module docstring for the layout."""
+
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.jsonl')
+        self.lock_path = os.path.join(root, 'index.lock')
+        self._entries = None
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the store's lock: prune() replaces the index and deletes unreferenced blobs, so
+        it must not run between another process writing a blob and appending its index line."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, 'a') as fh:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def entries(self, path=None, tool=None, reload=False):
+        """Index entries, oldest first, optionally only those of one page and/or tool."""
+        if self._entries is None or reload:
+            self._entries = []
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as fh:
+                    for line in fh:
+                        if line.strip():
+                            self._entries.append(json.loads(line))
+            except FileNotFoundError:
+                pass
+            # imported legacy backups are appended with their original, older time
+            self._entries.sort(key=lambda e: e['time'])
+        real = os.path.realpath(path) if path is not None else None
+        return [e for e in self._entries
+                if (real is None or e['path'] == real) and (tool is None or e['tool'] == tool)]
+
+    def blob_path(self, blob):
+        return os.path.join(self.root, 'blobs', blob[:2], blob + '.gz')
+
+    def add(self, path, data, tool, when=None):
+        """Back up data (the page's content, str or bytes) for path; return the index entry."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        blob = hashlib.sha256(data).hexdigest()
+        real = os.path.realpath(path)
+        history = self.entries(real)
+        if history and history[-1]['blob'] == blob and when is None:
+            return history[-1]
+        blob_path = self.blob_path(blob)
+        entry = {'path': real, 'time': _stamp(time.time() if when is None else when), 'tool': tool,
+                 'blob': blob, 'size': len(data)}
+        with self.locked():
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                # mtime=0 keeps the compressed bytes a function of the content alone
+                atomicio.replace_bytes(blob_path, gzip.compress(data, mtime=0))
+            with open(self.index_path, 'a', encoding='utf-8') as fh:
+                fh.write(json.dumps(entry, sort_keys=True) + '\n')
+        self._entries.append(entry)
+        if when is not None:
+            self._entries.sort(key=lambda e: e['time'])
+        return entry
+
+    def read(self, entry):
+        with open(self.blob_path(entry['blob']), 'rb') as fh:
+            return gzip.decompress(fh.read())
+
+    def find(self, path, at=None, blob=None):
+        """The backup of path to restore: the newest one, the newest at or before time stamp at,
+        or the one whose blob starts with blob. Returns None if there is none."""
+        candidates = self.entries(path)
+        if at is not None:
+            candidates = [e for e in candidates if e['time'] <= at]
+        if blob is not None:
+            candidates = [e for e in candidates if e['blob'].startswith(blob)]
+        return candidates[-1] if candidates else None
+
+    def restore(self, entry, dest=None):
+        """Write a backup back to its page (or to dest), byte for byte; return True if the file
+        changed."""
+        target = dest or entry['path']
+        data = self.read(entry)
+        try:
+            if atomicio.read_bytes(target) == data:
+                return False
+        except FileNotFoundError:
+            pass
+        atomicio.replace_bytes(target, data)
+        return True
+
+    def prune(self, keep=KEEP, max_age_days=MAX_AGE_DAYS, now=None):
+        """Apply the retention policy; return (index entries dropped, blobs deleted)."""
+        if not os.path.isdir(self.root):
+            return 0, 0
+        with self.locked():
+            return self._prune(keep, max_age_days, now)
+
+    def _prune(self, keep, max_age_days, now):
+        # other processes may have appended since this store read the index
+        entries = self.entries(reload=True)
+        cutoff = _stamp((time.time() if now is None else now) - max_age_days * 86400)
+        per_path = {}
+        for e in entries:
+            per_path.setdefault(e['path'], []).append(e)
+        kept = set()
+        for history in per_path.values():
+            kept.update(id(e) for e in (history[-keep:] if keep > 0 else ()) if e['time'] >= cutoff)
+            # the last known version of a page survives any age limit
+            kept.add(id(history[-1]))
+        survivors = [e for e in entries if id(e) in kept]
+        dropped = len(entries) - len(survivors)
+        if dropped:
+            atomicio.write_text(self.index_path, ''.join(json.dumps(e, sort_keys=True) + '\n' for e in survivors))
+            self._entries = survivors
+        referenced = {e['blob'] for e in survivors}
+        deleted = 0
+        blobs_dir = os.path.join(self.root, 'blobs')
+        for dirpath, _dirnames, filenames in os.walk(blobs_dir):
+            for f in filenames:
+                if f.endswith('.gz') and f[:-3] not in referenced:
+                    os.unlink(os.path.join(dirpath, f))
+                    deleted += 1
+        return dropped, deleted
+
+
+_stores = {}
+
+
+def backup(path, text, tool, store_dir=DEFAULT_STORE):
+    """Back up path's current content (text) in the shared store; return the index entry. The
+    first backup a process makes into a store prunes it first."""
+    store = _stores.get(store_dir)
+    if store is None:
+        store = _stores[store_dir] = BackupStore(store_dir)
+        store.prune()
+    return store.add(path, text, tool)
+
+
+def describe(entry):
+    """Short reference to a backup for the fixers' "Patched ... (backup: ...)" messages."""
+    return f"{entry['time']} {entry['blob'][:12]}"
+
+
+def _legacy_original(backup_dir, rel_dir, name):
+    """Guess the page a legacy backup was taken of: the same relative path next to the backup
+    directory, else the first page with that name below it."""
+    base = os.path.dirname(backup_dir)
+    guess = os.path.join(base, rel_dir, name)
+    if os.path.exists(guess):
+        return guess
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        if name in filenames:
+            return os.path.join(dirpath, name)
+    return guess
+
+
+def import_legacy(store, roots, remove=False):
+    """Move the *.bak* files of legacy backup directories under roots into the store; return
+    the number imported."""
+    count = 0
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            parts = dirpath.split(os.sep)
+            legacy = [i for i, p in enumerate(parts) if p in LEGACY_DIRS]
+            if not legacy:
+                continue
+            backup_dir = os.sep.join(parts[:legacy[0] + 1])
+            rel_dir = os.path.relpath(dirpath, backup_dir)
+            for f in sorted(filenames):
+                m = LEGACY_RE.match(f)
+                if not m:
+                    continue
+                src = os.path.join(dirpath, f)
+                stamp = m.group('stamp')
+                when = _seconds(stamp) if stamp and stamp != 'auto' else os.path.getmtime(src)
+                original = _legacy_original(backup_dir, rel_dir, m.group('name'))
+                store.add(original, atomicio.read_bytes(src), 'legacy:' + os.path.basename(backup_dir), when)
+                count += 1
+                if remove:
+                    os.unlink(src)
+            if remove and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List, restore and prune the fixers\' page backups')
+    parser.add_argument('--store', default=DEFAULT_STORE, help=f"Backup store directory (default: {DEFAULT_STORE})")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_list = sub.add_parser('list', help='List backups, newest last')
+    p_list.add_argument('paths', nargs='*', help='Only backups of these pages')
+    p_list.add_argument('--tool', help='Only backups made by this tool')
+    p_restore = sub.add_parser('restore', help='Restore a page from its newest (or a chosen) backup')
+    p_restore.add_argument('path', help='Page to restore')
+    group = p_restore.add_mutually_exclusive_group()
+    group.add_argument('--at', metavar='TIME', help='Newest backup at or before TIME (YYYYMMDDTHHMMSSZ)')
+    group.add_argument('--blob', metavar='PREFIX', help='The backup whose blob hash starts with PREFIX')
+    p_restore.add_argument('--to', metavar='FILE', help='Write the backup to FILE instead of the page')
+    p_prune = sub.add_parser('prune', help='Apply the retention policy now')
+    p_prune.add_argument('--keep', type=int, default=KEEP, help=f"Backups kept per page (default: {KEEP})")
+    p_prune.add_argument('--max-age-days', type=float, default=MAX_AGE_DAYS,
+                         help=f"Drop backups older than this (default: {MAX_AGE_DAYS})")
+    p_import = sub.add_parser('import', help='Ingest legacy .indent_fix_backups/.link_check_backups files')
+    p_import.add_argument('roots', nargs='+', help='Directories to search, e.g. docs')
+    p_import.add_argument('--remove', action='store_true', help='Delete the legacy files once imported')
+    args = parser.parse_args()
+
+    store = BackupStore(args.store)
+    if args.command == 'list':
+        entries = [e for p in args.paths for e in store.entries(p, args.tool)] if args.paths else store.entries(tool=args.tool)
+        for e in entries:
+            print(f"{e['time']}  {e['blob'][:12]}  {e['size']:>8}  {e['tool']:<30} {e['path']}")
+        blobs = {e['blob'] for e in entries}
+        print(f"Backups: {len(entries)}, distinct versions: {len(blobs)}")
+    elif args.command == 'restore':
+        entry = store.find(args.path, args.at, args.blob)
+        if entry is None:
+            sys.exit(f"No matching backup of {args.path} in {args.store}")
+        changed = store.restore(entry, args.to)
+        target = args.to or entry['path']
+        print(f"{'Restored' if changed else 'Already identical'}: {target} from {describe(entry)}")
+    elif args.command == 'prune':
+        dropped, deleted = store.prune(args.keep, args.max_age_days)
+        print(f"Dropped {dropped} backups, deleted {deleted} blobs")
+    elif args.command == 'import':
+        count = import_legacy(store, args.roots, args.remove)
+        print(f"Imported {count} legacy backups into {args.store}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 from pathlib import Path
+
+import atomicio
+
 path=Path('docs/perfsonar/installation.md')
-lines=path.read_text(encoding='utf-8').splitlines()
+lines=atomicio.read_text(path).splitlines()
 
 def process(lines):
     out=[]
@@ -35,5 +38,5 @@ def process(lines):
     return out
 
 new=process(lines)
-path.write_text('\n'.join(new)+'\n',encoding='utf-8')
+atomicio.write_text(path, '\n'.join(new)+'\n')
 print('Converted admonition fences in',path)
@@ -5,127 +5,73 @@ Convert setext-style headings (underlines using === or ---) to ATX (# / ##) head
 Rules:
 - Convert "Title\n===" -> "# Title"
 - Convert "Title\n---" -> "## Title"
-- Do not convert if the underline line is YAML front matter (i.e., the first '---' at file start) or if it's a horizontal rule intentionally placed (we check by seeing if the line is a single '---' with no previous non-empty line or used as horizontal rule).
-- Skip lines within fenced code blocks and skip lines when previous line begins with '>' or list markers.
+- Do not convert if the underline line is YAML front matter (i.e., the first '---' at file start) or if it's a horizontal rule
+  (a '---' line that does not directly follow a paragraph).
+- Skip lines within fenced code blocks, blockquotes and list items.
+
+Headings are found with the shared block model (scripts/mdblocks.py), the same one convert_setext_to_atx2.py uses.
 
 Run with: python3 scripts/convert_setext_to_atx.py docs
-This will modify files in place and report changed files.
+This will modify files in place and report changed files; --check and --diff only report.
 """
 
-import os
+import argparse
 import sys
-import re
-
 
-def is_fence(line):
-    return bool(re.match(r"^\s*`{3,}|^\s*~{3,}", line))
+import atomicio
+import gitselect
+import mdblocks
+import mdwalk
+import runprofile
+from convert_setext_to_atx2 import convert_text
 
 
 def convert_file(path):
-    changed = False
-    with open(path, 'r', encoding='utf-8') as fh:
-        lines = fh.readlines()
-
-    out = []
-    i = 0
-    in_fence = False
-    yaml_frontmatter = False
-
-    # Detect if file starts with YAML frontmatter '---' and track its bounds
-    if len(lines) > 0 and lines[0].strip() == '---':
-        yaml_frontmatter = True
-    fm_closed = not yaml_frontmatter
-
-    while i < len(lines):
-        line = lines[i]
-        if yaml_frontmatter and not fm_closed:
-            if line.strip() == '---' and i != 0:
-                fm_closed = True
-            out.append(line)
-            i += 1
-            continue
-
-        # Toggle fenced code blocks
-        if is_fence(line):
-            in_fence = not in_fence
-            out.append(line)
-            i += 1
-            continue
-
-        if in_fence:
-            out.append(line)
-            i += 1
-            continue
-
-        # Look ahead to the next line to see if it's a setext underline
-        if i + 1 < len(lines):
-            next_line = lines[i+1]
-            # match a line of === or --- (three or more chars) and no other content
-            # Normalize common special-case underlines: sometimes the underline contains trailing spaces or tabs
-            if re.match(r"^\s*={2,}\s*$", next_line):
-                # Convert to H1 (ATX)
-                # Ensure the current line is not empty and not a list or blockquote
-                if line.strip() and not re.match(r"^[>\-\*\d]\s.*", line):
-                    new_line = '# ' + line.lstrip('#').rstrip('\n') + '\n'
-                    out.append(new_line)
-                    i += 2
-                    changed = True
-                    continue
-            elif re.match(r"^\s*-{2,}\s*$", next_line):
-                # Ensure not a horizontal rule intentionally at top of file or blank line
-                # Skip if previous line is empty (horizontal rule), or prev char is '\n' alone
-                # (We check the previous non-empty line; if it's empty then skip.)
-                prev_idx = i-1
-                while prev_idx >= 0 and lines[prev_idx].strip() == '':
-                    prev_idx -= 1
-                if prev_idx >= 0 and prev_idx != i-1:
-                    # there's a blank line right before the underline; treat it as a horizontal rule -> skip
-                    out.append(line)
-                    i += 1
-                    continue
-                if line.strip() and not re.match(r"^[>\-\*\d]\s.*", line):
-                    new_line = '## ' + line.lstrip('#').rstrip('\n') + '\n'
-                    out.append(new_line)
-                    i += 2
-                    changed = True
-                    continue
-
-        out.append(line)
-        i += 1
-
+    text = atomicio.read_text(path)
+    new_text, changed = convert_text(text)
     if changed:
-        with open(path, 'w', encoding='utf-8') as fh:
-            fh.writelines(out)
+        atomicio.write_text(path, new_text, original=text)
     return changed
 
 
-def walk_and_convert(root):
+def _convert_transform(text):
+    return convert_text(text)[0], None
+
+
+def walk_and_convert(root, mode=mdwalk.WRITE, selection=None):
     files_changed = []
-    for dirpath, _, filenames in os.walk(root):
-        for file in filenames:
-            if not file.endswith('.md'):
-                continue
-            path = os.path.join(dirpath, file)
-            try:
-                if convert_file(path):
-                    files_changed.append(path)
-            except Exception as e:
-                print(f"Error converting {path}: {e}")
+    for r in mdwalk.iter_process_files(mdwalk.iter_markdown_files([root], skip_hidden=False, selection=selection),
+                                       _convert_transform, mode=mode):
+        if r.error:
+            print(f"Error converting {r.path}: {r.error}")
+        elif r.changed:
+            files_changed.append(r.path)
+            if mode != mdwalk.WRITE:
+                mdwalk.report_pending(r, mode)
     return files_changed
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: convert_setext_to_atx.py <path>\nExample: python3 scripts/convert_setext_to_atx.py docs")
-        sys.exit(1)
-    root = sys.argv[1]
-    changed = walk_and_convert(root)
+    parser = argparse.ArgumentParser(description='Convert setext headings to ATX headings',
+                                     epilog='Example: python3 scripts/convert_setext_to_atx.py docs')
+    parser.add_argument('root', help='Root directory to convert, e.g. docs')
+    mdwalk.add_mode_args(parser)
+    gitselect.add_git_args(parser)
+    runprofile.add_profile_args(parser, 'convert_setext_to_atx')
+    args = parser.parse_args()
+    mode = mdwalk.mode_from_args(args)
+    runprofile.start(args, 'convert_setext_to_atx',
+                     [(sys.modules[__name__], ('convert_text',), 'convert_setext_to_atx.'),
+                      (mdblocks, mdblocks.PROFILED, 'mdblocks.')])
+    changed = walk_and_convert(args.root, mode, gitselect.from_args(args, [args.root]))
     if changed:
-        print("Converted headings in files:")
+        print("Converted headings in files:" if mode == mdwalk.WRITE else "Files that would change:")
         for c in changed:
             print(" - " + c)
     else:
         print("No setext headings found or changed.")
+    runprofile.finish(args)
+    sys.exit(mdwalk.exit_status(args, changed))
 
 
 if __name__ == '__main__':
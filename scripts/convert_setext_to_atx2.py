@@ -1,120 +1,78 @@
 #!/usr/bin/env python3
 """
-Safer conversion of setext headings (underlines with ===/---) to ATX headings using multiline regex.
+Safer conversion of setext headings (underlines with ===/---) to ATX headings using the shared block model.
 This script reads each file and converts any setext heading not inside YAML frontmatter or fenced code blocks.
 """
 
+import argparse
 import sys
-import os
-import re
 
-
-FENCE_RE = re.compile(r"^\s*(`{3,}|~{3,})")
-SETEXT_RE = re.compile(r"(?m)^(?P<h>[^#\n>\-\*\d].+?)\r?\n(?P<u>={3,}|-{3,})\s*$")
-
-
-def in_frontmatter_ranges(text):
-    ranges = []
-    if text.startswith('---'):
-        # find closing '---' that marks the end of front matter
-        # skip the first '---'
-        idx = text.find('\n', 3)
-        if idx == -1:
-            return ranges
-        # find the second '---' line
-        m = re.search(r"^---\s*$", text[idx+1:], re.M)
-        if m:
-            start = 0
-            end = idx+1 + m.end()
-            ranges.append((start, end))
-    return ranges
-
-
-def in_fenced_block_ranges(text):
-    ranges = []
-    stack = []
-    for m in re.finditer(r"(?m)^(?P<fence>`{3,}|~{3,}).*$", text):
-        fence = m.group('fence')
-        pos = m.start()
-        if stack and stack[-1][0] == fence:
-            # close
-            start_pos = stack[-1][1]
-            ranges.append((start_pos, m.end()))
-            stack.pop()
-        else:
-            stack.append((fence, pos))
-    return ranges
-
-
-def pos_in_ranges(pos, ranges):
-    for (s, e) in ranges:
-        if s <= pos < e:
-            return True
-    return False
+import atomicio
+import mdblocks
+import gitselect
+import mdwalk
+import runprofile
 
 
 def convert_text(text):
-    fm_ranges = in_frontmatter_ranges(text)
-    fence_ranges = in_fenced_block_ranges(text)
-
-    converted = False
-
-    def repl(m):
-        nonlocal converted
-        start_pos = m.start()
-        if pos_in_ranges(start_pos, fm_ranges):
-            return m.group(0)
-        if pos_in_ranges(start_pos, fence_ranges):
-            return m.group(0)
-        heading_text = m.group('h').rstrip()
-        underline = m.group('u')
-        if underline.startswith('='):
-            converted = True
-            return '# ' + heading_text + '\n'
-        else:
-            converted = True
-            return '## ' + heading_text + '\n'
-
-    new_text = SETEXT_RE.sub(repl, text)
-    return new_text, converted
+    """Convert setext headings found by the block model (never inside front matter or fences)."""
+    doc = mdblocks.parse(text)
+    out = []
+    prev = 0
+    for b in doc.iter('heading'):
+        if not b.setext:
+            continue
+        out.extend(doc.lines[prev:b.start])
+        out.append('#' * b.level + ' ' + b.info.rstrip())
+        prev = b.end
+    if not out:
+        return text, False
+    out.extend(doc.lines[prev:])
+    return doc.render(out), True
 
 
 def convert_file(path):
-    with open(path, 'r', encoding='utf-8') as fh:
-        text = fh.read()
+    text = atomicio.read_text(path)
     new_text, converted = convert_text(text)
-    if converted and new_text != text:
-        with open(path, 'w', encoding='utf-8') as fh:
-            fh.write(new_text)
-        return True
-    return False
+    return converted and atomicio.write_text(path, new_text, original=text)
+
+
+def _convert_transform(text):
+    return convert_text(text)[0], None
 
 
-def walk_and_convert(root):
-    changed_files = []
-    for dirpath, dirs, files in os.walk(root):
-        for file in files:
-            if not file.endswith('.md'):
-                continue
-            path = os.path.join(dirpath, file)
-            try:
-                if convert_file(path):
-                    changed_files.append(path)
-            except Exception as e:
-                print(f"Error converting {path}: {e}")
-    return changed_files
+def walk_and_convert(root, jobs=1, mode=mdwalk.WRITE, selection=None):
+    results = []
+    for r in mdwalk.iter_process_files(mdwalk.iter_markdown_files([root], skip_hidden=False, selection=selection),
+                                       _convert_transform, jobs=jobs, mode=mode):
+        results.append(r)
+        if r.changed and mode != mdwalk.WRITE:
+            mdwalk.report_pending(r, mode)
+    mdwalk.report_errors(results, 'converting')
+    return [r.path for r in results if r.changed]
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: convert_setext_to_atx2.py <root-dir>")
-        sys.exit(1)
-    root = sys.argv[1]
-    changed = walk_and_convert(root)
-    for f in changed:
-        print('Converted:', f)
+    parser = argparse.ArgumentParser(description='Convert setext headings to ATX headings')
+    parser.add_argument('root', help='Root directory to convert, e.g. docs')
+    parser.add_argument('--jobs', '-j', type=mdwalk.jobs_arg, default=1,
+                        help='Number of worker processes (0 = one per CPU; default: 1)')
+    mdwalk.add_mode_args(parser)
+    gitselect.add_git_args(parser)
+    runprofile.add_profile_args(parser, 'convert_setext_to_atx2')
+    args = parser.parse_args()
+    mode = mdwalk.mode_from_args(args)
+    runprofile.start(args, 'convert_setext_to_atx2',
+                     [(sys.modules[__name__], ('convert_text',), 'convert_setext_to_atx2.'),
+                      (mdblocks, mdblocks.PROFILED, 'mdblocks.')])
+    changed = walk_and_convert(args.root, args.jobs, mode, gitselect.from_args(args, [args.root]))
+    if mode == mdwalk.WRITE:
+        for f in changed:
+            print('Converted:', f)
     if not changed:
         print('No conversions performed.')
+    runprofile.finish(args)
+    sys.exit(mdwalk.exit_status(args, changed))
 
 
 if __name__ == '__main__':
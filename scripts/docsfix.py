@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Run a chain of the Markdown fixers in scripts/ with one read and at most one write per file.
+
+Each selected rule is an existing transform applied to the in-memory text, always in the fixed
+order of RULE_ORDER (independent of the order given on the command line), so chaining the whole
+cleanup suite costs one walk, one read per file and one write only for files that change.
+
+Rules:
+  setext            convert_setext_to_atx2.convert_text
+  format            format_markdown.format_text
+  list-markers      normalize_unordered_list_markers.normalize_text
+  blank-fences      ensure_blank_between_lists_and_fences.process_text
+  fence-lang        assign_fence_language.assign_languages
+  fence-mismatch    fix_fence_mismatch.normalize_text
+  admonition-indent fix_admonition_indent_better.fix_text
+
+Files already known to be clean for the selected rules are skipped via the fixed-point cache in
+.cache/docsfix.json (see fixcache.py); use --no-cache to process everything. With --check or
+--diff nothing is written (see mdwalk.py); --check exits with status 1 if any file would change.
+With --changed-since REF or --staged only the Markdown files git reports as changed under the
+given paths are processed (see gitselect.py); this is what scripts/pre-commit.sh runs.
+
+--watch keeps running after that and fixes each page again whenever it is saved, with the rules,
+parse caches and fixed-point cache kept warm in the one process (see docwatch.py). Bursts of
+saves are debounced (--debounce), the tool's own writes are ignored, and every save is reported
+with its save-to-clean latency. inotify is used where available, else --poll's mtime polling.
+
+--profile [REPORT] times every rule and file and writes a JSON run report (see runprofile.py).
+
+Some rules undo each other (fence-lang adds ` text` to bare fences, fence-mismatch strips it again),
+so a single pass is not always a fixed point. --converge repeats the pipeline until a whole pass
+changes nothing. Every intermediate state is remembered by content hash together with the rule
+about to run; seeing one again means the rules cycle, and the file is reported (not written) with
+the pair of rules that fight and the lines they fight over. Files still changing after
+--max-passes passes are reported the same way, and either makes the run exit with status 1.
+
+Usage: python3 scripts/docsfix.py docs --rules format,setext,list-markers,fence-lang,admonition-indent
+"""
+
+import argparse
+import difflib
+import functools
+import sys
+import time
+
+import admonitions
+import assign_fence_language
+import atomicio
+import convert_setext_to_atx2
+import docwatch
+import ensure_blank_between_lists_and_fences
+import fencelang
+import fix_admonition_indent_better
+import fix_fence_mismatch
+import fixcache
+import format_markdown
+import gitselect
+import mdblocks
+import mdwalk
+import mdwrap
+import normalize_unordered_list_markers
+import runprofile
+
+# name -> text transform; transforms that also report details are reduced to their text result
+RULES = {
+    'setext': lambda text: convert_setext_to_atx2.convert_text(text)[0],
+    'format': format_markdown.format_text,
+    'list-markers': normalize_unordered_list_markers.normalize_text,
+    'blank-fences': ensure_blank_between_lists_and_fences.process_text,
+    'fence-lang': lambda text: assign_fence_language.assign_languages(text)[0],
+    'fence-mismatch': lambda text: fix_fence_mismatch.normalize_text(text)[0],
+    'admonition-indent': lambda text: fix_admonition_indent_better.fix_text(text)[0],
+}
+# modules whose source is part of each rule's cache key
+RULE_MODULES = {
+    'setext': convert_setext_to_atx2,
+    'format': format_markdown,
+    'list-markers': normalize_unordered_list_markers,
+    'blank-fences': ensure_blank_between_lists_and_fences,
+    'fence-lang': assign_fence_language,
+    'fence-mismatch': fix_fence_mismatch,
+    'admonition-indent': fix_admonition_indent_better,
+}
+# shared engines a rule module delegates to; their source is part of the cache key too
+ENGINE_MODULES = {
+    'format': [fencelang, mdwrap],
+    'fence-lang': [fencelang],
+    'fence-mismatch': [fencelang],
+    'admonition-indent': [admonitions],
+}
+# setext must run before format, which would otherwise wrap a heading and its underline together
+RULE_ORDER = ['setext', 'format', 'list-markers', 'blank-fences', 'fence-lang', 'fence-mismatch',
+              'admonition-indent']
+DEFAULT_RULES = 'setext,format,blank-fences,fence-lang,admonition-indent'
+# --converge: passes that may still change a file before it is reported as not settling
+MAX_PASSES = 10
+
+
+class ConvergenceError(Exception):
+    """The rules did not reach a fixed point for a file: they cycle, or kept changing it."""
+
+
+def parse_rules(spec):
+    """Return the selected rule names in pipeline order; raise ValueError on unknown names."""
+    names = [r.strip() for r in spec.split(',') if r.strip()]
+    unknown = [r for r in names if r not in RULES]
+    if unknown:
+        raise ValueError(f"unknown rule(s): {', '.join(unknown)} (choose from {', '.join(RULE_ORDER)})")
+    return [r for r in RULE_ORDER if r in names]
+
+
+def fix_text(text, rules):
+    """Apply rules in order; return (new_text, names of the rules that changed something)."""
+    applied = []
+    for name in rules:
+        new_text = RULES[name](text)
+        if new_text != text:
+            applied.append(name)
+            text = new_text
+    return text, applied
+
+
+def _hunks(before, after):
+    """(line number in before, old lines, new lines) for each place where after differs."""
+    a, b = before.splitlines(), after.splitlines()
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag != 'equal':
+            yield i1 + 1, a[i1:i2], b[j1:j2]
+
+
+def find_fight(cycle):
+    """For a cycle of (rule, before, after) changes, return (rule, other rule, hunks): the first
+    rule whose change another rule in the cycle reverts, and the hunks that get reverted."""
+    # start the cycle at a pass boundary so changes are blamed in pipeline order
+    first = min(range(len(cycle)), key=lambda i: RULE_ORDER.index(cycle[i][0]))
+    cycle = cycle[first:] + cycle[:first]
+    for i, (rule, before, after) in enumerate(cycle):
+        hunks = list(_hunks(before, after))
+        for other, other_before, other_after in cycle[i + 1:] + cycle[:i]:
+            if other == rule:
+                continue
+            removed, added = set(), set()
+            for _, old, new in _hunks(other_before, other_after):
+                removed.update(old)
+                added.update(new)
+            reverted = [h for h in hunks if set(h[2]) <= removed and set(h[1]) <= added]
+            if reverted:
+                return rule, other, reverted
+    # no single change is reverted as a whole (or only one rule fires): blame the first two
+    rule, before, after = cycle[0]
+    other = next((c[0] for c in cycle if c[0] != rule), rule)
+    return rule, other, list(_hunks(before, after))
+
+
+def _show(lines, width=60):
+    text = repr('\n'.join(lines))
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+def describe_cycle(cycle):
+    rule, other, hunks = find_fight(cycle)
+    where = '; '.join(f"line {n}: {_show(old)} -> {_show(new)}" for n, old, new in hunks[:3])
+    if len(hunks) > 3:
+        where += f"; ... ({len(hunks) - 3} more)"
+    if other == rule:
+        return f"rule {rule} does not settle ({len(cycle)} changes per cycle): {where}"
+    return f"rules {rule} and {other} undo each other ({len(cycle)} changes per cycle): {where} by {rule}, reverted by {other}"
+
+
+def converge_text(text, rules, max_passes=MAX_PASSES):
+    """Apply the rules pass after pass until a pass changes nothing; return (new_text, rules that
+    changed something). Raise ConvergenceError if a (content hash, next rule) state repeats, i.e.
+    the rules cycle, or if the text still changes after max_passes passes."""
+    seen = {}
+    # (rule, before, after) for every rule application that changed the text
+    steps = []
+    for _ in range(max_passes):
+        fired = len(steps)
+        for name in rules:
+            state = (fixcache.digest(text), name)
+            if state in seen:
+                if seen[state] == len(steps):
+                    # a whole round of the rules since this state changed nothing: a fixed point
+                    return text, [r for r in rules if any(s[0] == r for s in steps)]
+                raise ConvergenceError(describe_cycle(steps[seen[state]:]))
+            seen[state] = len(steps)
+            new_text = RULES[name](text)
+            if new_text != text:
+                steps.append((name, text, new_text))
+                text = new_text
+        if len(steps) == fired:
+            return text, [r for r in rules if any(s[0] == r for s in steps)]
+    last = sorted({s[0] for s in steps[fired:]}, key=RULE_ORDER.index)
+    raise ConvergenceError(f"still changing after {max_passes} passes (last pass: {', '.join(last)})")
+
+
+def profile_targets(rules):
+    """What --profile times: each selected rule, the mdblocks passes, and the internal passes
+    listed in PROFILED by the selected rules' modules and the engines they use."""
+    targets = [(RULES, rules, 'rule:'), (mdblocks, mdblocks.PROFILED, 'mdblocks.')]
+    seen = set()
+    for r in rules:
+        for module in [RULE_MODULES[r]] + ENGINE_MODULES.get(r, []):
+            if hasattr(module, 'PROFILED') and module not in seen:
+                seen.add(module)
+                targets.append((module, module.PROFILED, module.__name__ + '.'))
+    return targets
+
+
+def cache_for(rules, cache_path=fixcache.DEFAULT_CACHE, converge=False):
+    """Return a FixCache keyed by the selected rules and the source of every module they use."""
+    modules = [RULE_MODULES[r] for r in rules] + [m for r in rules for m in ENGINE_MODULES.get(r, [])]
+    modules = list(dict.fromkeys(modules + [mdblocks, sys.modules[__name__]]))
+    # a single pass can leave content unchanged while rules undo each other inside it, which
+    # --converge reports, so its clean entries are kept apart
+    options = {'rules': rules, 'converge': True} if converge else {'rules': rules}
+    return fixcache.FixCache(cache_path, fixcache.ruleset_key(modules, options))
+
+
+def run(roots, rules, cache=None, jobs=1, mode=mdwalk.WRITE, selection=None, max_passes=None):
+    """Fix the Markdown files under roots; with max_passes, converge each file (converge_text).
+    Returns (changed files, results)."""
+    results = []
+    changed_files = []
+    if max_passes:
+        transform = functools.partial(converge_text, rules=rules, max_passes=max_passes)
+    else:
+        transform = functools.partial(fix_text, rules=rules)
+    for r in mdwalk.iter_process_files(mdwalk.iter_markdown_files(roots, selection=selection),
+                                       transform, jobs=jobs, cache=cache, mode=mode):
+        results.append(r)
+        if r.changed:
+            changed_files.append(r.path)
+            if mode == mdwalk.WRITE:
+                print(f"Fixed: {r.path} ({', '.join(r.detail)})")
+            else:
+                mdwalk.report_pending(r, mode)
+    mdwalk.report_errors(results, 'fixing')
+    return changed_files, results
+
+
+def watch_file(path, transform, cache=None, since=None):
+    """Run the pipeline on one saved page for --watch; print the outcome with its latency (from
+    since, the time.monotonic() of the save) and return True if the page was rewritten."""
+    started = time.monotonic() if since is None else since
+    try:
+        if cache is not None and cache.is_clean(path):
+            applied, error, wrote = [], None, False
+        else:
+            original = atomicio.read_text(path)
+            final, applied = transform(original)
+            wrote = atomicio.write_text(path, final, original=original)
+            if not wrote and cache is not None:
+                cache.mark_clean(path, original)
+            error = None
+    except (OSError, UnicodeDecodeError, ConvergenceError) as e:
+        applied, error, wrote = [], e, False
+    ms = (time.monotonic() - started) * 1000
+    if error is not None:
+        print(f"Error: {path}: {error} ({ms:.1f} ms)")
+    elif wrote:
+        print(f"Fixed: {path} ({', '.join(applied)}) in {ms:.1f} ms")
+    else:
+        print(f"Clean: {path} in {ms:.1f} ms")
+    sys.stdout.flush()
+    return wrote
+
+
+def watch(roots, rules, cache=None, max_passes=None, polling=False, debounce=docwatch.DEBOUNCE):
+    """Fix every page under roots again each time it is saved, until interrupted."""
+    if max_passes:
+        transform = functools.partial(converge_text, rules=rules, max_passes=max_passes)
+    else:
+        transform = functools.partial(fix_text, rules=rules)
+    watcher = docwatch.watcher_for(roots, polling)
+    print(f"Watching {', '.join(roots)} ({watcher.name}); rules: {', '.join(rules)}. Press Ctrl-C to stop.")
+    sys.stdout.flush()
+    try:
+        docwatch.watch(watcher, lambda path, since: watch_file(path, transform, cache, since), debounce)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        if cache is not None:
+            cache.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply the docs fixers in one pass per file')
+    parser.add_argument('paths', nargs='+', help='Markdown files or directories to fix')
+    parser.add_argument('--rules', default=DEFAULT_RULES,
+                        help=f"Comma-separated rules to apply (default: {DEFAULT_RULES}; available: {', '.join(RULE_ORDER)})")
+    parser.add_argument('--cache', default=fixcache.DEFAULT_CACHE,
+                        help=f"Fixed-point cache file (default: {fixcache.DEFAULT_CACHE})")
+    parser.add_argument('--no-cache', action='store_true', help='Process every file, ignoring the cache')
+    parser.add_argument('--jobs', '-j', type=mdwalk.jobs_arg, default=1,
+                        help='Number of worker processes (0 = one per CPU; default: 1)')
+    parser.add_argument('--converge', action='store_true',
+                        help='Repeat the rules until nothing changes; report files whose rules cycle')
+    parser.add_argument('--max-passes', type=int, default=MAX_PASSES, metavar='N',
+                        help=f"With --converge, passes before a still-changing file is reported (default: {MAX_PASSES})")
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and fix each page again whenever it is saved')
+    parser.add_argument('--poll', action='store_true',
+                        help='With --watch, poll file mtimes instead of using inotify')
+    parser.add_argument('--debounce', type=float, default=docwatch.DEBOUNCE * 1000, metavar='MS',
+                        help=f"With --watch, quiet time that ends a burst of saves (default: {docwatch.DEBOUNCE * 1000:g} ms)")
+    mdwalk.add_mode_args(parser)
+    gitselect.add_git_args(parser)
+    runprofile.add_profile_args(parser, 'docsfix')
+    args = parser.parse_args()
+    try:
+        rules = parse_rules(args.rules)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.watch:
+        if mdwalk.mode_from_args(args) != mdwalk.WRITE or args.jobs != 1 or getattr(args, 'profile', None):
+            parser.error('--watch cannot be combined with --check, --diff, --jobs or --profile')
+        cache = None if args.no_cache else cache_for(rules, args.cache, args.converge)
+        watch(args.paths, rules, cache, args.max_passes if args.converge else None, args.poll, args.debounce / 1000)
+        return
+    runprofile.start(args, 'docsfix', profile_targets(rules))
+    cache = None if args.no_cache else cache_for(rules, args.cache, args.converge)
+    mode = mdwalk.mode_from_args(args)
+    changed, results = run(args.paths, rules, cache, args.jobs, mode, gitselect.from_args(args, args.paths),
+                           args.max_passes if args.converge else None)
+    if changed:
+        print(f"{'Changed files' if mode == mdwalk.WRITE else 'Files that would change'}: {len(changed)}")
+    else:
+        print("No changes required.")
+    if cache is not None:
+        print(f"Cache hits: {cache.hits}, misses: {cache.misses}")
+    runprofile.finish(args, cache)
+    if args.converge and any(r.error for r in results):
+        sys.exit(1)
+    sys.exit(mdwalk.exit_status(args, changed))
+
+
+if __name__ == '__main__':
+    main()
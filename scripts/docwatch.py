@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Watch Markdown trees and hand every saved page to a callback, once per burst of saves.
+
+This is what `docsfix.py --watch` runs on. Everything stays in one process: the compiled
+patterns of every rule, the memoized parses (mdblocks), wraps (mdwrap) and fence languages
+(fencelang), and the fixed-point cache. So a save costs one read, the selected rules and at most
+one write, for that page only.
+
+Changes are noticed with inotify (through libc, no extra package) where the kernel offers it,
+and otherwise by polling the mtimes of the watched pages every POLL_INTERVAL seconds. Editors
+save in bursts (write a backup, write the page or rename a temporary file over it, chmod), so
+after the first event the watcher keeps collecting events until none has come for the debounce
+delay, and then calls the callback once per page that changed.
+
+A write made by the callback would look like another save and start the same page over. When
+the callback reports that it wrote a page, the page's stat (mtime_ns, size) is remembered, and
+an event for a page whose stat still matches is dropped.
+
+Usage (library):
+    watcher = docwatch.watcher_for(['docs'])
+    docwatch.watch(watcher, handle)   # handle(path, since) -> True if it rewrote path
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+import mdwalk
+
+# quiet period that ends a burst of events, in seconds
+DEBOUNCE = 0.03
+# how often the polling watcher stats the watched pages, in seconds
+POLL_INTERVAL = 0.2
+
+# inotify event bits (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+# a page is complete once it is closed after writing or renamed into place
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct('iIII')
+
+
+def _is_page(name):
+    return name.endswith('.md') and not name.startswith('.')
+
+
+def _directories(roots):
+    """(directory, only this file or None) for every directory under roots that may hold pages;
+    hidden directories (.cache, backups) are skipped like mdwalk.iter_markdown_files() does."""
+    for root in roots:
+        if os.path.isfile(root):
+            yield os.path.dirname(os.path.abspath(root)), os.path.abspath(root)
+            continue
+        for dirpath, dirnames, _files in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            yield os.path.abspath(dirpath), None
+
+
+class InotifyWatcher:
+    """Watch the directories under roots with inotify; read() returns the pages written."""
+
+    name = 'inotify'
+
+    def __init__(self, roots):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # watch descriptor -> (directory, only this file or None)
+        self.dirs = {}
+        self.roots = roots
+        for directory, only in _directories(roots):
+            self._watch(directory, only)
+
+    def _watch(self, directory, only=None):
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+        current = self.dirs.get(wd)
+        # a directory watched for one file and then for all of it is watched for all of it
+        self.dirs[wd] = (directory, None if current and current[1] is None else only)
+
+    def read(self, timeout):
+        """Pages written within timeout seconds (None: wait for the first event); an empty set if
+        nothing happened."""
+        ready, _w, _x = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        paths = set()
+        pos = 0
+        while pos < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+            name = os.fsdecode(data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b'\0'))
+            pos += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # events were lost: every watched page may have changed
+                paths.update(os.path.abspath(p) for p in mdwalk.iter_markdown_files(self.roots))
+                continue
+            if wd not in self.dirs:
+                continue
+            directory, only = self.dirs[wd]
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and only is None and not name.startswith('.'):
+                    for sub, _only in _directories([path]):
+                        self._watch(sub)
+                    paths.update(os.path.abspath(p) for p in mdwalk.iter_markdown_files([path]))
+                continue
+            if mask & IN_CREATE and not mask & IN_MOVED_TO:
+                # an empty new file; its content arrives with IN_CLOSE_WRITE
+                continue
+            if _is_page(name) and only in (None, path):
+                paths.add(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollWatcher:
+    """Stat the pages under roots every POLL_INTERVAL seconds; read() returns the pages whose
+    (mtime_ns, size) changed, and new pages."""
+
+    name = 'polling'
+
+    def __init__(self, roots, interval=POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+        self.stats = self._scan()
+
+    def _scan(self):
+        stats = {}
+        for p in mdwalk.iter_markdown_files(self.roots):
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            stats[os.path.abspath(p)] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    def read(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stats = self._scan()
+            paths = {p for p, st in stats.items() if self.stats.get(p) != st}
+            self.stats = stats
+            if paths:
+                return paths
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            wait = self.interval if deadline is None else min(self.interval, max(deadline - time.monotonic(), 0))
+            time.sleep(wait)
+
+    def close(self):
+        pass
+
+
+def watcher_for(roots, polling=False):
+    """An InotifyWatcher for roots where inotify works, else (or with polling) a PollWatcher."""
+    if not polling:
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError):
+            pass
+    return PollWatcher(roots)
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def watch(watcher, handle, debounce=DEBOUNCE, max_batches=None):
+    """Call handle(path, since) for every page saved, once per burst of saves, until interrupted
+    (or after max_batches bursts). since is the time.monotonic() of the burst's first event, so
+    the handler can report save-to-clean latency. handle returns True when it rewrote the page;
+    the events of that write are then ignored."""
+    written = {}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        paths = watcher.read(None)
+        if not paths:
+            continue
+        since = time.monotonic()
+        while True:
+            more = watcher.read(debounce)
+            if not more:
+                break
+            paths |= more
+        batches += 1
+        for path in sorted(paths):
+            st = _stat(path)
+            if st is None or written.get(path) == st:
+                continue
+            written.pop(path, None)
+            if handle(path, since):
+                written[path] = _stat(path)
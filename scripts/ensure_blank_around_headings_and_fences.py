@@ -4,8 +4,10 @@
 import re, sys
 from pathlib import Path
 
+import atomicio
+
 def process_file(p):
-    s=p.read_text()
+    s=atomicio.read_text(p)
     lines=s.splitlines()
     out=[]
     in_f=False
@@ -41,8 +43,7 @@ def process_file(p):
         i+=1
 
     final='\n'.join(out)+"\n"
-    if final!=s:
-        p.write_text(final)
+    if atomicio.write_text(p, final, original=s):
         print('Patched', p)
         return True
     return False
@@ -9,78 +9,75 @@ Rules covered:
 This script tries to be conservative: only inserts blank lines, never removes content or reflows lines.
 """
 
-import re
+import argparse
 import sys
 from pathlib import Path
 
-LIST_RE = re.compile(r"^\s*([-*+]\s+|\d+\.\s+)")
-FENCE_RE = re.compile(r"^\s*(`{3,}|~{3,})")
+import atomicio
+import gitselect
+import mdblocks
+import mdwalk
+import runprofile
 
 
-def process_file(p: Path):
-    s = p.read_text()
-    lines = s.splitlines()
+def process_text(s):
+    doc = mdblocks.parse(s)
+    lines = doc.lines
+    # line indexes that need a blank line inserted before them
+    blank_before = set()
+    for b in doc.iter('fence'):
+        # a fence right after a list item (or any other non-blank line) gets a blank line before it
+        if b.start > 0 and lines[b.start - 1].strip() != "":
+            blank_before.add(b.start)
+        # ensure blank line after closing fence (so it's separated from lists/paragraphs)
+        if b.end < len(lines) and lines[b.end].strip() != "":
+            blank_before.add(b.end)
     out = []
-    changed = False
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        # if this line is a list item
-        if LIST_RE.match(line):
-            out.append(line)
-            # peek next line
-            if i + 1 < len(lines) and lines[i + 1].strip() != "" and FENCE_RE.match(lines[i + 1]):
-                # ensure a blank line after the list item
-                out.append('')
-                changed = True
-            i += 1
-            continue
-        # if this line is a fence and the previous non-blank line was a list item
-        if FENCE_RE.match(line):
-            # ensure there's at least one blank line before this fence
-            if out and out[-1].strip() != "" and not LIST_RE.match(out[-1]):
-                # previous non-blank line was not a list item but also not blank -> insert blank
-                # However, don't add extra blank if it's a heading separation script will handle it
-                out.append('')
-                changed = True
-            out.append(line)
-            i += 1
-            # copy the fence body until we find a closing fence
-            while i < len(lines) and not FENCE_RE.match(lines[i]):
-                out.append(lines[i])
-                i += 1
-            if i < len(lines) and FENCE_RE.match(lines[i]):
-                out.append(lines[i])
-                i += 1
-            # ensure blank line after closing fence (so it's separated from lists/paragraphs)
-            if i < len(lines) and lines[i].strip() != "":
-                out.append('')
-                changed = True
-            continue
+    for i, line in enumerate(lines):
+        if i in blank_before:
+            out.append('')
         out.append(line)
-        i += 1
+    return '\n'.join(out) + '\n'
+
 
-    final = '\n'.join(out) + '\n'
-    if final != s:
-        p.write_text(final)
+def process_file(p: Path):
+    s = atomicio.read_text(p)
+    final = process_text(s)
+    if atomicio.write_text(p, final, original=s):
         print('Patched', p)
         return True
     return False
 
 
+def _blank_transform(text):
+    return process_text(text), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Insert blank lines between lists and fenced code blocks')
+    parser.add_argument('roots', nargs='+', help='Directories to process, e.g. docs')
+    mdwalk.add_mode_args(parser)
+    gitselect.add_git_args(parser)
+    runprofile.add_profile_args(parser, 'ensure_blank_between_lists_and_fences')
+    args = parser.parse_args()
+    mode = mdwalk.mode_from_args(args)
+    runprofile.start(args, 'ensure_blank_between_lists_and_fences',
+                     [(sys.modules[__name__], ('process_text',), 'ensure_blank_between_lists_and_fences.'),
+                      (mdblocks, mdblocks.PROFILED, 'mdblocks.')])
+    paths = mdwalk.iter_markdown_files(args.roots, skip_hidden=False, selection=gitselect.from_args(args, args.roots))
+    changed = []
+    for r in mdwalk.iter_process_files(paths, _blank_transform, mode=mode):
+        if r.error:
+            print(f"Error processing {r.path}: {r.error}")
+        elif r.changed:
+            changed.append(r.path)
+            if mode == mdwalk.WRITE:
+                print('Patched', r.path)
+            else:
+                mdwalk.report_pending(r, mode)
+    runprofile.finish(args)
+    sys.exit(mdwalk.exit_status(args, changed))
+
+
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: ensure_blank_between_lists_and_fences.py <dir>')
-        sys.exit(1)
-    import os
-    changed = False
-    for r in sys.argv[1:]:
-        for dirpath, _, filenames in os.walk(r):
-            for f in filenames:
-                if f.endswith('.md'):
-                    p = Path(os.path.join(dirpath, f))
-                    if process_file(p):
-                        changed = True
-    if changed:
-        sys.exit(0)
-    sys.exit(0)
+    main()
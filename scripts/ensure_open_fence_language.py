@@ -11,10 +11,11 @@ import os
 import re
 from pathlib import Path
 
+import atomicio
+
 
 def process_file(path: Path, default_lang: str = 'text') -> bool:
-    with path.open('r', encoding='utf-8') as fh:
-        lines = fh.readlines()
+    lines = atomicio.read_lines(path)
     changed = False
     out = []
     in_fence = False
@@ -41,7 +42,7 @@ def process_file(path: Path, default_lang: str = 'text') -> bool:
                 continue
         out.append(line)
     if changed:
-        path.write_text(''.join(out), encoding='utf-8')
+        atomicio.write_text(path, ''.join(out))
     return changed
 
 
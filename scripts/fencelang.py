@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Guess the language of a fenced code block from its first lines.
+
+This is the one classifier behind every tool that labels unlabelled fences (assign_fence_language,
+fix_md040_from_json, format_markdown and fix_fence_mismatch). It replaces four separate guessers,
+each of which ran its own regex searches over the whole joined block.
+
+Only the first LOOKAHEAD lines of a block are read. Each line is scored against FEATURES, a table
+of (language, weight, pattern) compiled once at import, and the language with the highest total
+wins if it reaches MIN_SCORE. Otherwise the block is 'text'. Some checks go beyond the table:
+
+  - json: a head that starts with '{' or '[' and parses with json.loads() is json outright;
+  - yaml: a '---' or '%YAML' first line adds YAML_HEADER to yaml's score, and a block with a
+    line yaml could not parse ("Saved States:", "=====") is never yaml;
+  - a block that starts with a shell prompt ($ or user@host$) is 'bash', or 'console' when it
+    also contains lines without one (command output); one that starts with a command feeding a
+    here-document (cat > f << 'EOF') is 'bash' whatever the document looks like.
+
+The languages are the ones the docs use or are likely to: bash, console, yaml, json, ini, toml,
+nft, python, html and apache. Results are memoized by the block's head text, so a snippet repeated
+across pages (install commands, firewall rules) is classified once per run.
+
+Usage:
+    fencelang.classify(['sudo dnf install -y perfsonar-testpoint'])   # -> 'bash'
+"""
+
+import functools
+import itertools
+import json
+import re
+
+# content lines of a block that are looked at
+LOOKAHEAD = 8
+# lowest total score that names a language; below it the block is DEFAULT
+MIN_SCORE = 3
+DEFAULT = 'text'
+# bonus for yaml when the block opens with a document header
+YAML_HEADER = 5
+
+# commands that start a line of a shell snippet (after an optional "$ " prompt or "sudo ")
+_COMMANDS = (
+    'ansible', 'ansible-playbook', 'apachectl', 'apt', 'apt-get', 'ausearch', 'awk', 'bash', 'bwctl', 'cat', 'cd',
+    'certbot', 'chmod', 'chown', 'cp', 'curl', 'df', 'dig', 'dnf', 'docker', 'docker-compose', 'echo', 'ethtool',
+    'export', 'find', 'firewall-cmd', 'git', 'grep', 'grub2-mkconfig', 'grubby', 'head', 'host', 'ip', 'iperf3',
+    'journalctl', 'kill', 'ln', 'ls', 'make', 'mkdir', 'mkdocs', 'mtr', 'mv', 'nft', 'nmcli', 'npm', 'openssl',
+    'owping', 'ping', 'pip', 'pip3', 'podman', 'podman-compose', 'ps', 'psconfig', 'pscheduler', 'python',
+    'python3', 'restorecon', 'rm', 'rpm', 'scp', 'sed', 'semodule', 'service', 'sestatus', 'setsebool', 'sh',
+    'sha256sum', 'source', 'ss', 'ssh', 'sysctl', 'systemctl', 'tail', 'tar', 'tc', 'tcpdump', 'tee', 'touch',
+    'traceroute', 'tuned-adm', 'update-grub', 'wget', 'yum',
+)
+_HTML_TAGS = 'a|body|br|code|details|div|h[1-6]|head|html|img|li|link|meta|ol|p|pre|script|span|style|summary|' \
+             'table|td|th|tr|ul|!DOCTYPE'
+_APACHE_SECTIONS = 'VirtualHost|Directory|DirectoryMatch|Location|LocationMatch|Files|FilesMatch|IfModule|Proxy'
+_APACHE_DIRECTIVES = 'ServerName|ServerAlias|DocumentRoot|Listen|LoadModule|SSLEngine|SSLCertificateFile|' \
+                     'SSLCertificateKeyFile|SSLCertificateChainFile|SSLProtocol|ProxyPass|ProxyPassReverse|' \
+                     'RewriteEngine|RewriteCond|RewriteRule|Header|Require|Options|AllowOverride|ErrorLog|' \
+                     'CustomLog|Redirect'
+
+# a shell prompt: "$ cmd", "[user@host dir]$ cmd", "user@host:~$ cmd", "root@host# cmd"
+PROMPT_RE = re.compile(r"^\s*(?:\[[^\]]*\]\s?|[\w.-]+@[\w.-]+(?::\S*)?\s?)?\$\s+\S|^\s*[\w.-]+@[\w.-]+(?::\S*)?#\s+\S")
+# a command, a script (./x.sh, /opt/.../x.sh) or a subshell, after an optional prompt or sudo
+SHELL_COMMAND_RE = re.compile(r"^\s*(?:\$\s+)?(?:sudo\s+)?(?:\(\s*)?(?:(?:[\w.~-]*/)*(?:%s)(?=\s|;|$)|[\w./~-]*[\w-]\.sh(?=\s|$))"
+                              % '|'.join(re.escape(c) for c in _COMMANDS))
+# a here-document: the lines after it are the command's input, whatever they look like
+HEREDOC_RE = re.compile(r"<<-?\s*['\"]?\w+['\"]?\s*$")
+# what every line of a yaml block looks like: a comment, a document marker, a list item, a
+# "key:" line or an indented continuation
+YAML_LINE_RE = re.compile(r"^(?:\s|#|---\s*$|\.\.\.\s*$|-(?:\s|$)|[\w\"'./-]+:(?:\s|$)|%YAML\b)")
+
+# (language, weight, pattern): every line adds the weight of each pattern it matches
+FEATURES = [(lang, weight, re.compile(pattern)) for lang, weight, pattern in (
+    ('bash', 6, r"^#!\S*\b(?:ba|z)?sh\b"),
+    ('bash', 3, SHELL_COMMAND_RE.pattern),
+    ('bash', 3, PROMPT_RE.pattern),
+    ('bash', 2, r"^\s*(?:export\s+)?[A-Z_][A-Z0-9_]*=\S"),
+    ('bash', 4, r"^\s*(?:function\s+)?[\w-]+\s*\(\)\s*\{"),
+    ('bash', 1, r"\s(?:\||&&|\|\|)\s|\s\\$|\s--?[a-z][\w-]*"),
+    ('yaml', 2, r"^\s*(?:-\s+)?[A-Za-z_][\w.-]*:(?:\s|$)"),
+    ('yaml', 1, r"^\s+-\s+\S"),
+    ('yaml', 3, r"^(?:apiVersion|kind|metadata|services|volumes|plugins):(?:\s|$)"),
+    ('json', 3, r"^\s*\"[^\"]+\"\s*:"),
+    ('json', 1, r"^\s*[\[\]{}],?\s*$"),
+    ('ini', 3, r"^\s*\[[A-Za-z][\w .:-]*\]\s*$"),
+    ('ini', 1, r"^\s*[A-Za-z_][\w.-]*\s*=\s*[^\s\"'\[{\d]"),
+    ('ini', 1, r"^\s*;"),
+    ('toml', 5, r"^\s*\[\[[\w.-]+\]\]\s*$"),
+    ('toml', 2, r"^\s*\[[\w-]+(?:\.[\w-]+)+\]\s*$"),
+    ('toml', 2, r"^\s*[\w.-]+\s*=\s*(?:\"|'|\[|\{|true\b|false\b|\d)"),
+    ('nft', 6, r"^#!\S*\bnft\b"),
+    ('nft', 4, r"^\s*(?:table|chain|set|map)\s+[\w-]+(?:\s+[\w-]+)?\s*\{"),
+    ('nft', 4, r"^\s*(?:type\s+(?:filter|nat|route)\s+hook|type\s+(?:ipv[46]_addr|inet_service|ether_addr)\b)"),
+    ('nft', 4, r"^\s*(?:flush\s+ruleset|add\s+(?:table|chain|rule|set|element)\s)"),
+    ('nft', 2, r"^\s*(?:flags\s+interval|policy\s+(?:accept|drop);)"),
+    ('nft', 2, r"\b(?:[sd]addr|[sd]port|ct\s+state|iifname|oifname)\b"),
+    ('python', 6, r"^#!\S*\bpython"),
+    ('python', 5, r"^\s*(?:async\s+)?(?:def|class)\s+\w+.*:\s*$"),
+    ('python', 4, r"^\s*(?:import\s+[\w.]+(?:\s+as\s+\w+)?(?:,\s*[\w.]+)*|from\s+[.\w]+\s+import\s+\S.*)\s*$"),
+    ('python', 5, r"^\s*if\s+__name__\s*==\s*['\"]__main__['\"]\s*:"),
+    ('python', 3, r"^\s*(?:print\(|(?:elif|except|try|finally|with)\b.*:\s*$)"),
+    ('html', 3, r"^\s*<(?:%s)[\s>/]" % _HTML_TAGS),
+    ('html', 1, r"</[a-z][a-z0-9]*>"),
+    ('apache', 5, r"^\s*</?(?:%s)[\s>]" % _APACHE_SECTIONS),
+    ('apache', 3, r"^\s*(?:%s)\s+\S" % _APACHE_DIRECTIVES),
+)]
+# ties go to the language listed first
+LANGUAGES = tuple(dict.fromkeys(lang for lang, _w, _p in FEATURES))
+_RANK = {lang: i for i, lang in enumerate(LANGUAGES)}
+
+
+def _is_json(head):
+    """True if the whole head (the entire block when it is short enough) is a JSON document."""
+    try:
+        json.loads(head)
+    except ValueError:
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=4096)
+def _classify_head(head):
+    lines = head.split('\n')
+    stripped = head.strip()
+    if not stripped:
+        return DEFAULT
+    if stripped[0] in '{[' and _is_json(stripped):
+        return 'json'
+    content = [ln for ln in lines if ln.strip()]
+    if PROMPT_RE.match(content[0]):
+        # a prompt followed by lines without one is a transcript with command output
+        if any(not PROMPT_RE.match(ln) and not ln.lstrip().startswith('#') for ln in content[1:]):
+            return 'console'
+        return 'bash'
+    if HEREDOC_RE.search(content[0]) and SHELL_COMMAND_RE.match(content[0]):
+        return 'bash'
+    scores = dict.fromkeys(LANGUAGES, 0)
+    if content[0].strip() in ('---', '%YAML') or content[0].startswith('%YAML '):
+        scores['yaml'] += YAML_HEADER
+    for ln in content:
+        for lang, weight, pattern in FEATURES:
+            if pattern.search(ln):
+                scores[lang] += weight
+    if scores['yaml'] and not all(YAML_LINE_RE.match(ln) for ln in content):
+        # "Key: value" lines among ones yaml cannot parse: program output, not yaml
+        scores['yaml'] = 0
+    best = max(LANGUAGES, key=lambda lang: (scores[lang], -_RANK[lang]))
+    if scores[best] < MIN_SCORE:
+        return DEFAULT
+    return best
+
+
+def classify(lines, lookahead=LOOKAHEAD):
+    """Language of a code block given its content lines (any iterable, with or without line
+    endings); only the first lookahead lines are read."""
+    return _classify_head('\n'.join(ln.rstrip('\r\n') for ln in itertools.islice(lines, lookahead)))
+
@@ -9,11 +9,13 @@ import re
 import sys
 from pathlib import Path
 
+import atomicio
+
 FENCE_RE = re.compile(r"^(?P<indent>\s*)(?P<fence>(`{3,}|~{3,}))(?:\s*(?P<lang>\S+))?\s*$")
 
 
 def process_file(p: Path):
-    s = p.read_text()
+    s = atomicio.read_text(p)
     lines = s.splitlines()
     out = []
     in_fence = False
@@ -50,8 +52,7 @@ def process_file(p: Path):
         out.append(line)
 
     final = '\n'.join(out) + '\n'
-    if final != s:
-        p.write_text(final)
+    if atomicio.write_text(p, final, original=s):
         print('Patched', p)
         return True
     return False
@@ -2,78 +2,122 @@
 """
 Simple script to normalize fencing in a Markdown file:
 - Any closing fence that contains a language (like ```bash) is converted to ```
-- Any opening fence that is ```, and the following non-empty line begins with common shell commands, is changed to ```bash
-This runs in dry-run mode by default and can apply changes with --apply
+- Any opening fence that is ```, and whose first lines are clearly code (fencelang.py), gets that language (```bash, ```yaml, ...)
+- Any opening fence labelled ```text is changed to a bare ```
+Fences are paired with the shared block model (scripts/mdblocks.py).
+This runs in dry-run mode by default and can apply changes with --apply; --check (exit status 1
+if any file would change) and --diff (unified diffs) never write.
 """
 import argparse
-import re
+import sys
 from pathlib import Path
 
-SHELL_CMD_RE = re.compile(r"^(\s*)(sudo\s+|bash\s+|curl\s+|sysctl\s+|sha256sum\s+|ethtool\s+|tc\s+|tuned-adm\s+|grubby\s+|grub2-mkconfig\s+|update-grub\s+|cat\s+|awk\s+)")
+import atomicio
+import backupstore
+import fencelang
+import gitselect
+import mdblocks
+import mdwalk
+import runprofile
 
 
-def normalize_file(path: Path, apply: bool = False) -> dict:
-    lines = path.read_text(encoding="utf-8").splitlines()
+def _mistaken_closer(doc, block):
+    """Return the index of a '```lang' line inside a backtick fence that was meant to close it.
+
+    A fence can only be closed by a bare fence, so a same-length fence line with a language inside an
+    open block is almost always a closing fence typed with a language by mistake.
+    """
+    for k in block.content:
+        ln = doc.line_info[k]
+        if ln.kind == 'fence' and ln.info and ln.marker == block.marker:
+            return k
+    return None
+
+
+def normalize_text(text: str):
+    """Return (new_text, changes) where changes lists (line_no, old, new) tuples."""
+    lines = text.splitlines()
     changed = []
-    in_fence = False
-    fence_lang = None
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        m = re.match(r"^(\s*)```(\w+)?\s*$", line)
-        if m:
-            if not in_fence:
-                # opening fence
-                lang = m.group(2) or ""
-                # look ahead for next non-empty line
-                j = i+1
-                while j < len(lines) and lines[j].strip() == "":
-                    j += 1
-                next_line = lines[j] if j < len(lines) else ""
-                if not lang:
-                    if SHELL_CMD_RE.match(next_line):
-                        new_line = m.group(1) + "```bash"
-                        if new_line != line:
-                            changed.append((i+1, line, new_line))
-                            lines[i] = new_line
-                            lang = "bash"
-                # Normalize explicit 'text' language fences to plain fences to avoid html leaking
-                elif lang == 'text':
-                    new_line2 = m.group(1) + "```"
-                    if new_line2 != line:
-                        changed.append((i+1, line, new_line2))
-                        lines[i] = new_line2
-                fence_lang = lang
-                in_fence = True
-            else:
-                # closing fence
-                # Always normalize closing fence to plain ```
-                leading = m.group(1)
-                new_line = leading + "```"
-                if new_line != line:
-                    changed.append((i+1, line, new_line))
-                    lines[i] = new_line
-                in_fence = False
-                fence_lang = None
-        i += 1
+    # Closing fences written with a language: strip the language and re-parse, since every
+    # fence after the mistake is paired differently once it is fixed.
+    while True:
+        doc = mdblocks.parse("\n".join(lines))
+        for b in doc.iter('fence'):
+            k = _mistaken_closer(doc, b) if b.marker == "```" else None
+            if k is not None:
+                new_line = lines[k][:doc.line_info[k].indent] + "```"
+                changed.append((k+1, lines[k], new_line))
+                lines[k] = new_line
+                break
+        else:
+            break
+    for b in doc.iter('fence'):
+        if b.marker != "```":
+            continue
+        line = lines[b.start]
+        leading = line[:b.indent]
+        if not b.info:
+            # label the block when its first lines clearly are code; 'text' would be stripped below
+            lang = fencelang.classify(lines[k] for k in b.content)
+            if lang != fencelang.DEFAULT:
+                new_line = leading + "```" + lang
+                changed.append((b.start+1, line, new_line))
+                lines[b.start] = new_line
+        # Normalize explicit 'text' language fences to plain fences to avoid html leaking
+        elif b.info == 'text':
+            new_line2 = leading + "```"
+            changed.append((b.start+1, line, new_line2))
+            lines[b.start] = new_line2
+    changed.sort()
+    if not changed:
+        return text, changed
+    return "\n".join(lines) + "\n", changed
+
+
+def normalize_file(path: Path, apply: bool = False) -> dict:
+    text = atomicio.read_text(path)
+    new_text, changed = normalize_text(text)
     if apply and changed:
-        backup = path.parent / ".indent_fix_backups"
-        backup.mkdir(exist_ok=True)
-        bakfile = backup / (path.name + ".bak.auto")
-        if not bakfile.exists():
-            bakfile.write_text(path.read_text(encoding="utf-8"), encoding="utf-8")
-        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        backupstore.backup(path, text, "fix_fence_mismatch")
+        atomicio.write_text(path, new_text, original=text)
     return {"path": str(path), "changes": changed}
 
 
+def _normalize_transform(text):
+    return normalize_text(text)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("files", nargs="+", help="Markdown files to normalize")
     parser.add_argument("--apply", action="store_true", help="Apply changes")
+    mdwalk.add_mode_args(parser)
+    gitselect.add_git_args(parser)
+    runprofile.add_profile_args(parser, 'fix_fence_mismatch')
     args = parser.parse_args()
+    mode = mdwalk.mode_from_args(args)
+    runprofile.start(args, 'fix_fence_mismatch',
+                     [(sys.modules[__name__], ('normalize_text',), 'fix_fence_mismatch.'),
+                      (mdblocks, mdblocks.PROFILED, 'mdblocks.')])
+    selection = gitselect.from_args(args, args.files)
+    if selection is not None:
+        args.files = list(selection.files_under(args.files))
+    if mode != mdwalk.WRITE:
+        # --check/--diff never write (nor back up), even with --apply
+        changed = []
+        for r in mdwalk.iter_process_files(args.files, _normalize_transform, mode=mode):
+            if r.error:
+                print(f"Error {r.path}: {r.error}")
+            elif r.changed:
+                changed.append(r.path)
+                mdwalk.report_pending(r, mode)
+        runprofile.finish(args)
+        sys.exit(mdwalk.exit_status(args, changed))
     total = []
     for f in args.files:
-        res = normalize_file(Path(f), apply=args.apply)
+        with runprofile.file_timer(f) as entry:
+            res = normalize_file(Path(f), apply=args.apply)
+            entry['changed'] = bool(args.apply and res["changes"])
         total.append(res)
     for r in total:
         print(r["path"])
@@ -83,6 +127,7 @@ def main():
             print('  changes:')
             for ln, old, new in r["changes"]:
                 print(f"   - line {ln}: '{old}' -> '{new}'")
+    runprofile.finish(args)
 
 if __name__ == '__main__':
     main()
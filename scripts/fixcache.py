@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Persistent content-hash cache recording which files are already a fixed point of a rule set.
+
+The cache lives in a small JSON file (default .cache/docsfix.json) and holds, per rule-set key,
+the SHA-256 digests of content that the rule set leaves unchanged, plus the last stat
+(mtime_ns, size) and digest seen for each path. An unchanged file therefore costs one stat and
+no read or parse; a file whose content was seen clean under another path costs one read and hash.
+
+The rule-set key hashes the source of every module involved plus the options, so editing a
+fixer (or mdblocks.py) or changing the selected rules invalidates the cache automatically.
+
+Usage (library):
+    key = fixcache.ruleset_key([format_markdown, mdblocks], {'rules': 'format'})
+    cache = fixcache.FixCache(fixcache.DEFAULT_CACHE, key)
+    if not cache.is_clean(path): ... cache.mark_clean(path, text)
+    cache.save()
+"""
+
+import hashlib
+import json
+import os
+
+import atomicio
+
+DEFAULT_CACHE = os.path.join('.cache', 'docsfix.json')
+CACHE_VERSION = 1
+# rule sets kept in the cache file; older keys (stale script versions) are evicted first
+MAX_RULESETS = 8
+
+
+def digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+    """digest() of a file's content, read in chunks; equal to digest(text) for UTF-8 files with
+    '\\n' line endings, which is what every fixer writes."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def ruleset_key(modules, options=None):
+    """Hash the source files of the given modules together with the options."""
+    h = hashlib.sha256()
+    for mod in sorted(modules, key=lambda m: m.__name__):
+        h.update(mod.__name__.encode('utf-8'))
+        with open(mod.__file__, 'rb') as fh:
+            h.update(fh.read())
+    h.update(json.dumps(options or {}, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+class FixCache:
+    """Fixed-point cache for one rule-set key. Call save() to persist updates."""
+
+    def __init__(self, cache_path, key):
+        self.cache_path = cache_path
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._data = {'version': CACHE_VERSION, 'rulesets': {}}
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            if data.get('version') == CACHE_VERSION:
+                self._data = data
+        except (OSError, ValueError):
+            pass
+        rulesets = self._data['rulesets']
+        if key not in rulesets:
+            rulesets[key] = {'clean': [], 'files': {}}
+        self._clean = set(rulesets[key]['clean'])
+        self._files = rulesets[key]['files']
+
+    def is_clean(self, path):
+        """True when path's stat matches an entry whose content is a known fixed point."""
+        entry = self._files.get(os.path.abspath(path))
+        if entry:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st and entry[0] == st.st_mtime_ns and entry[1] == st.st_size and entry[2] in self._clean:
+                self.hits += 1
+                return True
+        self.misses += 1
+        return False
+
+    def is_clean_text(self, text):
+        """True when this exact content is a known fixed point (e.g. identical file elsewhere)."""
+        return digest(text) in self._clean
+
+    @property
+    def clean_digests(self):
+        return set(self._clean)
+
+    def mark_clean(self, path, text):
+        """Record that path's current content (text) is left unchanged by the rule set."""
+        self.mark_clean_digest(path, digest(text))
+
+    def mark_clean_digest(self, path, d):
+        self._clean.add(d)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self._files[os.path.abspath(path)] = [st.st_mtime_ns, st.st_size, d]
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        rulesets = self._data['rulesets']
+        # drop entries for files that no longer exist and digests no file refers to any more
+        for path in [p for p in self._files if not os.path.exists(p)]:
+            del self._files[path]
+        referenced = {entry[2] for entry in self._files.values()}
+        # keep the current rule set last so it is the most recently used one
+        current = rulesets.pop(self.key)
+        current['clean'] = sorted(self._clean & referenced)
+        rulesets[self.key] = current
+        while len(rulesets) > MAX_RULESETS:
+            rulesets.pop(next(iter(rulesets)))
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomicio.write_text(self.cache_path, json.dumps(self._data))
+        self._dirty = False
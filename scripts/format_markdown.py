@@ -9,34 +9,99 @@ Small formatter for Markdown files in 'docs/' to address common markdownlint war
 - Normalize list marker spacing (one space after marker)
 - Wrap paragraph lines to 120 columns (not inside code blocks, lists, or YAML front matter)
 
+Files whose content is already formatted are skipped using the fixed-point cache in .cache/docsfix.json
+(invalidated whenever this script or a module it formats with changes: mdblocks.py, mdwrap.py or
+fencelang.py); pass --no-cache to format everything.
+
+With --stream each file is formatted line by line through a chain of generators into a temporary
+file, which replaces the original only if the bytes differ; memory use then depends on the longest
+paragraph, not on the file size (useful for TWiki archive dumps and generated reference pages).
+
+--check reports files that would change and exits with status 1 if there are any; --diff prints
+a unified diff per file instead. Neither writes anything.
+
 Usage: python3 scripts/format_markdown.py docs
+       python3 scripts/format_markdown.py docs --check
 """
 
+import argparse
+import collections
+import filecmp
 import os
-import sys
-import textwrap
 import re
+import sys
+
+import atomicio
+import fencelang
+import fixcache
+import gitselect
+import mdblocks
+import mdwalk
+import mdwrap
+import runprofile
+
+
+# Module-level patterns, compiled once. Line classification itself comes from mdblocks.LINE_RE.
+LIST_MARKER_RE = re.compile(r"^(\s*)([-*+]|\d+\.)\s+(.*)$")
+ORDERED_ITEM_RE = re.compile(r"^(\s*)(\d+)\.(\s+)(.*)$")
+BULLET_ITEM_RE = re.compile(r"^(\s*)([-*+])(\s+)(.*)$")
+MARKER_SPACING_RE = re.compile(r"^(\s*[-*+])(\s{2,})(.*)$")
+LOOSE_MARKER_RE = re.compile(r"^(\s*([-*+]|\d+\.))\s{2,}")
+FENCE_HAS_LANG_RE = re.compile(r"^\s*(`{3,}|~{3,})\s*\w+")
+FENCE_OPEN_RE = re.compile(r"^(\s*)(`{3,}|~{3,})\s*(\w+)?\s*$")
+TRAILING_WS_RE = re.compile(r"[\t ]+$")
+HEADING_TRAILING_DOTS_RE = re.compile(r"\s+[\.]+$")
+BARE_URL_RE = re.compile(r'(?<![\(<\[])(https?://[^\s,);]+)')
+# an address that is not part of a longer one, link text, a mailto: href or an <autolink> already
+BARE_EMAIL_RE = re.compile(r'(?<![<\[\w/.%+:-])([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})(?![\w>])')
+BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+TWIKI_SPAN_RE = re.compile(r"<span\s+class=\"twiki-macro[^\"]*\">")
+SPAN_CLOSE_RE = re.compile(r"</span>")
+IMG_ALT_RE = re.compile(r"<img\s+[^>]*src=\"([^\"]+)\"[^>]*alt=\"([^\"]*)\"[^>]*>")
+IMG_SRC_RE = re.compile(r"<img\s+[^>]*src=\"([^\"]+)\"[^>]*>")
+# fence-language detection looks at this many content lines; the heading rule looks 2 lines ahead
+FENCE_LOOKAHEAD = fencelang.LOOKAHEAD
+# the pipeline stages timed separately under --profile (see runprofile.py)
+PROFILED = ('_format_blocks', '_format_fence', '_format_list_item', '_format_paragraph', '_fill', 'wrap_bare_urls',
+            '_trim_blank_edges', 'ensure_fence_languages', '_collapse_blank_runs')
+
+
+def line_kind(rec, line):
+    """Reduce an mdblocks.Line record to the kinds format_text distinguishes:
+    'heading' (ATX at column 0), 'list' ('-', '*', '+' or 'N.' items), 'fence', 'blank' or 'text'."""
+    kind = rec.kind
+    if kind == 'heading':
+        return 'heading' if rec.indent == 0 and len(line) > len(rec.marker) else 'text'
+    if kind == 'list':
+        return 'list' if not rec.marker.endswith(')') else 'text'
+    if kind == 'fence' or kind == 'blank':
+        return kind
+    return 'text'
+
+
+def classify(line):
+    return line_kind(mdblocks.classify_line(line), line)
 
 
 def is_heading(line):
-    return bool(re.match(r"^#{1,6}\s+", line))
+    return classify(line) == 'heading'
 
 
 def is_fence(line):
-    return bool(re.match(r"^\s*(`{3,}|~{3,})", line))
+    return classify(line) == 'fence'
 
 
 def is_list_item(line):
-    return bool(re.match(r"^\s*([-*+]\s+|\d+\.\s+)", line))
+    return classify(line) == 'list'
 
 
 def normalize_list_marker(line):
-    m = re.match(r"^(\s*)(\d+)\.(\s+)(.*)$", line)
+    m = ORDERED_ITEM_RE.match(line)
     if m:
         indent, _num, spaces, rest = m.groups()
         return f"{indent}1. {rest.rstrip()}\n"
     # unordered list marker spacing
-    m2 = re.match(r"^(\s*)([-*+])(\s+)(.*)$", line)
+    m2 = BULLET_ITEM_RE.match(line)
     if m2:
         indent, marker, spaces, rest = m2.groups()
         # normalize to a single space after the marker
@@ -46,370 +111,443 @@ def normalize_list_marker(line):
 
 def enforce_list_marker_spacing(line):
     # Convert instances of '-   ' or '*   ' to single space after marker
-    return re.sub(r"^(\s*[-*+])(\s{2,})(.*)$", r"\1 \3", line)
+    return MARKER_SPACING_RE.sub(r"\1 \3", line)
 
 
 def add_fence_language(fence_line, inner_lines):
     # If fence_line already has a language, keep it
     # allow optional whitespace between fence and language
-    if re.match(r"^\s*(`{3,}|~{3,})\s*\w+", fence_line):
+    if FENCE_HAS_LANG_RE.match(fence_line):
         return fence_line
-    # If inner lines look like shell commands, use 'bash'
-    shell_sig = re.compile(r"^(\s*[$#]|\s*(sudo|curl|systemctl|podman|dnf|ls|ip|nmcli|pscheduler|psconfig|sed|awk|grep|cat)\b)")
-    for l in inner_lines[:6]:
-        if shell_sig.search(l):
-            # include a single space before the language if missing
-            return fence_line.rstrip() + ' bash'
-    # default to 'text' to satisfy markdownlint
-    return fence_line.rstrip() + ' text'
+    # otherwise guess from the first content lines; 'text' still satisfies markdownlint
+    return fence_line.rstrip() + ' ' + fencelang.classify(inner_lines)
+
+
+def wrap_bare_urls(s):
+    # Replace bare URLs in a safe way: wrap with angle brackets if not in a markdown link
+    # (http(s):// patterns not immediately prefixed by '(' or '[').
+    s = BARE_URL_RE.sub(r'<\1>', s)
+    # wrap email addresses too (basic detection)
+    return BARE_EMAIL_RE.sub(r'<\1>', s)
 
 
 def wrap_paragraph(text, width=120):
-    # Use textwrap to wrap paragraphs preserving leading indentation for nested blocks
-    # Support multiple paragraphs separated by blank lines inside text
+    # Wrap each run of non-blank lines as one paragraph, keeping its leading indentation.
+    # mdwrap never splits URLs, code spans or links, so paragraphs with links are wrapped too.
     out_lines = []
-    paragraphs = text.split('\n')
-    # We'll process continuous non-blank lines as a paragraph
     buf = []
-    for line in paragraphs:
+    for line in text.split('\n'):
         if not line.strip():
             if buf:
-                para = ' '.join(l.strip() for l in buf)
-                out_lines.append(textwrap.fill(para, width=width))
+                out_lines.extend(mdwrap.fill_lines(buf, width))
                 buf = []
             out_lines.append('')
         else:
             buf.append(line)
     if buf:
-        para = ' '.join(l.strip() for l in buf)
-        # Skip wrapping if a paragraph contains a URL or an email address to avoid breaking links
-        if re.search(r"https?://|mailto:|@\w+\.", para):
-            out_lines.append(para)
-        else:
-            out_lines.append(textwrap.fill(para, width=width))
+        out_lines.extend(mdwrap.fill_lines(buf, width))
     return '\n'.join(out_lines)
 
 
-def format_file(path):
-    changed = False
-    with open(path, 'r', encoding='utf-8') as fh:
-        lines = fh.readlines()
-
-    out = []
-    in_fence = False
-    fence_tag = None
-    in_frontmatter = False
-    fm_closed = True
-    # detect YAML frontmatter first
-    if len(lines) > 0 and lines[0].strip() == '---':
-        in_frontmatter = True
-        fm_closed = False
-
-    i = 0
-    # Pre-scan file to detect base list indentation used in this file (skip frontmatter and fenced blocks)
-    base_indent = None
-    scan_in_fence = False
+class _Lookahead:
+    """Iterator wrapper that buffers only the records peek() has asked for."""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self._buf = collections.deque()
+
+    def peek(self, k=0):
+        """Return the record k places ahead of the current one (0 = current), or None at the end."""
+        while len(self._buf) <= k:
+            nxt = next(self._it, None)
+            if nxt is None:
+                return None
+            self._buf.append(nxt)
+        return self._buf[k]
+
+    def pop(self):
+        self.peek()
+        return self._buf.popleft() if self._buf else None
+
+
+def _kind(rec):
+    """format_text's kind for a tracked line; a fence is only a line that opens a fenced block."""
+    if rec.role == 'fence':
+        return 'fence'
+    kind = line_kind(rec.info, rec.text)
+    return 'text' if kind == 'fence' else kind
+
+
+def list_base_indent(lines):
+    """Smallest list item indent in the file (0 without lists); front matter, fenced code and
+    HTML blocks never contain list items."""
+    return min((rec.info.indent for rec in mdblocks.iter_lines(lines) if rec.role == 'list_item'), default=0)
+
+
+def _format_blocks(records, base_indent):
+    """Main pass: yield the formatted lines for a stream of mdblocks.StreamLine records.
+
+    At most FENCE_LOOKAHEAD records are buffered (fence-language detection); a paragraph is
+    collected whole because the wrapper needs it in one piece."""
+    src = _Lookahead(records)
+    last = None  # last line yielded
+    prev_non_empty = None  # last non-empty line yielded
+    while True:
+        rec = src.pop()
+        if rec is None:
+            break
+        line = rec.text
+        out = []
+
+        if rec.role == 'frontmatter':
+            # copy YAML front matter through untouched apart from trailing whitespace
+            out.append(line.rstrip())
+
+        elif rec.role == 'fence':
+            out = _format_fence(line, src, last)
+
+        else:
+            kind = _kind(rec)
+            # trim trailing whitespace
+            line = TRAILING_WS_RE.sub('', line)
+
+            # remove multiple blank lines: limit to one
+            if kind == 'blank':
+                if last != '':
+                    out.append('')
+
+            # headings: ensure blank line before; will ensure one blank after too by handling next iteration
+            elif kind == 'heading':
+                # remove trailing punctuation like '.' from headings (MD026)
+                # Be conservative: only remove a trailing '.' at the end of heading line
+                line = HEADING_TRAILING_DOTS_RE.sub('', line)
+                if last is not None and last.strip() != '':
+                    out.append('')
+                out.append(line.rstrip())
+                # Add blank after heading, if next non-blank isn't a list or code fence, we want a blank line
+                nxt, after = src.peek(), src.peek(1)
+                if nxt is not None:
+                    if _kind(nxt) == 'blank' and not (after is not None and after.role == 'fence'):
+                        # keep as-is
+                        pass
+                    else:
+                        # add a blank line after heading
+                        out.append('')
+
+            # ensure blank line before lists
+            elif kind == 'list':
+                if last is not None and last.strip() != '':
+                    out.append('')
+                out.append(_format_list_item(line, prev_non_empty, base_indent))
+
+            else:
+                out.extend(_format_paragraph(line, src))
+
+        for ln in out:
+            last = ln
+            if ln.strip() != '':
+                prev_non_empty = ln
+            yield ln
+
+
+def _format_fence(line, src, last):
+    """Fenced code block: copy it whole, only trimming trailing spaces. Yields lazily so a long
+    block is never held in memory."""
+    # ensure blank line before fence
+    if last is not None and last.strip() != '':
+        yield ''
+    # add a language to the opening fence based on its first content lines
+    inner = []
+    while len(inner) < FENCE_LOOKAHEAD:
+        nxt = src.peek(len(inner))
+        if nxt is None or nxt.role != 'code':
+            break
+        inner.append(nxt.text)
+    yield add_fence_language(line, inner).rstrip()
+    while src.peek() is not None and src.peek().role == 'code':
+        yield src.pop().text.rstrip()
+    if src.peek() is not None and src.peek().role == 'fence_end':
+        yield src.pop().text.rstrip()
+        # add a blank line after fence
+        yield ''
+
+
+def _format_list_item(line, prev_non_empty, base_indent):
+    # normalize the list marker spacing and ordered list prefix
+    # first ensure spacing after marker is normalized
+    line = enforce_list_marker_spacing(line)
+    normalized = normalize_list_marker(line + '\n')
+    # reduce excessive top-level indentation: if indent >= 4 and previous non-blank is a heading or blank, set to 2 spaces
+    m = LIST_MARKER_RE.match(normalized)
+    if m:
+        indent_str, marker, rest = m.groups()
+        indent_len = len(indent_str)
+        prev_kind = classify(prev_non_empty) if prev_non_empty else None
+        # Determine the previous list indent to align this item with
+        prev_indent = 0
+        if prev_kind == 'list':
+            pm = LIST_MARKER_RE.match(prev_non_empty)
+            if pm:
+                prev_indent = len(pm.groups()[0])
+        # If indentation is too large, reduce to prev_indent + 2
+        if indent_len >= prev_indent + 4:
+            new_indent = ' ' * (prev_indent + 2)
+            normalized = f"{new_indent}{marker} {rest}"
+        # If indentation suggests nested list but not aligned, align to prev + 2
+        elif indent_len > prev_indent and indent_len != prev_indent + 2:
+            new_indent = ' ' * (prev_indent + 2)
+            normalized = f"{new_indent}{marker} {rest}"
+        elif indent_len == 1:
+            # adjust 1-space indent to 0
+            new_indent = ''
+            normalized = f"{new_indent}{marker} {rest}"
+        # Align the indentation to the file's base indent if this is a top-level list under a heading
+        # If the previous non-empty element is a heading, align to base_indent
+        if prev_kind == 'heading':
+            # When a list immediately follows a heading, prefer a top-level list (0 indent)
+            desired_indent = 0
+        elif prev_non_empty and prev_non_empty.strip() == '':
+            desired_indent = base_indent
+        elif prev_non_empty and prev_kind != 'list':
+            desired_indent = 0
+        else:
+            desired_indent = base_indent
+            if indent_len != desired_indent:
+                normalized = f"{' ' * desired_indent}{marker} {rest}"
+    return normalized.rstrip()
+
+
+def _format_paragraph(line, src):
+    """Clean up one paragraph line and wrap it together with the text lines that follow it."""
+    line = wrap_bare_urls(line)
+
+    # Replace common inline HTML break tags with markdown line breaks (two spaces + newline)
+    # We intentionally do this only for explicit <br> tags to avoid altering inline spans or layout
+    line = BR_RE.sub("  ", line)
+
+    # Remove twiki 'span' macro tags and other empty 'span' wrappers used by imported twiki content
+    # This handles patterns like: <span class="twiki-macro LINKCSS"></span>
+    line = TWIKI_SPAN_RE.sub("", line)
+    line = SPAN_CLOSE_RE.sub("", line)
+
+    # Convert simple <img src="..."> to markdown images if possible
+    img_match = IMG_ALT_RE.search(line)
+    if img_match:
+        src_url, alt = img_match.groups()
+        mdimg = f"![{alt}]({src_url})"
+        line = IMG_ALT_RE.sub(lambda _m: mdimg, line)
+    else:
+        # fallback: if only src is present
+        img_match2 = IMG_SRC_RE.search(line)
+        if img_match2:
+            src_url = img_match2.groups()[0]
+            line = IMG_SRC_RE.sub(lambda _m: f"![]({src_url})", line)
+
+    # reduce multiple spaces after list markers globally
+    line = LOOSE_MARKER_RE.sub(r"\1 ", line)
+
+    # for normal paragraph lines, collect contiguous lines and wrap them
+    # gather lines until blank or heading or list or fence
+    para = [line]
+    while src.peek() is not None and _kind(src.peek()) == 'text':
+        para.append(TRAILING_WS_RE.sub('', src.pop().text))
+    if len(para) > 1 or len(line) > 120:
+        # wrap paragraph, at the first line's indentation (list item continuations, admonitions)
+        return _fill(para)
+    return [line]
+
+
+def _fill(lines):
+    return mdwrap.fill_lines(lines, width=120)
+
+
+def _trim_blank_edges(lines):
+    """Drop blank lines at the start and end of the stream. Blank lines after the last non-blank
+    line seen are held back run-length encoded, so a long blank run costs no memory."""
+    started = False
+    pending = []  # [line, count] runs of held-back blank lines
     for ln in lines:
-        l = ln.rstrip('\n')
-        if l.strip() == '---' and lines.index(ln) == 0:
-            # simplistic frontmatter skip: ignore first '---'
-            continue
-        if is_fence(l):
-            scan_in_fence = not scan_in_fence
+        if ln.strip() == '':
+            if started:
+                if pending and pending[-1][0] == ln:
+                    pending[-1][1] += 1
+                else:
+                    pending.append([ln, 1])
             continue
-        if scan_in_fence:
+        started = True
+        for blank, count in pending:
+            for _ in range(count):
+                yield blank
+        pending = []
+        yield ln
+
+
+def ensure_fence_languages(lines):
+    """Final pass over the formatted lines: make sure every opening fence has a language and that
+    top-level fence lines are indented by at most 3 spaces. The lines are re-classified as they
+    stream past and fences are paired by mdblocks' rules, so closing fences and fences nested in
+    longer fences are never mistaken for openers. Containment is judged on the formatted text
+    because formatting can move a fence out of a list item."""
+    keep = 0
+    for rec in mdblocks.iter_lines(lines):
+        line = rec.text
+        if rec.role == 'fence':
+            # fences inside admonitions and list items keep their indentation
+            keep = rec.info.indent if rec.contained else min(rec.info.indent, 3)
+            m = FENCE_OPEN_RE.match(line)
+            if m and not m.group(3):
+                line = f"{line[:keep]}{rec.info.marker} text"
+            elif rec.info.indent > keep:
+                line = line[:keep] + line.lstrip()
+        elif rec.role == 'fence_end':
+            line = line[:keep] + line.lstrip()
+        yield line
+
+
+def _collapse_blank_runs(lines):
+    # Collapse multiple blank lines to a single blank line
+    last = None
+    for ln in lines:
+        if ln == '' and last == '':
             continue
-        if is_list_item(l):
-            mm = re.match(r"^(\s*)([-*+]|\d+\.)\s+", l)
-            if mm:
-                indent = len(mm.groups()[0])
-                if base_indent is None or indent < base_indent:
-                    base_indent = indent
+        last = ln
+        yield ln
+
+
+def format_lines(lines, base_indent=None):
+    """Yield the formatted lines (without newlines) for an iterable of input lines.
+
+    Every stage is a generator, so memory use is bounded by the look-ahead window and the longest
+    paragraph rather than by the file size. base_indent is the file's list_base_indent(); pass it
+    when lines is a one-shot iterator, since computing it needs a separate pass.
+    """
     if base_indent is None:
-        base_indent = 0
-    # We'll produce new_lines with paragraph wrapping post-processing
-    new_lines = []
-    while i < len(lines):
-        line = lines[i].rstrip('\n')
-        # handle frontmatter
-        if in_frontmatter and not fm_closed:
-            new_lines.append(line.rstrip())
-            if line.strip() == '---' and i != 0:
-                fm_closed = True
-                in_frontmatter = False
-            i += 1
-            continue
+        lines = list(lines)
+        base_indent = list_base_indent(lines)
+    formatted = _format_blocks(mdblocks.iter_lines(lines), base_indent)
+    # Final pass: ensure opening fences have a language and normalize fence indentation
+    return _collapse_blank_runs(ensure_fence_languages(_trim_blank_edges(formatted)))
 
-        # fenced code block toggle
-        if is_fence(line):
-            if not in_fence:
-                # ensure blank line before fence
-                if new_lines and new_lines[-1].strip() != '':
-                    new_lines.append('')
-                in_fence = True
-                fence_tag = re.match(r"^\s*(`{3,}|~{3,})(.*)$", line).groups()[0]
-                # collect inner lines to analyze and decide if language should be appended
-                inner_lines = []
-                # look ahead but don't pass beyond the end; we'll add language after collecting
-                k = i + 1
-                while k < len(lines) and not is_fence(lines[k]):
-                    inner_lines.append(lines[k])
-                    k += 1
-                append_lang = add_fence_language(line, inner_lines)
-                new_lines.append(append_lang.rstrip())
-            else:
-                in_fence = False
-                new_lines.append(line.rstrip())
-                # add a blank line after fence
-                new_lines.append('')
-            i += 1
-            continue
 
-        # within fenced code block, don't change the content other than trimming trailing spaces
-        if in_fence:
-            new_lines.append(line.rstrip())
-            i += 1
-            continue
+def format_text(text):
+    """Return the formatted version of a Markdown document's text."""
+    lines = text.splitlines()
+    return '\n'.join(format_lines(lines, list_base_indent(lines))) + '\n'
 
-        # trim trailing whitespace
-        line = re.sub(r"[\t ]+$", '', line)
 
-        # remove multiple blank lines: limit to one
-        if not line.strip():
-            if new_lines and new_lines[-1] == '':
-                # skip duplicate blank
-                i += 1
-                continue
-            else:
-                new_lines.append('')
-                i += 1
-                continue
-
-        # headings: ensure blank line before; will ensure one blank after too by handling next iteration
-        if is_heading(line):
-            # strip leading whitespace before a heading so it starts on column 0
-            line = line.lstrip()
-            # remove trailing punctuation like '.' from headings (MD026)
-            # Be conservative: only remove a trailing '.' at the end of heading line
-            line = re.sub(r"\s+[\.]+$", '', line)
-            if new_lines and new_lines[-1].strip() != '':
-                new_lines.append('')
-            new_lines.append(line.rstrip())
-            # Add blank after heading, if next non-blank isn't a list or code fence, we want a blank line
-            # We'll enforce a blank in next iteration as needed
-            if i + 1 < len(lines):
-                next_line = lines[i+1]
-                if next_line.strip() == '' and not (i+2 < len(lines) and is_fence(lines[i+2])):
-                    # keep as-is
-                    pass
-                else:
-                    # add a blank line after heading
-                    new_lines.append('')
-            i += 1
-            continue
+def _file_lines(fh):
+    # split like str.splitlines() so streamed and in-memory formatting see the same lines
+    for raw in fh:
+        yield from raw.splitlines()
 
-        # ensure blank line before lists
-        if is_list_item(line):
-            if new_lines and new_lines[-1].strip() != '':
-                new_lines.append('')
-            # normalize the list marker spacing and ordered list prefix
-            # first ensure spacing after marker is normalized
-            line = enforce_list_marker_spacing(line)
-            normalized = normalize_list_marker(line + '\n')
-            # reduce excessive top-level indentation: if indent >= 4 and previous non-blank is a heading or blank, set to 2 spaces
-            m = re.match(r"^(\s*)([-*+]|\d+\.)\s+(.*)$", normalized)
-            if m:
-                indent_str, marker, rest = m.groups()
-                indent_len = len(indent_str)
-                # find the previous non-empty line
-                prev_non_empty = None
-                for ln in reversed(new_lines):
-                    if ln.strip() != '':
-                        prev_non_empty = ln
-                        break
-                # Determine the previous list indent to align this item with
-                prev_indent = 0
-                if prev_non_empty and is_list_item(prev_non_empty):
-                    pm = re.match(r"^(\s*)([-*+]|\d+\.)\s+(.*)$", prev_non_empty)
-                    if pm:
-                        prev_indent = len(pm.groups()[0])
-                # If indentation is too large, reduce to prev_indent + 2
-                if indent_len >= prev_indent + 4:
-                    new_indent = ' ' * (prev_indent + 2)
-                    normalized = f"{new_indent}{marker} {rest}"
-                # If indentation suggests nested list but not aligned, align to prev + 2
-                elif indent_len > prev_indent and indent_len != prev_indent + 2:
-                    new_indent = ' ' * (prev_indent + 2)
-                    normalized = f"{new_indent}{marker} {rest}"
-                elif indent_len == 1:
-                    # adjust 1-space indent to 0
-                    new_indent = ''
-                    normalized = f"{new_indent}{marker} {rest}"
-                # Align the indentation to the file's base indent if this is a top-level list under a heading
-                # If the previous non-empty element is a heading, align to base_indent
-                if prev_non_empty and is_heading(prev_non_empty):
-                    # When a list immediately follows a heading, prefer a top-level list (0 indent)
-                    desired_indent = 0
-                elif prev_non_empty and prev_non_empty.strip() == '':
-                    desired_indent = base_indent
-                elif prev_non_empty and not is_list_item(prev_non_empty):
-                    desired_indent = 0
-                else:
-                    desired_indent = base_indent
-                    if indent_len != desired_indent:
-                        normalized = f"{' ' * desired_indent}{marker} {rest}"
-            new_lines.append(normalized.rstrip())
-            i += 1
-            continue
-        # Replace bare URLs in a safe way: wrap with angle brackets if not in a markdown link
-        # Use a simple regex to detect http(s):// patterns not immediately prefixed by '(' or '['.
-        def wrap_bare_urls(s):
-                    pattern = re.compile(r'(?<![\(<\[])(https?://[^\s,);]+)')
-                    s = pattern.sub(r'<\1>', s)
-                    # wrap email addresses too (basic detection)
-                    email_pat = re.compile(r'(?<![<\w/])([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})')
-                    s = email_pat.sub(r'<\1>', s)
-                    return s
-        line = wrap_bare_urls(line)
-
-        # Replace common inline HTML break tags with markdown line breaks (two spaces + newline)
-        # We intentionally do this only for explicit <br> tags to avoid altering inline spans or layout
-        line = re.sub(r"<br\s*/?>", "  ", line, flags=re.IGNORECASE)
-
-        # Remove twiki 'span' macro tags and other empty 'span' wrappers used by imported twiki content
-        # This handles patterns like: <span class="twiki-macro LINKCSS"></span>
-        line = re.sub(r"<span\s+class=\"twiki-macro[^\"]*\">", "", line)
-        line = re.sub(r"</span>", "", line)
-
-        # Convert simple <img src="..."> to markdown images if possible
-        img_match = re.search(r"<img\s+[^>]*src=\"([^\"]+)\"[^>]*alt=\"([^\"]*)\"[^>]*>", line)
-        if img_match:
-            src, alt = img_match.groups()
-            mdimg = f"![{alt}]({src})"
-            line = re.sub(r"<img\s+[^>]*src=\"[^\"]+\"[^>]*alt=\"[^\"]*\"[^>]*>", mdimg, line)
-        else:
-            # fallback: if only src is present
-            img_match2 = re.search(r"<img\s+[^>]*src=\"([^\"]+)\"[^>]*>", line)
-            if img_match2:
-                src = img_match2.groups()[0]
-                line = re.sub(r"<img\s+[^>]*src=\"[^\"]+\"[^>]*>", f"![]({src})", line)
-
-        # reduce multiple spaces after list markers globally
-        if re.match(r"^\s*([-*+]\s{2,})", line) or re.match(r"^\s*\d+\.\s{2,}", line):
-            line = re.sub(r"^(\s*([-*+]|\d+\.))\s{2,}", r"\1 ", line)
-
-        # for normal paragraph lines, collect contiguous lines and wrap them
-        # gather lines until blank or heading or list or fence
-        para_buf = [line]
-        j = i + 1
-        while j < len(lines) and not is_heading(lines[j]) and not is_list_item(lines[j]) and not is_fence(lines[j]) and lines[j].strip() != '':
-            para_buf.append(lines[j].rstrip('\n'))
-            j += 1
-        if len(para_buf) > 1 or (len(para_buf) == 1 and len(para_buf[0]) > 120):
-            # wrap paragraph
-            paragraph = '\n'.join(para_buf)
-            wrapped = textwrap.fill(' '.join(l.strip() for l in para_buf), width=120)
-            new_lines.extend(wrapped.split('\n'))
-            i = j
-            continue
-        else:
-            new_lines.append(line)
-            i += 1
-
-    # Post-processing: ensure no blank at start or end
-    while new_lines and new_lines[0].strip() == '':
-        new_lines.pop(0)
-    while new_lines and new_lines[-1].strip() == '':
-        new_lines.pop()
-
-    final = '\n'.join(new_lines) + '\n'
-    # Final pass: ensure opening fences have a language; this targets lines like '```' or '   ```' where no
-    # language is specified. We only set a language for opening fences (not closing ones) by examining the
-    # next non-empty line.
-    def ensure_fence_languages(s):
-        # Only add languages to opening fence lines (not closing ones) by toggling in_fence state.
-        out_lines_local = []
-        lines_local = s.split('\n')
-        in_f = False
-        fence_open_re = re.compile(r"^(\s*)(`{3,}|~{3,})\s*(\w+)?\s*$")
-        for l in lines_local:
-            m = fence_open_re.match(l)
-            if m:
-                indent, fence_chars, lang = m.groups()
-                # normalize fence indentation: reduce leading indent to a maximum of 3 spaces
-                if len(indent) > 3:
-                    indent = indent[:3]
-                if not in_f:
-                    # opening fence; ensure a language is present
-                    if not lang:
-                        l = f"{indent}{fence_chars} text"
-                    in_f = True
-                else:
-                    # closing fence; strip any language so it remains a bare fence
-                    l = f"{indent}{fence_chars}"
-                    in_f = False
-            out_lines_local.append(l)
-        return '\n'.join(out_lines_local)
-
-    final = ensure_fence_languages(final)
-    # Extra pass: some backticks may be present with up to 3 leading spaces - ensure we attach a default language on opens
-    def ensure_fence_languages_simple(s):
-        lines_local = s.split('\n')
-        out = []
-        in_f = False
-        for l in lines_local:
-            if re.match(r"^\s{0,3}`{3,}\s*$", l):
-                if not in_f:
-                    out.append(re.sub(r"^\s{0,3}`{3,}\s*$", "```text", l))
-                    in_f = True
-                    continue
-                else:
-                    out.append(re.sub(r"^\s{0,3}`{3,}\s*$", "```", l))
-                    in_f = False
-                    continue
-            out.append(l)
-        return '\n'.join(out)
 
-    final = ensure_fence_languages_simple(final)
-    # Collapse multiple blank lines to a single blank line
-    final = re.sub(r"\n{3,}", "\n\n", final)
+def _format_to_temp(path):
+    """Stream the formatted version of path into a new temporary file next to it; return its name.
+    The file is read twice (list indent, then the formatter) instead of being loaded."""
     with open(path, 'r', encoding='utf-8') as fh:
-        original = fh.read()
-    if final != original:
-        with open(path, 'w', encoding='utf-8') as fh:
-            fh.write(final)
-        changed = True
-    return changed
+        base_indent = list_base_indent(_file_lines(fh))
+    fd, tmp = atomicio.temp_file(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as src, os.fdopen(fd, 'w', encoding='utf-8') as out:
+            empty = True
+            for line in format_lines(_file_lines(src), base_indent):
+                out.write(line + '\n')
+                empty = False
+            if empty:
+                out.write('\n')
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp
+
+
+def format_file_streaming(path, mode=mdwalk.WRITE):
+    """Format path without loading it into memory. The formatted copy replaces the original only
+    if the bytes differ (and only in WRITE mode). Returns (changed, diff); diff is set in DIFF mode
+    only, and building it reads both versions of a changed file."""
+    tmp = _format_to_temp(path)
+    try:
+        if filecmp.cmp(path, tmp, shallow=False):
+            return False, None
+        diff = None
+        if mode == mdwalk.WRITE:
+            atomicio.install(tmp, path)
+        elif mode == mdwalk.DIFF:
+            with open(path, 'r', encoding='utf-8') as a, open(tmp, 'r', encoding='utf-8') as b:
+                diff = mdwalk.unified_diff(path, a.read(), b.read())
+        return True, diff
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def format_file(path):
+    original = atomicio.read_text(path)
+    return atomicio.write_text(path, format_text(original), original=original)
+
+
+def _format_transform(text):
+    return format_text(text), None
 
 
-def walk_and_format(root):
+def _format_streaming(path, mode):
+    changed, diff = format_file_streaming(path, mode)
+    return changed, None, diff
+
+
+def walk_and_format(root, cache=None, jobs=1, stream=False, mode=mdwalk.WRITE, selection=None):
+    paths = mdwalk.iter_markdown_files([root], skip_hidden=False, selection=selection)
+    if stream:
+        results = mdwalk.iter_process_paths(paths, _format_streaming, jobs=jobs, cache=cache, mode=mode)
+    else:
+        results = mdwalk.iter_process_files(paths, _format_transform, jobs=jobs, cache=cache, mode=mode)
+    done = []
     changed_files = []
-    for dirpath, _, filenames in os.walk(root):
-        for file in filenames:
-            if not file.endswith('.md'):
-                continue
-            path = os.path.join(dirpath, file)
-            try:
-                if format_file(path):
-                    changed_files.append(path)
-                    print("Formatted:", path)
-            except Exception as e:
-                print(f"Error formatting {path}: {e}")
+    for r in results:
+        done.append(r)
+        if r.changed:
+            changed_files.append(r.path)
+            if mode == mdwalk.WRITE:
+                print("Formatted:", r.path)
+            else:
+                mdwalk.report_pending(r, mode)
+    mdwalk.report_errors(done, 'formatting')
     return changed_files
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: format_markdown.py <docs-root>")
-        sys.exit(1)
-    root = sys.argv[1]
-    changed = walk_and_format(root)
+    parser = argparse.ArgumentParser(description='Format Markdown files under a docs root')
+    parser.add_argument('root', help='Docs root to format, e.g. docs')
+    parser.add_argument('--cache', default=fixcache.DEFAULT_CACHE,
+                        help=f"Fixed-point cache file (default: {fixcache.DEFAULT_CACHE})")
+    parser.add_argument('--no-cache', action='store_true', help='Format every file, ignoring the cache')
+    parser.add_argument('--jobs', '-j', type=mdwalk.jobs_arg, default=1,
+                        help='Number of worker processes (0 = one per CPU; default: 1)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream each file through a temporary file instead of loading it (for very large pages)')
+    mdwalk.add_mode_args(parser)
+    gitselect.add_git_args(parser)
+    runprofile.add_profile_args(parser, 'format_markdown')
+    args = parser.parse_args()
+    runprofile.start(args, 'format_markdown', [(sys.modules[__name__], PROFILED, 'format_markdown.'),
+                                               (mdblocks, mdblocks.PROFILED, 'mdblocks.')])
+    cache = None
+    if not args.no_cache:
+        cache = fixcache.FixCache(args.cache, fixcache.ruleset_key([sys.modules[__name__], mdblocks, mdwrap,
+                                                                     fencelang], {'tool': 'format_markdown'}))
+    mode = mdwalk.mode_from_args(args)
+    selection = gitselect.from_args(args, [args.root])
+    changed = walk_and_format(args.root, cache, args.jobs, args.stream, mode, selection)
     if changed:
-        print("Changed files:")
+        print("Changed files:" if mode == mdwalk.WRITE else "Files that would change:")
         for c in changed:
             print(" - ", c)
     else:
         print("No changes required.")
+    runprofile.finish(args, cache)
+    sys.exit(mdwalk.exit_status(args, changed))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Select the files git reports as changed instead of walking a whole docs tree.
+
+--changed-since REF selects files that differ between REF and the working tree; REF may also be
+a range such as origin/master...HEAD (what code-quality.yml compares on pull requests). --staged
+selects files whose index content differs from HEAD, which is what a pre-commit hook checks.
+Either way `git diff -z --name-status --no-renames` runs once and its output is reused for every
+root, so a local check touches only the handful of files in the change.
+
+Renames are reported as a deletion plus an addition. Deleted files are never handed to a fixer,
+but together with added files they can break or repair links elsewhere: link_dependents() finds
+the Markdown files whose relative links (of any kind, see linkgraph.py) point at an added or
+deleted path (one `git grep` for the candidate names, then the links of the candidates are
+resolved), which the link tools check as well as the changed files themselves.
+
+Usage (library):
+    gitselect.add_git_args(parser)
+    selection = gitselect.from_args(args, roots)  # None unless --changed-since/--staged was given
+    paths = mdwalk.iter_markdown_files(roots, selection=selection)
+"""
+
+import os
+import subprocess
+
+import linkgraph
+
+# pages that a link to their directory (e.g. "../install/") resolves to
+INDEX_NAMES = ('index.md', 'README.md')
+
+
+def _git(args, cwd=None):
+    proc = subprocess.run(['git'] + args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode not in (0, 1) or (proc.returncode == 1 and proc.stderr):
+        raise SystemExit(f"git {' '.join(args)} failed: {proc.stderr.decode('utf-8', 'replace').strip()}")
+    return proc.stdout
+
+
+def _under(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class GitSelection:
+    """The changed paths of one git diff, keyed by absolute path with their status letter."""
+
+    def __init__(self, top, changes):
+        self.top = top
+        self.changes = changes
+
+    @classmethod
+    def from_git(cls, ref=None, staged=False, cwd=None):
+        top = os.fsdecode(_git(['rev-parse', '--show-toplevel'], cwd).strip())
+        cmd = ['diff', '-z', '--name-status', '--no-renames']
+        if staged:
+            cmd.append('--cached')
+        if ref:
+            cmd.append(ref)
+        fields = _git(cmd + ['--'], top).split(b'\0')
+        changes = {}
+        # -z output alternates status and path: b'M\0docs/a.md\0D\0docs/b.md\0'
+        for status, name in zip(fields[0::2], fields[1::2]):
+            changes[os.path.join(top, os.fsdecode(name))] = status.decode('ascii')[:1]
+        return cls(top, changes)
+
+    def contains(self, path):
+        return os.path.realpath(path) in self.changes and os.path.isfile(path)
+
+    def files_under(self, roots, suffix='.md', skip_hidden=True):
+        """Existing changed files under the given files/directories in sorted order, spelled
+        relative to the root they were found under (like mdwalk.iter_markdown_files)."""
+        for root in roots:
+            if os.path.isfile(root):
+                if self.contains(root):
+                    yield root
+                continue
+            real_root = os.path.realpath(root)
+            for path in sorted(self.changes):
+                if not path.endswith(suffix) or not _under(path, real_root) or not os.path.isfile(path):
+                    continue
+                rel = os.path.relpath(path, real_root)
+                if skip_hidden and any(part.startswith('.') for part in rel.split(os.sep)[:-1]):
+                    continue
+                yield os.path.join(root, rel)
+
+    def link_dependents(self, roots):
+        """Markdown files under roots (outside the change itself) with a relative link that
+        resolves to a file this change added or deleted, or to the directory of such an index
+        page. Returns absolute paths."""
+        targets = set()
+        for path, status in self.changes.items():
+            if status in 'AD':
+                targets.add(path)
+                if os.path.basename(path) in INDEX_NAMES:
+                    targets.add(os.path.dirname(path))
+        if not targets:
+            return set()
+        pattern_args = []
+        for name in sorted({os.path.basename(t) for t in targets}):
+            pattern_args += ['-e', name]
+        scopes = [os.path.relpath(os.path.realpath(r), self.top) for r in roots]
+        out = _git(['grep', '-z', '-l', '-F', '--untracked'] + pattern_args + ['--'] + scopes, self.top)
+        dependents = set()
+        for name in out.split(b'\0'):
+            path = os.path.join(self.top, os.fsdecode(name))
+            if not name or not path.endswith('.md') or path in self.changes:
+                continue
+            with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+                text = fh.read()
+            if any(_link_target(path, link.href) in targets for link in linkgraph.extract_links(text)):
+                dependents.add(path)
+        return dependents
+
+    def link_scope(self, roots):
+        """What the link tools check: the changed Markdown files under roots plus their
+        link_dependents(), as a set of absolute paths."""
+        changed = {os.path.realpath(p) for p in self.files_under(roots)}
+        return changed | self.link_dependents(roots)
+
+
+def _link_target(md_path, href):
+    href = href.strip()
+    if href.startswith('<') and href.endswith('>'):
+        href = href[1:-1].strip()
+    href = href.split('#', 1)[0].split('?', 1)[0]
+    if not href or '://' in href or href.startswith('mailto:') or href.startswith('/'):
+        return None
+    return os.path.normpath(os.path.join(os.path.dirname(md_path), href))
+
+
+def add_git_args(parser):
+    """Add the common --changed-since/--staged options to a tool's argument parser."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--changed-since', metavar='REF',
+                       help='Only process files that differ between REF (or a range like A...B) and the working tree')
+    group.add_argument('--staged', action='store_true',
+                       help='Only process files with staged changes (for pre-commit hooks)')
+
+
+def from_args(args, roots=()):
+    """GitSelection for --changed-since/--staged, or None when neither was given. git runs in the
+    repository containing the first root (default: the current directory's)."""
+    if not (args.changed_since or args.staged):
+        return None
+    cwd = None
+    if roots:
+        cwd = roots[0] if os.path.isdir(roots[0]) else os.path.dirname(roots[0]) or None
+    return GitSelection.from_git(args.changed_since, args.staged, cwd)
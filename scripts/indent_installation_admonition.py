@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
-import io,sys
+# Indent the unindented admonition bodies of the installation guide (the port 443 warning, the
+# legacy notice) with the aggressive policy of the admonition engine (admonitions.py).
+import admonitions
+import atomicio
+
 path='docs/perfsonar/installation.md'
-text=open(path,encoding='utf-8').read()
-old='\nAll perfSONAR instances must have port 443 accessible to other perfSONAR instances. Port 443 is used by pScheduler to schedule tests. If unreachable, \ntests may not run and results may be missing.\n'
-new='\n    All perfSONAR instances must have port 443 accessible to other perfSONAR instances. Port 443 is used by pScheduler to schedule tests. If unreachable, \n    tests may not run and results may be missing.\n'
-if old in text:
-    text=text.replace(old,new)
-    open(path,'w',encoding='utf-8').write(text)
+text=atomicio.read_text(path)
+new_text,changes=admonitions.fix_text(text,admonitions.AGGRESSIVE)
+if changes:
+    atomicio.write_text(path,new_text,original=text)
     print('Patched',path)
 else:
-    print('Pattern not found in',path)
+    print('Nothing to indent in',path)
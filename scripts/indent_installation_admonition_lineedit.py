@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
+# Formerly indented lines 138-139 by number; the admonition engine (admonitions.py) now finds the
+# unindented bodies itself, so line numbers going stale after edits no longer matter.
 from pathlib import Path
+
+import admonitions
+import atomicio
+
 path=Path('docs/perfsonar/installation.md')
-lines=path.read_text(encoding='utf-8').splitlines()
-for idx in [137,138]:  # 0-based indices for 138th and 139th lines
-    if idx < len(lines):
-        if not lines[idx].startswith('    '):
-            lines[idx] = '    ' + lines[idx]
-path.write_text('\n'.join(lines)+'\n', encoding='utf-8')
-print('Indented lines 138-139 in',path)
+text=atomicio.read_text(path)
+new_text,changes=admonitions.fix_text(text,admonitions.AGGRESSIVE)
+if changes:
+    atomicio.write_text(path,new_text,original=text)
+print('Indented',changes,'admonition body lines in',path)
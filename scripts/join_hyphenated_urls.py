@@ -14,11 +14,12 @@ import re
 import sys
 from pathlib import Path
 
+import atomicio
+
 
 def process(path: Path) -> bool:
     changed = False
-    with path.open('r', encoding='utf-8') as fh:
-        lines = fh.readlines()
+    lines = atomicio.read_lines(path)
 
     out = []
     i = 0
@@ -41,9 +42,8 @@ def process(path: Path) -> bool:
         i += 1
 
     if changed:
-        # write a normalized file with line endings as \n
-        # ensure we don't break files entirely; write to temp then replace
-        path.write_text(''.join(out), encoding='utf-8')
+        # write a normalized file with line endings as \n, via a temp file that replaces it
+        atomicio.write_text(path, ''.join(out))
     return changed
 
 
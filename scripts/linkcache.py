@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Persistent cache of external link check results, so a URL is not re-checked on every run.
+
+Results of linkcheck.check_urls() are kept in a small sqlite database (default
+.cache/links.sqlite): per URL the kind of result (ok, 4xx, 5xx, timeout, dns, connection), the
+final HTTP status, the URL the redirects ended at, the error text, when it was checked and how
+long the entry stays fresh. check_urls() here only sends the URLs without a fresh entry to the
+network; everything else is answered from the database.
+
+How long an entry stays fresh:
+
+  - a success for OK_TTL (a week);
+  - a failure (negative caching) for FAIL_TTL (a day), doubled for every run in a row in which
+    the URL's host failed, capped at MAX_BACKOFF, so a host that keeps failing is re-checked
+    less and less often instead of being hit on every run. A success from the host resets it;
+  - 'deadline' results (never checked) are not stored.
+
+max_age overrides the TTLs (every entry younger than max_age is fresh), refresh re-checks every
+URL and offline checks none: URLs without an entry are then reported as 'uncached' (not broken),
+which is what a PR check without network access runs on.
+
+Usage (library):
+    with linkcache.LinkCache() as cache:
+        results, stats = linkcache.check_urls(urls, cache, max_age=None, refresh=False, offline=False)
+Usage (CLI): python3 scripts/linkcache.py stats | list [--broken] | clear
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+import urllib.parse
+
+import linkcheck
+
+DEFAULT_DB = os.path.join('.cache', 'links.sqlite')
+SCHEMA_VERSION = 1
+HOUR = 3600
+DAY = 24 * HOUR
+OK_TTL = 7 * DAY
+FAIL_TTL = 1 * DAY
+MAX_BACKOFF = 30 * DAY
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status INTEGER,
+    final TEXT,
+    detail TEXT NOT NULL DEFAULT '',
+    checked REAL NOT NULL,
+    ttl REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    failures INTEGER NOT NULL,
+    last_failure REAL NOT NULL
+);
+"""
+_DURATION_RE = re.compile(r"^(\d+(?:\.\d+)?)([smhdw]?)$")
+_UNITS = {'': 1, 's': 1, 'm': 60, 'h': HOUR, 'd': DAY, 'w': 7 * DAY}
+
+
+def duration_arg(value):
+    """Seconds in a duration such as 3600, 90m, 12h, 7d or 2w (for --max-age)."""
+    m = _DURATION_RE.match(value.strip())
+    if not m:
+        raise argparse.ArgumentTypeError(f"not a duration: {value} (use e.g. 3600, 90m, 12h, 7d)")
+    return float(m.group(1)) * _UNITS[m.group(2)]
+
+
+def host_of(url):
+    return urllib.parse.urlsplit(url).netloc.lower()
+
+
+class LinkCache:
+    """The link status database; use as a context manager or call close()."""
+
+    def __init__(self, path=DEFAULT_DB, ok_ttl=OK_TTL, fail_ttl=FAIL_TTL, max_backoff=MAX_BACKOFF):
+        self.path = path
+        self.ok_ttl = ok_ttl
+        self.fail_ttl = fail_ttl
+        self.max_backoff = max_backoff
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            # an older layout is a cache, not data: start over
+            self.db.executescript('DROP TABLE IF EXISTS links; DROP TABLE IF EXISTS hosts;')
+            self.db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def lookup(self, urls, max_age=None, now=None):
+        """Split urls into (fresh {url: Result} from the cache, [urls to check]). An entry is fresh
+        while younger than its TTL, or than max_age if given."""
+        now = time.time() if now is None else now
+        fresh, stale = {}, []
+        for url in sorted(set(urls)):
+            row = self.db.execute('SELECT kind, status, final, detail, checked, ttl FROM links WHERE url = ?',
+                                  (url,)).fetchone()
+            if row is not None:
+                kind, status, final, detail, checked, ttl = row
+                if now - checked < (ttl if max_age is None else max_age):
+                    fresh[url] = linkcheck.Result(url, kind, status, detail, final)
+                    continue
+            stale.append(url)
+        return fresh, stale
+
+    def cached(self, urls):
+        """Every stored Result among urls, however old: {url: Result}."""
+        return self.lookup(urls, max_age=float('inf'))[0]
+
+    def store(self, results, now=None):
+        """Record checked Results. A host with failures and no success among them has failed one
+        more run in a row, and its failures' TTL backs off accordingly."""
+        now = time.time() if now is None else now
+        results = [r for r in results if r.kind != 'deadline']
+        failed, succeeded = set(), set()
+        for r in results:
+            (failed if r.broken else succeeded).add(host_of(r.url))
+        runs = {}
+        for host in failed - succeeded:
+            row = self.db.execute('SELECT failures FROM hosts WHERE host = ?', (host,)).fetchone()
+            runs[host] = (row[0] if row else 0) + 1
+            self.db.execute('INSERT OR REPLACE INTO hosts VALUES (?, ?, ?)', (host, runs[host], now))
+        self.db.executemany('DELETE FROM hosts WHERE host = ?', [(h,) for h in succeeded])
+        for r in results:
+            if r.broken:
+                ttl = min(self.fail_ttl * 2 ** (runs.get(host_of(r.url), 1) - 1), self.max_backoff)
+            else:
+                ttl = self.ok_ttl
+            self.db.execute('INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (r.url, r.kind, r.status, r.final, r.detail, now, ttl))
+        self.db.commit()
+
+    def clear(self):
+        self.db.executescript('DELETE FROM links; DELETE FROM hosts;')
+
+    def rows(self):
+        return self.db.execute('SELECT url, kind, status, final, detail, checked, ttl FROM links ORDER BY url')
+
+
+def check_urls(urls, cache, max_age=None, refresh=False, offline=False, **check_options):
+    """linkcheck.check_urls() through the cache; return ({url: Result}, stats) where stats counts
+    'cached', 'checked' and 'uncached' URLs. check_options go to linkcheck.check_urls()."""
+    urls = {u for u in urls if linkcheck.is_checkable(u)}
+    if refresh:
+        fresh, stale = {}, sorted(urls)
+    else:
+        fresh, stale = cache.lookup(urls, max_age)
+    results = dict(fresh)
+    stats = {'cached': len(fresh), 'checked': 0, 'uncached': 0}
+    if offline:
+        # whatever is stored counts, however old; the rest is unknown, not broken
+        old = cache.cached(stale)
+        results.update(old)
+        stats['cached'] += len(old)
+        for u in stale:
+            if u not in old:
+                results[u] = linkcheck.Result(u, linkcheck.UNCHECKED, None, '')
+                stats['uncached'] += 1
+        return results, stats
+    if stale:
+        checked = linkcheck.check_urls(stale, **check_options)
+        cache.store(checked.values())
+        results.update(checked)
+        stats['checked'] = len(checked)
+    return results, stats
+
+
+def add_cache_args(parser):
+    """Add --link-cache, --max-age, --refresh and --offline to a link tool's argument parser."""
+    parser.add_argument('--link-cache', default=DEFAULT_DB, metavar='DB',
+                        help=f"Link status cache (default: {DEFAULT_DB}); 'none' to check everything uncached")
+    parser.add_argument('--max-age', type=duration_arg, metavar='AGE',
+                        help='Re-check cached links older than AGE (e.g. 12h, 7d) instead of using the TTLs')
+    parser.add_argument('--refresh', action='store_true', help='Re-check every link and update the cache')
+    parser.add_argument('--offline', action='store_true',
+                        help='Check nothing over the network; use cached results of any age')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect the external link status cache')
+    parser.add_argument('command', choices=('stats', 'list', 'clear'))
+    parser.add_argument('--db', default=DEFAULT_DB, help=f"Cache database (default: {DEFAULT_DB})")
+    parser.add_argument('--broken', action='store_true', help='With list, only the failures')
+    args = parser.parse_args()
+    if args.command != 'clear' and not os.path.exists(args.db):
+        print(f"No link cache at {args.db}")
+        return
+    now = time.time()
+    with LinkCache(args.db) as cache:
+        if args.command == 'clear':
+            cache.clear()
+            print(f"Cleared {args.db}")
+            return
+        counts = {}
+        stale = 0
+        for url, kind, status, final, detail, checked, ttl in cache.rows():
+            counts[kind] = counts.get(kind, 0) + 1
+            stale += now - checked >= ttl
+            if args.command == 'list' and (kind != 'ok' or not args.broken):
+                age = (now - checked) / HOUR
+                target = f" -> {final}" if final else ''
+                print(f"{kind:<10} {status or '-':>3} {age:7.1f}h {url}{target}{'  ' + detail if detail else ''}")
+        total = sum(counts.values())
+        print(f"{total} URLs ({stale} stale): " + ', '.join(f"{k} {counts[k]}" for k in linkcheck.KINDS if k in counts))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""Check external http(s) links concurrently, each unique URL once.
+
+The link tools in docs/tools used to send one blocking HEAD request per link occurrence, in
+document order, so a docs tree with a few hundred external links took minutes and one slow host
+stalled the scan. check_urls() takes the set of unique URLs instead and checks them on a thread
+pool:
+
+  - at most `per_host` requests run against one host at a time, so a big site is not hammered.
+    Each host has its own queue and a URL is only handed to a worker when its host has a free
+    slot, taking the hosts in turn, so a slow host holds at most `per_host` workers and the
+    others go on checking the rest;
+  - connections are kept alive and reused per host (http.client), so many links to one site cost
+    one TCP/TLS handshake per worker rather than one per link;
+  - HEAD is tried first; servers that reject it (HEAD_FALLBACK statuses, or a broken reply) are
+    asked again with GET, of which only the first bytes are read;
+  - redirects are followed (at most MAX_REDIRECTS) and the final status counts;
+  - the proxies of the environment (http_proxy, https_proxy, no_proxy, as urllib reads them)
+    are used: https goes through a CONNECT tunnel, http sends the absolute URL to the proxy;
+  - every request has a timeout, and the whole run a deadline: URLs not checked by then are
+    reported as 'deadline' instead of holding up the scan.
+
+Each URL gets a Result whose kind is one of KINDS: ok, 4xx, 5xx, timeout, dns, connection
+(refused, reset, TLS or protocol errors) or deadline. Callers fan the results back out to every
+occurrence of the URL. mailto: and other non-http links are not checked.
+
+Usage (library):
+    results = linkcheck.check_urls(urls, per_host=4, deadline=60)
+    if results[url].broken: print(results[url].note)
+Usage (CLI): python3 scripts/linkcheck.py docs [URL ...] [--per-host N] [--timeout S] [--deadline S]
+                [--max-age AGE | --refresh | --offline]
+"""
+
+import argparse
+import base64
+import collections
+import concurrent.futures
+import http.client
+import ipaddress
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import atomicio
+import linkgraph
+import mdwalk
+
+WORKERS = 16
+PER_HOST = 4
+# seconds for one request, and for the whole run
+TIMEOUT = 5.0
+DEADLINE = 120.0
+MAX_REDIRECTS = 5
+# HEAD replies that may only mean the server does not do HEAD
+HEAD_FALLBACK = frozenset({400, 403, 405, 406, 501})
+# bytes of a GET body read before the connection is dropped instead of reused
+GET_READ_LIMIT = 64 * 1024
+USER_AGENT = 'osg-htc-networking-linkcheck/1.0'
+
+KINDS = ('ok', '4xx', '5xx', 'timeout', 'dns', 'connection', 'deadline', 'uncached')
+# not checked at all (offline, no cached result): unknown rather than broken
+UNCHECKED = 'uncached'
+# timed when a tool runs with --profile (see runprofile.py); the worker threads are not timed
+# one by one, as the timers keep a single per-process stack
+PROFILED = ('check_urls',)
+
+
+class Result(collections.namedtuple('Result', 'url kind status detail final', defaults=(None,))):
+    """kind: one of KINDS; status: final HTTP status or None; detail: error text or ''; final: the
+    URL the redirects ended at, if any."""
+
+    @property
+    def broken(self):
+        return self.kind not in ('ok', UNCHECKED)
+
+    @property
+    def note(self):
+        """The broken-link note the link report shows for this URL."""
+        if self.status and self.status >= 400:
+            return f"{self.url} (HTTP {self.status})"
+        return f"{self.url} (external check failed: {self.kind}{': ' + self.detail if self.detail else ''})"
+
+
+def is_checkable(url):
+    return url.startswith('http://') or url.startswith('https://')
+
+
+def _proxy_headers(proxy):
+    """The Proxy-Authorization header for a proxy URL with user:password@, else {}."""
+    if proxy.username is None:
+        return {}
+    creds = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+    return {'Proxy-Authorization': 'Basic ' + base64.b64encode(creds.encode()).decode('ascii')}
+
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host), and a limit on requests per host.
+
+    proxies maps a scheme to a proxy URL, by default the environment's (urllib.request.getproxies());
+    hosts no_proxy names, and this machine's loopback addresses, are reached directly."""
+
+    def __init__(self, per_host=PER_HOST, timeout=TIMEOUT, proxies=None):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.proxies = urllib.request.getproxies() if proxies is None else proxies
+        self._lock = threading.Lock()
+        self._idle = collections.defaultdict(list)
+        self._slots = {}
+        self._proxy = {}
+
+    def slot(self, key):
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.per_host)
+            return self._slots[key]
+
+    def proxy(self, key):
+        """The proxy (a SplitResult) requests to (scheme, host) go through, or None."""
+        with self._lock:
+            if key in self._proxy:
+                return self._proxy[key]
+        scheme, host = key
+        url = self.proxies.get(scheme)
+        proxy = None
+        if url and not _is_loopback(urllib.parse.urlsplit('//' + host).hostname or '') \
+                and not urllib.request.proxy_bypass(host):
+            proxy = urllib.parse.urlsplit(url if '://' in url else 'http://' + url)
+        with self._lock:
+            self._proxy[key] = proxy
+        return proxy
+
+    def get(self, key, timeout):
+        with self._lock:
+            idle = self._idle[key]
+            conn = idle.pop() if idle else None
+        if conn is None:
+            scheme, host = key
+            cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            proxy = self.proxy(key)
+            if proxy is None:
+                conn = cls(host, timeout=timeout)
+            else:
+                conn = cls(proxy.hostname, proxy.port or 80, timeout=timeout)
+                if scheme == 'https':
+                    conn.set_tunnel(host, headers=_proxy_headers(proxy))
+        else:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        return conn
+
+    def put(self, key, conn):
+        with self._lock:
+            self._idle[key].append(conn)
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+def _host_key(url):
+    parts = urllib.parse.urlsplit(url)
+    return (parts.scheme, parts.netloc)
+
+
+def _request(pool, url, method, timeout):
+    """One request without following redirects; return (status, Location header)."""
+    parts = urllib.parse.urlsplit(url)
+    key = _host_key(url)
+    target = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+    headers = {'User-Agent': USER_AGENT, 'Accept': '*/*'}
+    proxy = pool.proxy(key) if parts.scheme == 'http' else None
+    if proxy is not None:
+        # a plain http proxy is sent the whole URL; https goes through the tunnel unchanged
+        target = urllib.parse.urlunsplit((parts.scheme, parts.netloc, parts.path or '/', parts.query, ''))
+        headers.update(_proxy_headers(proxy))
+    # check_urls() only starts as many URLs per host as there are slots; the slot also holds
+    # back requests that a redirect sent to another host
+    with pool.slot(key):
+        for attempt in (1, 2):
+            conn = pool.get(key, timeout)
+            reused = conn.sock is not None
+            try:
+                conn.request(method, target, headers=headers)
+                resp = conn.getresponse()
+                if method == 'HEAD':
+                    resp.read()
+                else:
+                    resp.read(GET_READ_LIMIT)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                if reused and attempt == 1:
+                    # the server closed an idle keep-alive connection: retry on a fresh one
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if resp.isclosed() and not resp.will_close:
+                pool.put(key, conn)
+            else:
+                conn.close()
+            return resp.status, resp.getheader('Location')
+
+
+def _classify_error(e):
+    if isinstance(e, (socket.timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(e, socket.gaierror):
+        return 'dns'
+    return 'connection'
+
+
+def check_url(url, pool, timeout=TIMEOUT, deadline=None):
+    """Check one URL (HEAD, then GET if HEAD is rejected; following redirects); return a Result."""
+    method = 'HEAD'
+    current = url
+    redirects = 0
+    while True:
+        remaining = timeout if deadline is None else min(timeout, deadline - time.monotonic())
+        if remaining <= 0:
+            return Result(url, 'deadline', None, '')
+        try:
+            status, location = _request(pool, current, method, remaining)
+        except (OSError, http.client.HTTPException, ssl.SSLError) as e:
+            if method == 'HEAD' and isinstance(e, (http.client.HTTPException, ConnectionResetError)):
+                # a server that breaks on HEAD may still answer GET
+                method = 'GET'
+                continue
+            return Result(url, _classify_error(e), None, str(e) or e.__class__.__name__)
+        if status in (301, 302, 303, 307, 308) and location and redirects < MAX_REDIRECTS:
+            current = urllib.parse.urljoin(current, location)
+            redirects += 1
+            if not is_checkable(current):
+                return Result(url, 'ok', status, '', current)
+            continue
+        if method == 'HEAD' and status in HEAD_FALLBACK:
+            method = 'GET'
+            continue
+        final = current if redirects else None
+        if status >= 500:
+            return Result(url, '5xx', status, '', final)
+        if status >= 400:
+            return Result(url, '4xx', status, '', final)
+        return Result(url, 'ok', status, '', final)
+
+
+def check_urls(urls, workers=WORKERS, per_host=PER_HOST, timeout=TIMEOUT, deadline=DEADLINE):
+    """Check every unique http(s) URL in urls concurrently; return {url: Result}. URLs still
+    unchecked after deadline seconds get kind 'deadline'."""
+    unique = sorted({u for u in urls if is_checkable(u)})
+    results = {}
+    if not unique:
+        return results
+    queues = collections.OrderedDict()
+    for u in unique:
+        queues.setdefault(_host_key(u), collections.deque()).append(u)
+    busy = collections.Counter()
+    pool = ConnectionPool(per_host, timeout)
+    end = time.monotonic() + deadline if deadline else None
+    workers = min(workers, len(unique))
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    running = {}
+    try:
+        while queues or running:
+            # hand out URLs round-robin over the hosts with a free slot until every worker is busy
+            ready = [key for key in queues if busy[key] < per_host]
+            while ready and len(running) < workers:
+                key = ready.pop(0)
+                u = queues[key].popleft()
+                busy[key] += 1
+                running[executor.submit(check_url, u, pool, timeout, end)] = (u, key)
+                if not queues[key]:
+                    del queues[key]
+                elif busy[key] < per_host:
+                    ready.append(key)
+            remaining = None if end is None else end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, _ = concurrent.futures.wait(running, timeout=remaining,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                u, key = running.pop(fut)
+                busy[key] -= 1
+                results[u] = fut.result()
+    finally:
+        # requests still running end with their own timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+        pool.close()
+    for u in unique:
+        if u not in results:
+            results[u] = Result(u, 'deadline', None, '')
+    return results
+
+
+def markdown_urls(paths):
+    """External http(s) links of the Markdown files under paths: {url: [(file, line), ...]}. Every
+    link form linkgraph.extract_links() finds counts, reference links included; links in code
+    do not."""
+    found = collections.defaultdict(list)
+    for path in mdwalk.iter_markdown_files(paths):
+        text = atomicio.read_text(path, errors='replace')
+        if 'http' not in text:
+            continue
+        for link in linkgraph.extract_links(text):
+            # a wrapped href holds a line break and is reported by the broken-link scan instead
+            if is_checkable(link.href) and not any(c.isspace() for c in link.href):
+                found[link.href].append((path, link.line))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check external links concurrently, each unique URL once')
+    parser.add_argument('targets', nargs='+', help='URLs, or Markdown files/directories whose external links to check')
+    parser.add_argument('--workers', type=int, default=WORKERS, help=f"Requests in flight at most (default: {WORKERS})")
+    parser.add_argument('--per-host', type=int, default=PER_HOST,
+                        help=f"Requests in flight per host at most (default: {PER_HOST})")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help=f"Seconds per request (default: {TIMEOUT:g})")
+    parser.add_argument('--deadline', type=float, default=DEADLINE,
+                        help=f"Seconds for the whole run; 0 for none (default: {DEADLINE:g})")
+    # linkcache imports this module, so it is only imported for the command line
+    import linkcache
+    linkcache.add_cache_args(parser)
+    args = parser.parse_args()
+    occurrences = collections.defaultdict(list)
+    for t in args.targets:
+        if is_checkable(t):
+            occurrences[t]
+        elif os.path.exists(t):
+            for url, where in markdown_urls([t]).items():
+                occurrences[url].extend(where)
+        else:
+            parser.error(f"not a URL, file or directory: {t}")
+    started = time.monotonic()
+    check_options = {'workers': args.workers, 'per_host': args.per_host, 'timeout': args.timeout,
+                     'deadline': args.deadline}
+    if args.link_cache == 'none':
+        results = check_urls(occurrences, **check_options)
+        cache_note = ''
+    else:
+        with linkcache.LinkCache(args.link_cache) as cache:
+            results, stats = linkcache.check_urls(occurrences, cache, args.max_age, args.refresh, args.offline,
+                                                  **check_options)
+        cache_note = f" ({stats['cached']} from the link cache)"
+    counts = collections.Counter(r.kind for r in results.values())
+    for url, r in sorted(results.items()):
+        if r.broken:
+            print(f"{r.kind:<10} {r.note}")
+            for path, lineno in occurrences[url]:
+                print(f"           {path}:{lineno}")
+    print(f"Checked {len(results)} unique URLs ({sum(len(v) for v in occurrences.values())} links) in "
+          f"{time.monotonic() - started:.1f}s{cache_note}: " + ', '.join(f"{k} {counts[k]}" for k in KINDS if counts[k]))
+    sys.exit(1 if any(r.broken for r in results.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Persisted, incrementally updated graph of the links between the docs pages.
+
+Every link of every page is an edge: its href, text, 1-based line and column, kind and resolved
+target page. Kinds are all the ways the docs link: inline ([t](href), ![alt](src)), reference
+([t][ref], [ref][] and [ref] with a `[ref]: href` definition), autolinks (<https://...>) and
+HTML (<a href="...">). Links in fenced code and code spans are not links. A reverse index maps
+every target page to the pages that link to it.
+
+The graph is kept in .cache/linkgraph.json. update() stats every page. A page whose stat is
+unchanged is not read, and one whose content hash is unchanged is not parsed; only a changed
+page's outgoing edges are recomputed. For pages that were deleted or added since the last
+update, the referrers are returned as affected: their links to those pages broke or now resolve,
+so only they need validating again. A moved page is both.
+
+orphans() lists the pages that are neither in the mkdocs.yml nav nor linked from another page.
+
+Usage (library):
+    graph = linkgraph.LinkGraph('docs')
+    changes = graph.update()
+    for page, link in graph.broken(changes.changed | changes.affected): ...
+    graph.save()
+Usage (CLI): python3 scripts/linkgraph.py [--root docs] [--broken [--all]] [--orphans] [--referrers PAGE ...]
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import re
+import sys
+import urllib.parse
+
+import atomicio
+import mdblocks
+import mdwalk
+
+DEFAULT_ROOT = 'docs'
+DEFAULT_CACHE = os.path.join('.cache', 'linkgraph.json')
+CACHE_VERSION = 1
+MKDOCS_YML = 'mkdocs.yml'
+# pages a link to a directory resolves to (as in gitselect.py)
+INDEX_NAMES = ('index.md', 'README.md')
+KINDS = ('inline', 'image', 'reference', 'autolink', 'html')
+
+# href: as written; target: absolute path of the linked file or directory, or None for external
+# and same-page links; line, col: 1-based position of the link's start
+Link = collections.namedtuple('Link', 'href text line col kind target')
+# pages whose edges were recomputed, added and removed, and referrers of added/removed pages
+Changes = collections.namedtuple('Changes', 'changed added removed affected')
+
+_CODE_SPAN_RE = re.compile(r"(`+)(?:.+?)\1")
+# an inline link or image at a Link's offset: groups '!' or '', text, href (maybe in <>)
+INLINE_RE = re.compile(r"(!?)\[((?:[^\[\]]|\[[^\[\]]*\])*)\]\(\s*(<[^>]*>|[^)\s]*(?:\n[^)\s]*)?)(?:\s+(?:\"[^\"]*\"|'[^']*'|\([^)]*\)))?\s*\)")
+_REF_RE = re.compile(r"(!?)\[((?:[^\[\]]|\[[^\[\]]*\])*)\](?:\[([^\]]*)\])?(?![(:])")
+# a link destination that goes on on the next line (an editor wrapped it), and one that does not
+# go on at all: [text]( followed by a blank line is reported as a link with a truncated href
+_OPEN_DEST_RE = re.compile(r"\]\([^)]*$")
+_DANGLING_RE = re.compile(r"(!?)\[((?:[^\[\]]|\[[^\[\]]*\])*)\]\(\s*(\S*)$")
+_DEF_RE = re.compile(r"^ {0,3}\[([^\]]+)\]:\s*<?([^\s>]+)>?")
+_AUTOLINK_RE = re.compile(r"<((?:https?|ftp)://[^>\s]+|mailto:[^>\s]+)>")
+_HTML_HREF_RE = re.compile(r"<a\s[^>]*?href\s*=\s*[\"']([^\"']*)[\"']", re.I)
+_SCHEME_RE = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:")
+
+
+def _mask(line, start, end):
+    return line[:start] + ' ' * (end - start) + line[end:]
+
+
+def _label(text):
+    return ' '.join(text.split()).lower()
+
+
+def _prose_lines(doc):
+    """doc's lines, with None for the lines of code blocks and fences."""
+    return [None if doc.is_code(i) or doc.line_info[i].kind == 'fence' else ln for i, ln in enumerate(doc.lines)]
+
+
+def extract_links(text):
+    """All the links of a page's Markdown text, in document order, as Links (target None)."""
+    doc = mdblocks.parse(text)
+    lines = _prose_lines(doc)
+    defs = {}
+    for i, ln in enumerate(lines):
+        if ln is not None and '[' in ln:
+            m = _DEF_RE.match(ln)
+            if m:
+                defs.setdefault(_label(m.group(1)), m.group(2))
+                lines[i] = None
+    found = []
+    for i, ln in enumerate(lines):
+        if not ln or not any(c in ln for c in '[<'):
+            continue
+        width = len(ln)
+        if _OPEN_DEST_RE.search(ln):
+            if i + 1 < len(lines) and lines[i + 1]:
+                # match the wrapped link whole (its href then holds the line break and is broken)
+                ln += '\n' + lines[i + 1]
+            else:
+                m = _DANGLING_RE.search(ln)
+                if m:
+                    found.append((i, m.start(), m.group(3), m.group(2), 'image' if m.group(1) else 'inline'))
+        ln = _CODE_SPAN_RE.sub(lambda m: ' ' * len(m.group()), ln)
+        for m in INLINE_RE.finditer(ln):
+            if m.start() >= width:
+                break
+            href = m.group(3)[1:-1] if m.group(3).startswith('<') else m.group(3)
+            found.append((i, m.start(), href, m.group(2), 'image' if m.group(1) else 'inline'))
+            # an image inside a link's text: [![alt](img.png)](page.md)
+            for inner in INLINE_RE.finditer(m.group(2)):
+                found.append((i, m.start() + 1 + inner.start(), inner.group(3), inner.group(2),
+                              'image' if inner.group(1) else 'inline'))
+            ln = _mask(ln, m.start(), m.end())
+        ln = ln[:width]
+        for m in _AUTOLINK_RE.finditer(ln):
+            found.append((i, m.start(), m.group(1), m.group(1), 'autolink'))
+            ln = _mask(ln, m.start(), m.end())
+        for m in _HTML_HREF_RE.finditer(ln):
+            found.append((i, m.start(), m.group(1), '', 'html'))
+        if defs:
+            for m in _REF_RE.finditer(ln):
+                label = _label(m.group(3) or m.group(2))
+                if label in defs:
+                    found.append((i, m.start(), defs[label], m.group(2), 'reference'))
+    found.sort(key=lambda f: (f[0], f[1]))
+    return [Link(href, txt.strip(), i + 1, col + 1, kind, None) for i, col, href, txt, kind in found]
+
+
+def line_starts(text):
+    """Offsets of the starts of text's lines, for turning a Link's line and column into an offset:
+    starts[link.line - 1] + link.col - 1."""
+    starts = [0]
+    # the same line breaks as mdblocks' lines (str.splitlines)
+    for line in text.splitlines(True):
+        starts.append(starts[-1] + len(line))
+    return starts
+
+
+def href_spans(text):
+    """(start, end, kind) of every href as written in text, in order: the destinations of inline
+    links, images, autolinks and HTML links, and of reference definitions (kind 'definition')
+    rather than of the reference links that use them. Angle brackets are not part of a span."""
+    starts = line_starts(text)
+    spans = []
+    for link in extract_links(text):
+        offset = starts[link.line - 1] + link.col - 1
+        if link.kind in ('inline', 'image'):
+            m = INLINE_RE.match(text, offset)
+            if not m:
+                # cut off by a blank line: there is no destination to rewrite
+                continue
+            start, end = m.span(3)
+            if m.group(3).startswith('<'):
+                start, end = start + 1, end - 1
+        elif link.kind == 'autolink':
+            start, end = offset + 1, offset + 1 + len(link.href)
+        elif link.kind == 'html':
+            start, end = _HTML_HREF_RE.match(text, offset).span(1)
+        else:
+            continue
+        spans.append((start, end, link.kind))
+    for i, ln in enumerate(_prose_lines(mdblocks.parse(text))):
+        m = _DEF_RE.match(ln) if ln else None
+        if m:
+            spans.append((starts[i] + m.start(2), starts[i] + m.end(2), 'definition'))
+    spans.sort()
+    return spans
+
+
+def is_external(href):
+    return bool(_SCHEME_RE.match(href)) or href.startswith('//')
+
+
+def resolve(page, href, root):
+    """Absolute path of the file or directory href links to from page, or None for external and
+    same-page links. A leading '/' is the docs root."""
+    if is_external(href):
+        return None
+    path = urllib.parse.unquote(href.split('#', 1)[0].split('?', 1)[0])
+    if not path:
+        return None
+    if path.startswith('/'):
+        return os.path.normpath(os.path.join(root, path.lstrip('/')))
+    return os.path.normpath(os.path.join(os.path.dirname(page), path))
+
+
+def page_for(target):
+    """The page a target stands for: a directory's index page, else the target itself."""
+    if os.path.isdir(target):
+        for name in INDEX_NAMES:
+            if os.path.isfile(os.path.join(target, name)):
+                return os.path.join(target, name)
+    return target
+
+
+def nav_pages(mkdocs_yml=MKDOCS_YML, root=DEFAULT_ROOT):
+    """Absolute paths of the pages listed in mkdocs.yml's nav."""
+    try:
+        text = atomicio.read_text(mkdocs_yml)
+    except OSError:
+        return set()
+    m = re.search(r"^nav:\s*\n((?:[ \t-].*\n|\s*\n)*)", text, re.M)
+    if not m:
+        return set()
+    return {os.path.abspath(os.path.join(root, p))
+            for p in re.findall(r"['\"]?([\w./-]+\.md)['\"]?\s*$", m.group(1), re.M)}
+
+
+class LinkGraph:
+    """Forward edges per page and the reverse index, for the pages under root. Call save() to
+    persist updates."""
+
+    def __init__(self, root=DEFAULT_ROOT, cache_path=DEFAULT_CACHE):
+        self.root = os.path.abspath(root)
+        self.cache_path = cache_path
+        self._dirty = False
+        # path -> {'stat': [mtime_ns, size], 'digest': sha256, 'links': [Link fields]}
+        self.pages = {}
+        if cache_path:
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as fh:
+                    data = json.load(fh)
+                if data.get('version') == CACHE_VERSION and data.get('root') == self.root:
+                    self.pages = data['pages']
+            except (OSError, ValueError, KeyError):
+                pass
+        self.referrers = collections.defaultdict(set)
+        for path in self.pages:
+            self._index(path)
+
+    def _index(self, path, add=True):
+        for link in self.links(path):
+            if link.target is not None:
+                target = page_for(link.target)
+                if add:
+                    self.referrers[target].add(path)
+                else:
+                    self.referrers[target].discard(path)
+
+    def links(self, path):
+        entry = self.pages.get(path)
+        return [Link(*fields) for fields in entry['links']] if entry else []
+
+    def update(self, paths=None):
+        """Bring the graph up to date with the pages under root (or only the given pages, which
+        never counts other pages as removed); return Changes."""
+        seen = set()
+        changed, added = set(), set()
+        for p in mdwalk.iter_markdown_files([self.root] if paths is None else paths):
+            path = os.path.abspath(p)
+            seen.add(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stat = [st.st_mtime_ns, st.st_size]
+            entry = self.pages.get(path)
+            if entry and entry['stat'] == stat:
+                continue
+            text = atomicio.read_text(path, errors='replace')
+            digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            self._dirty = True
+            if entry and entry['digest'] == digest:
+                entry['stat'] = stat
+                continue
+            if entry:
+                self._index(path, add=False)
+                changed.add(path)
+            else:
+                added.add(path)
+            links = [Link(l.href, l.text, l.line, l.col, l.kind, resolve(path, l.href, self.root))
+                     for l in extract_links(text)]
+            self.pages[path] = {'stat': stat, 'digest': digest, 'links': [list(l) for l in links]}
+            self._index(path)
+        removed = set()
+        if paths is None:
+            removed = {p for p in self.pages if p not in seen}
+        else:
+            removed = {os.path.abspath(p) for p in paths if os.path.abspath(p) in self.pages
+                       and not os.path.exists(p)}
+        for path in removed:
+            self._index(path, add=False)
+            del self.pages[path]
+            self._dirty = True
+        affected = set()
+        for path in added | removed:
+            affected |= self.referrers.get(path, set())
+        return Changes(changed, added, removed, affected - removed)
+
+    def referrers_of(self, path):
+        return sorted(self.referrers.get(os.path.abspath(path), ()))
+
+    def broken(self, pages=None):
+        """(page, Link) for every local link of pages (default: all) whose target is missing."""
+        out = []
+        for path in sorted(self.pages if pages is None else pages):
+            for link in self.links(path):
+                if link.target is not None and not os.path.exists(link.target):
+                    out.append((path, link))
+        return out
+
+    def orphans(self, nav=None):
+        """Pages that are neither in nav (default: the mkdocs.yml nav) nor linked from another
+        page. The home page (index.md at the root) is never an orphan."""
+        nav = nav_pages(root=self.root) if nav is None else nav
+        home = {os.path.join(self.root, name) for name in INDEX_NAMES}
+        return sorted(p for p in self.pages if p not in nav and p not in home
+                      and not (self.referrers.get(p, set()) - {p}))
+
+    def save(self):
+        if not self._dirty or not self.cache_path:
+            return
+        if os.path.dirname(self.cache_path):
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        atomicio.write_text(self.cache_path, json.dumps({'version': CACHE_VERSION, 'root': self.root,
+                                                         'pages': self.pages}, sort_keys=True))
+        self._dirty = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the docs link graph and report broken links and orphan pages')
+    parser.add_argument('--root', default=DEFAULT_ROOT, help=f"Docs directory (default: {DEFAULT_ROOT})")
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help=f"Link graph file (default: {DEFAULT_CACHE})")
+    parser.add_argument('--mkdocs', default=MKDOCS_YML, help=f"mkdocs.yml with the nav (default: {MKDOCS_YML})")
+    parser.add_argument('--broken', action='store_true',
+                        help='Report broken local links of the pages that changed and of the referrers of added or removed pages')
+    parser.add_argument('--all', action='store_true', help='With --broken, validate every page')
+    parser.add_argument('--orphans', action='store_true', help='Report pages neither in the nav nor linked from any page')
+    parser.add_argument('--referrers', nargs='+', metavar='PAGE', help='List the pages that link to PAGE')
+    args = parser.parse_args()
+    graph = LinkGraph(args.root, args.cache)
+    changes = graph.update()
+    edges = sum(len(e['links']) for e in graph.pages.values())
+    print(f"{len(graph.pages)} pages, {edges} links: {len(changes.changed)} changed, {len(changes.added)} added, "
+          f"{len(changes.removed)} removed, {len(changes.affected)} referrers to re-validate")
+    found = False
+    if args.broken:
+        pages = None if args.all else (changes.changed | changes.added | changes.affected)
+        for path, link in graph.broken(pages):
+            found = True
+            print(f"{os.path.relpath(path)}:{link.line}:{link.col}: broken {link.kind} link -> {link.href}")
+    if args.orphans:
+        for path in graph.orphans(nav_pages(args.mkdocs, args.root)):
+            found = True
+            print(f"orphan: {os.path.relpath(path)}")
+    for page in args.referrers or ():
+        print(f"{page} is linked from:")
+        for path in graph.referrers_of(page_for(os.path.abspath(page))):
+            lines = [str(l.line) for l in graph.links(path)
+                     if l.target and page_for(l.target) == page_for(os.path.abspath(page))]
+            print(f"  {os.path.relpath(path)} (line {', '.join(lines)})")
+    graph.save()
+    sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
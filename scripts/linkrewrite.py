@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Rewrite links across the docs tree from a mapping of old hrefs to new ones.
+
+docs/tools/link_mapping.json used to hold only exact old-href -> new-href pairs, applied to the
+links of a broken-link report. When a whole site moves that means one pair per link. A mapping
+may now also hold prefix and regex rules:
+
+    {
+      "exact":  {"mailto:goc@opensciencegrid.org": "mailto:support@osg-htc.org"},
+      "prefix": {"https://psetf.opensciencegrid.org/": "https://psetf.aglt2.org/"},
+      "regex":  {"^https?://twiki\\.opensciencegrid\\.org/bin/view/(.*)$": "https://example.org/\\1"}
+    }
+
+A flat {old: new} object is read as exact rules, so existing mapping files keep working.
+
+All rules are compiled into one Rewriter: exact rules are a dict lookup, prefix rules a
+character trie (the longest matching prefix wins, and its remainder is kept), and the regex
+rules one alternation, so an href is matched against all of them at once. A regex has to match
+the whole href and its replacement may use \\1 and \\g<name>; patterns that refer back to their
+own groups are matched one by one. Exact rules win over prefix rules, and those over regex rules.
+
+Every link form is rewritten: inline links and images, autolinks, HTML <a href> and reference
+definitions (see linkgraph.href_spans()); links in code are not. Each href is rewritten at most
+once, so rules do not chain. The run prints how many links and pages each rule changed (also
+with --check/--diff, which write nothing) and lists the rules that matched no link, so stale
+mappings can be pruned; --summary PATH writes the same as JSON.
+
+Usage:
+    python3 scripts/linkrewrite.py --map docs/tools/link_mapping.json --diff
+    python3 scripts/linkrewrite.py docs --map docs/tools/link_mapping.json --summary rules.json
+"""
+
+import argparse
+import collections
+import functools
+import json
+import re
+import sys
+
+import atomicio
+import linkgraph
+import mdwalk
+
+DEFAULT_MAP = 'docs/tools/link_mapping.json'
+KINDS = ('exact', 'prefix', 'regex')
+
+# kind: one of KINDS; old: the href, prefix or pattern; new: its replacement
+Rule = collections.namedtuple('Rule', 'kind old new')
+
+# a backreference in a pattern, which would point at another group in the joined alternation
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+# marks the end of a prefix in the trie
+_END = ''
+
+
+def load_rules(path):
+    """The rules of a mapping file, in order: exact, prefix, then regex."""
+    with open(path, 'r', encoding='utf-8') as fh:
+        data = json.load(fh)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: a mapping is a JSON object")
+    if not (data.keys() <= set(KINDS) and all(isinstance(v, dict) for v in data.values())):
+        # the flat {old: new} form
+        data = {'exact': data}
+    rules = []
+    for kind in KINDS:
+        for old, new in data.get(kind, {}).items():
+            if not old:
+                raise ValueError(f"{path}: empty {kind} rule")
+            rules.append(Rule(kind, old, new))
+    return rules
+
+
+class Rewriter:
+    """All rules compiled for matching an href against every one of them at once."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._exact = {}
+        self._trie = {}
+        self._regexes = {}
+        alternatives, separate = [], []
+        for i, rule in enumerate(self.rules):
+            if rule.kind == 'exact':
+                self._exact.setdefault(rule.old, i)
+            elif rule.kind == 'prefix':
+                node = self._trie
+                for ch in rule.old:
+                    node = node.setdefault(ch, {})
+                node.setdefault(_END, i)
+            else:
+                self._regexes[i] = re.compile(rule.old)
+                if _BACKREF_RE.search(rule.old):
+                    separate.append(i)
+                else:
+                    alternatives.append(i)
+        self._combined = None
+        if alternatives:
+            try:
+                # the rule's group names its index; its own named groups are matched again below
+                self._combined = re.compile('|'.join(f"(?P<r{i}>{self.rules[i].old})" for i in alternatives))
+            except re.error:
+                separate = sorted(separate + alternatives)
+        self._separate = separate
+
+    def _regex_match(self, href):
+        found = []
+        if self._combined is not None:
+            m = self._combined.fullmatch(href)
+            if m:
+                found.append(int(m.lastgroup[1:]))
+        for i in self._separate:
+            if found and i > found[0]:
+                break
+            if self._regexes[i].fullmatch(href):
+                found.append(i)
+                break
+        return min(found) if found else None
+
+    def rewrite(self, href):
+        """(rule index, new href) for the first rule matching href, or None."""
+        i = self._exact.get(href)
+        if i is not None:
+            return i, self.rules[i].new
+        node, best = self._trie, None
+        for depth, ch in enumerate(href):
+            node = node.get(ch)
+            if node is None:
+                break
+            if _END in node:
+                best = (node[_END], depth + 1)
+        if best is not None:
+            i, length = best
+            return i, self.rules[i].new + href[length:]
+        i = self._regex_match(href)
+        if i is not None:
+            return i, self._regexes[i].fullmatch(href).expand(self.rules[i].new)
+        return None
+
+
+def rewrite_text(text, rewriter):
+    """(new text, indices of the rules that matched, one per link) for one page."""
+    pieces, hits, pos = [], [], 0
+    for start, end, _kind in linkgraph.href_spans(text):
+        hit = rewriter.rewrite(text[start:end])
+        if hit is None:
+            continue
+        i, new = hit
+        hits.append(i)
+        pieces += [text[pos:start], new]
+        pos = end
+    return ''.join(pieces) + text[pos:], hits
+
+
+def summarize(rules, results):
+    """Per rule: {'kind', 'old', 'new', 'links', 'pages'} from the rewrite results of a run."""
+    links, pages = collections.Counter(), collections.defaultdict(set)
+    for r in results:
+        for i in r.detail or ():
+            links[i] += 1
+            pages[i].add(r.path)
+    return [{'kind': rule.kind, 'old': rule.old, 'new': rule.new, 'links': links[i], 'pages': len(pages[i])}
+            for i, rule in enumerate(rules)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rewrite links in Markdown files from exact, prefix and regex rules')
+    parser.add_argument('paths', nargs='*', default=['docs'], help='Markdown files or directories (default: docs)')
+    parser.add_argument('--map', default=DEFAULT_MAP, help=f"Mapping file (default: {DEFAULT_MAP})")
+    parser.add_argument('--summary', metavar='PATH', help='Write the per-rule counts, unmatched rules included, as JSON')
+    parser.add_argument('--jobs', '-j', type=mdwalk.jobs_arg, default=1, help='Process files in parallel (0 = one per CPU)')
+    mdwalk.add_mode_args(parser)
+    args = parser.parse_args()
+    mode = mdwalk.mode_from_args(args)
+    try:
+        rules = load_rules(args.map)
+        rewriter = Rewriter(rules)
+    except (OSError, ValueError, re.error) as e:
+        parser.error(str(e))
+    transform = functools.partial(rewrite_text, rewriter=rewriter)
+    results = []
+    for r in mdwalk.iter_process_files(mdwalk.iter_markdown_files(args.paths), transform, args.jobs, mode=mode):
+        results.append(r)
+        if r.changed:
+            if mode == mdwalk.WRITE:
+                print(f"Rewrote: {r.path} ({len(r.detail)} links)")
+            else:
+                mdwalk.report_pending(r, mode)
+    mdwalk.report_errors(results, 'rewriting')
+    summary = summarize(rules, results)
+    print(f"{len(rules)} rules, {sum(s['links'] for s in summary)} links matched "
+          f"in {sum(1 for r in results if r.detail)} of {len(results)} files:")
+    for s in summary:
+        if s['links']:
+            print(f"  {s['links']:5} links in {s['pages']:3} files  {s['kind']:<6} {s['old']} -> {s['new']}")
+    stale = [s for s in summary if not s['links']]
+    if stale:
+        print(f"{len(stale)} rules matched no link (stale, can be pruned from {args.map}):")
+        for s in stale:
+            print(f"  {s['kind']:<6} {s['old']}")
+    if args.summary:
+        atomicio.write_text(args.summary, json.dumps({'map': args.map, 'rules': summary}, indent=1) + '\n')
+    sys.exit(mdwalk.exit_status(args, any(r.changed for r in results)))
+
+
+if __name__ == '__main__':
+    main()
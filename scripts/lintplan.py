@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Apply markdownlint --json findings as one edit plan per file.
+
+markdownlint's JSON output is a list of findings ({"fileName", "lineNumber", "ruleNames",
+"fixInfo", ...}). The report is read once and its findings grouped by file. Each file is read
+once. Its findings become edits on the original text: character ranges to replace and the text to
+replace them with. The edits are sorted into one plan, overlapping edits are resolved, and the
+plan is applied in a single pass with one write.
+
+Edits come from markdownlint's fixInfo ({"lineNumber", "editColumn", "deleteCount",
+"insertText"}, where a deleteCount of -1 deletes the whole line), for the rules in RULES:
+
+  MD012  extra blank line: delete it
+  MD022  blank line around a heading: insert one
+  MD026  trailing punctuation in a heading: delete it
+  MD031  blank line around a fence: insert one
+  MD032  blank line around a list: insert one
+  MD034  bare URL: wrap it in <...>
+  MD040  fence without a language: markdownlint has no fix, so the language comes from
+         fencelang.classify() on the block's first lines
+
+Because every edit is an offset into the text as it was linted, applying one never shifts another.
+Two findings that ask for the same edit (MD031 and MD032 both wanting a blank line above a list
+that follows a fence) apply once. An edit that overlaps one already planned is dropped and
+counted as a conflict. Blank-line insertions next to a line that is already blank are skipped,
+because the report is older than the file.
+
+Usage: python3 scripts/lintplan.py tmp/markdownlint.json [--rules MD031,MD040] [--check | --diff]
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+
+import atomicio
+import fencelang
+import mdblocks
+import mdwalk
+
+RULES = ('MD012', 'MD022', 'MD026', 'MD031', 'MD032', 'MD034', 'MD040')
+
+# start/end: character offsets into the linted text; text: what replaces text[start:end]
+Edit = collections.namedtuple('Edit', 'start end text rule line')
+
+
+def load_report(json_file):
+    """markdownlint --json findings grouped by file: {fileName: [finding, ...]} in report order."""
+    with open(json_file, 'r', encoding='utf-8') as fh:
+        data = json.load(fh)
+    by_file = collections.defaultdict(list)
+    for rec in data:
+        by_file[rec['fileName']].append(rec)
+    return by_file
+
+
+def rule_of(rec):
+    names = rec.get('ruleNames') or ['']
+    return names[0]
+
+
+def line_starts(text):
+    """Offset of the start of every line; one extra entry for the end of the text."""
+    starts = [0]
+    pos = text.find('\n')
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = text.find('\n', pos + 1)
+    if starts[-1] != len(text):
+        starts.append(len(text))
+    return starts
+
+
+def _line_text(text, starts, idx):
+    if idx < 0 or idx >= len(starts) - 1:
+        return None
+    return text[starts[idx]:starts[idx + 1]].rstrip('\n')
+
+
+def _fix_edit(rec, text, starts):
+    """The Edit for a finding's fixInfo, or None if it does not apply to this text."""
+    fix = rec['fixInfo']
+    line = fix.get('lineNumber', rec.get('lineNumber'))
+    idx = line - 1 if line else -1
+    current = _line_text(text, starts, idx)
+    if current is None:
+        return None
+    rule = rule_of(rec)
+    delete = fix.get('deleteCount', 0)
+    insert = fix.get('insertText', '')
+    if delete == -1:
+        return Edit(starts[idx], starts[idx + 1], '', rule, line)
+    col = min(max(fix.get('editColumn', 1) - 1, 0), len(current))
+    if delete == 0 and col == 0 and insert.strip() == '' and '\n' in insert:
+        # a blank line to insert; stale if there already is one on either side
+        if current.strip() == '' or (idx > 0 and _line_text(text, starts, idx - 1).strip() == ''):
+            return None
+    start = starts[idx] + col
+    end = min(start + max(delete, 0), starts[idx] + len(current))
+    return Edit(start, end, insert, rule, line)
+
+
+def _md040_edit(rec, text, starts, doc):
+    """Append a guessed language to the opening fence of an MD040 finding."""
+    idx = rec.get('lineNumber', 0) - 1
+    if not 0 <= idx < len(doc.lines):
+        return None
+    block = doc.block_at(idx)
+    if block.kind != 'fence' or block.info:
+        return None
+    opener = _line_text(text, starts, block.start)
+    lang = fencelang.classify(doc.lines[k] for k in block.content)
+    end = starts[block.start] + len(opener.rstrip())
+    return Edit(end, starts[block.start] + len(opener), ' ' + lang, 'MD040', block.start + 1)
+
+
+def plan_edits(text, records, rules=RULES):
+    """Build the edit plan for one file; return (edits in offset order, conflicts dropped)."""
+    starts = line_starts(text)
+    doc = None
+    edits = []
+    for rec in records:
+        rule = rule_of(rec)
+        if rule not in rules:
+            continue
+        if rule == 'MD040':
+            if doc is None:
+                doc = mdblocks.parse(text)
+            edit = _md040_edit(rec, text, starts, doc)
+        elif rec.get('fixInfo'):
+            edit = _fix_edit(rec, text, starts)
+        else:
+            edit = None
+        if edit is not None:
+            edits.append(edit)
+    edits.sort(key=lambda e: (e.start, e.end))
+    planned, conflicts = [], []
+    end = 0
+    for e in edits:
+        if planned and e[:3] == planned[-1][:3]:
+            # the same edit asked for by two findings
+            continue
+        if e.start < end:
+            conflicts.append(e)
+            continue
+        planned.append(e)
+        end = max(end, e.end)
+    return planned, conflicts
+
+
+def apply_edits(text, edits):
+    """Apply a plan from plan_edits() in one pass over text."""
+    out = []
+    pos = 0
+    for e in edits:
+        out.append(text[pos:e.start])
+        out.append(e.text)
+        pos = e.end
+    out.append(text[pos:])
+    return ''.join(out)
+
+
+def apply_findings(by_file, rules=RULES, mode=mdwalk.WRITE):
+    """Apply findings grouped by file ({fileName: [finding, ...]}, as load_report() returns them
+    or mdlint.lint_files() produces them); return {path: Counter of rules applied} for the files
+    that changed (or would change, in CHECK/DIFF mode)."""
+    changed = {}
+    for fname, records in sorted(by_file.items()):
+        if not os.path.exists(fname):
+            print('Missing', fname)
+            continue
+        text = atomicio.read_text(fname)
+        edits, conflicts = plan_edits(text, records, rules)
+        for e in conflicts:
+            print(f"Skipped overlapping {e.rule} edit in {fname} line {e.line}")
+        new_text = apply_edits(text, edits)
+        if new_text == text:
+            continue
+        changed[fname] = collections.Counter(e.rule for e in edits)
+        if mode == mdwalk.WRITE:
+            atomicio.write_text(fname, new_text, original=text)
+            print('Patched', fname)
+        elif mode == mdwalk.DIFF:
+            sys.stdout.write(mdwalk.unified_diff(fname, text, new_text))
+        else:
+            print(f"Would change: {fname}")
+    return changed
+
+
+def apply_report(json_file, rules=RULES, mode=mdwalk.WRITE):
+    """Apply a markdownlint JSON report file; see apply_findings()."""
+    return apply_findings(load_report(json_file), rules, mode)
+
+
+def print_summary(changed, mode=mdwalk.WRITE):
+    if not changed:
+        return
+    totals = collections.Counter()
+    for counts in changed.values():
+        totals.update(counts)
+    print('Files changed:' if mode == mdwalk.WRITE else 'Files that would change:')
+    for f in changed:
+        print(' -', f)
+    print('Edits: ' + ', '.join(f"{rule} {n}" for rule, n in sorted(totals.items())))
+
+
+def rules_arg(value):
+    rules = tuple(r.strip().upper() for r in value.split(',') if r.strip())
+    unknown = [r for r in rules if r not in RULES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unsupported rules: {', '.join(unknown)} (supported: {', '.join(RULES)})")
+    return rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply markdownlint JSON findings as one edit plan per file')
+    parser.add_argument('report', help='markdownlint --json output')
+    parser.add_argument('--rules', type=rules_arg, default=RULES,
+                        help=f"Comma-separated rules to fix (default: {','.join(RULES)})")
+    mdwalk.add_mode_args(parser)
+    args = parser.parse_args()
+    mode = mdwalk.mode_from_args(args)
+    changed = apply_report(args.report, args.rules, mode)
+    if mode != mdwalk.DIFF:
+        print_summary(changed, mode)
+    sys.exit(mdwalk.exit_status(args, changed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""Shared single-pass Markdown block model for the docs fixers in scripts/.
+
+Every fixer used to rebuild its own idea of fences, front matter, lists and admonitions with
+per-line regexes (some toggling on any fence line, some using a stack). This module tokenizes a
+file once into typed blocks with line spans so the fixers can walk one consistent model:
+
+- frontmatter: a leading YAML block delimited by '---' lines
+- fence: fenced code with fence char, fence length and info string; a fence is closed only by a
+  bare fence of the same char that is at least as long as the opener
+- admonition: '!!!', '???' or '???+' headers; the span covers the indented body
+- list_item: bullet or ordered item with nesting depth; the span covers nested content
+- heading: ATX or setext headings with their level
+- paragraph, quote, html, rule and blank
+
+Spans are 0-based and half-open: lines[block.start:block.end]. Container blocks (admonitions and
+list items) also record head_end, the end of their own lines before any nested content, and every
+block records the index of its enclosing container in `parent`.
+
+Usage (library): doc = mdblocks.parse(text); for b in doc.iter('fence'): ...
+Usage (debug):   python3 scripts/mdblocks.py docs/index.md
+"""
+
+import re
+import sys
+from collections import namedtuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional
+
+# One combined pattern classifies every line in a single match. Alternatives are ordered so that
+# thematic breaks win over bullets ('- - -') and fences win over everything else.
+LINE_RE = re.compile(r"""
+    ^(?P<indent>[ \t]*)
+    (?:
+        (?P<fence>`{3,}(?=[^`]*$)|~{3,})(?P<info>.*)
+      | (?P<hashes>\#{1,6})(?:[ \t]+(?P<htext>.*?))?[ \t]*$
+      | (?P<admon>!!!|\?\?\?\+?)[ \t]+(?P<atype>[\w-]+)(?P<atitle>.*)
+      | (?P<rule>(?:-[ \t]*){3,}|(?:\*[ \t]*){3,}|(?:_[ \t]*){3,})$
+      | (?P<underline>=+|-{2,})[ \t]*$
+      | (?P<bullet>[-*+])[ \t]+(?P<btext>.*)
+      | (?P<num>\d{1,9})(?P<delim>[.)])[ \t]+(?P<ntext>.*)
+      | (?P<quote>>)
+      | (?P<html><(?:[A-Za-z/]|!--).*)
+    )?
+""", re.X)
+
+# kind: blank|fence|heading|admonition|rule|underline|list|quote|html|text
+# marker: fence chars, heading hashes, admonition marker, list marker, rule/underline chars
+# info: fence info string, heading text, admonition type, list item text
+Line = namedtuple('Line', 'kind indent marker info')
+BLANK = Line('blank', 0, '', '')
+# the passes timed separately when a fixer runs with --profile (see runprofile.py)
+PROFILED = ('classify_lines', 'parse_blocks', 'iter_lines')
+
+
+def classify_line(line: str) -> Line:
+    """Classify a single line (without its newline) into a Line record."""
+    if not line.strip():
+        return BLANK
+    m = LINE_RE.match(line)
+    indent = len(m.group('indent'))
+    # the last group that matched identifies the alternative, so only its groups are read
+    last = m.lastgroup
+    if last == 'info':
+        return Line('fence', indent, m.group('fence'), m.group('info').strip())
+    if last == 'htext' or last == 'hashes':
+        return Line('heading', indent, m.group('hashes'), m.group('htext') or '')
+    if last == 'atitle':
+        return Line('admonition', indent, m.group('admon'), m.group('atype'))
+    if last == 'rule':
+        return Line('rule', indent, m.group('rule').strip()[0], '')
+    if last == 'underline':
+        return Line('underline', indent, m.group('underline')[0], '')
+    if last == 'btext':
+        return Line('list', indent, m.group('bullet'), m.group('btext'))
+    if last == 'ntext':
+        return Line('list', indent, m.group('num') + m.group('delim'), m.group('ntext'))
+    if last == 'quote':
+        return Line('quote', indent, '>', '')
+    if last == 'html' and indent <= 3:
+        return Line('html', indent, '<', '')
+    return Line('text', indent, '', '')
+
+
+def classify_lines(lines: List[str]) -> List[Line]:
+    """Return one Line record per input line, computed in a single pass."""
+    return [classify_line(ln) for ln in lines]
+
+
+@dataclass
+class Block:
+    kind: str
+    start: int
+    end: int
+    indent: int = 0
+    marker: str = ''
+    info: str = ''
+    level: int = 0
+    depth: int = 0
+    parent: Optional[int] = None
+    head_end: int = 0
+    closed: bool = True
+    setext: bool = False
+
+    @property
+    def fence_char(self) -> str:
+        return self.marker[:1]
+
+    @property
+    def fence_len(self) -> int:
+        return len(self.marker)
+
+    @property
+    def content(self) -> range:
+        """Line indexes of a fence's content (excluding the opening and closing fence lines)."""
+        return range(self.start + 1, self.end - 1 if self.closed else self.end)
+
+
+def _is_closing_fence(ln: Line, opener: Line) -> bool:
+    return (ln.kind == 'fence' and not ln.info and ln.marker[0] == opener.marker[0]
+            and len(ln.marker) >= len(opener.marker))
+
+
+def _frontmatter_end(lines: List[str]) -> int:
+    if not lines or lines[0].strip() != '---':
+        return 0
+    for j in range(1, len(lines)):
+        if lines[j].strip() in ('---', '...'):
+            return j + 1
+    return 0
+
+
+def parse_blocks(lines: List[str], info: Optional[List[Line]] = None) -> List[Block]:
+    """Tokenize lines into a flat, document-ordered list of Blocks (see module docstring)."""
+    if info is None:
+        info = classify_lines(lines)
+    n = len(lines)
+    blocks: List[Block] = []
+    stack: List[int] = []  # indexes of open admonition/list_item blocks
+
+    def add(block: Block) -> None:
+        block.parent = stack[-1] if stack else None
+        if not block.head_end:
+            block.head_end = block.end
+        blocks.append(block)
+        if block.kind != 'blank':
+            for idx in stack:
+                blocks[idx].end = block.end
+
+    i = _frontmatter_end(lines)
+    if i:
+        add(Block('frontmatter', 0, i, marker='---'))
+    while i < n:
+        ln = info[i]
+        if ln.kind == 'blank':
+            j = i + 1
+            while j < n and info[j].kind == 'blank':
+                j += 1
+            add(Block('blank', i, j))
+            i = j
+            continue
+        # leave every container this line is not indented into
+        while stack and ln.indent <= blocks[stack[-1]].indent:
+            stack.pop()
+
+        kind = ln.kind
+        if kind == 'fence':
+            j = i + 1
+            while j < n and not _is_closing_fence(info[j], ln):
+                j += 1
+            closed = j < n
+            add(Block('fence', i, j + 1 if closed else n, ln.indent, ln.marker, ln.info, closed=closed))
+            i = j + 1
+        elif kind == 'heading':
+            text = re.sub(r"(^|[ \t]+)#+$", '', ln.info)
+            add(Block('heading', i, i + 1, ln.indent, ln.marker, text, level=len(ln.marker)))
+            i += 1
+        elif kind == 'admonition':
+            depth = sum(1 for idx in stack if blocks[idx].kind == 'admonition')
+            add(Block('admonition', i, i + 1, ln.indent, ln.marker, ln.info, depth=depth))
+            stack.append(len(blocks) - 1)
+            i += 1
+        elif kind == 'list':
+            j = i + 1
+            while j < n and info[j].kind == 'text':  # lazy continuation lines
+                j += 1
+            depth = sum(1 for idx in stack if blocks[idx].kind == 'list_item')
+            add(Block('list_item', i, j, ln.indent, ln.marker, ln.info, depth=depth))
+            stack.append(len(blocks) - 1)
+            i = j
+        elif kind == 'rule':
+            add(Block('rule', i, i + 1, ln.indent, ln.marker))
+            i += 1
+        elif kind == 'html':
+            j = i + 1
+            if lines[i].lstrip().startswith('<!--'):
+                j = i
+                while j < n and '-->' not in lines[j]:
+                    j += 1
+                j = min(j + 1, n)
+            else:
+                while j < n and info[j].kind != 'blank':
+                    j += 1
+            add(Block('html', i, j, ln.indent))
+            i = j
+        elif kind == 'quote':
+            j = i + 1
+            while j < n and info[j].kind in ('quote', 'text'):
+                j += 1
+            add(Block('quote', i, j, ln.indent, '>'))
+            i = j
+        else:
+            # paragraph: text lines (a stray underline starts one too), possibly a setext heading
+            j = i + 1
+            while j < n and info[j].kind == 'text':
+                j += 1
+            nxt = info[j] if j < n else None
+            # an underline must sit inside the same container as the paragraph (no lazy underlines)
+            if nxt and stack and nxt.indent <= blocks[stack[-1]].indent:
+                nxt = None
+            if nxt and nxt.indent - ln.indent <= 3 and (nxt.kind == 'underline' or (nxt.kind == 'rule' and nxt.marker == '-'
+                                                                         and lines[j].strip().strip('-') == '')):
+                text = ' '.join(lines[k].strip() for k in range(i, j))
+                add(Block('heading', i, j + 1, ln.indent, lines[j].strip(), text,
+                          level=1 if nxt.marker == '=' else 2, setext=True))
+                i = j + 1
+            else:
+                add(Block('paragraph', i, j, ln.indent))
+                i = j
+    return blocks
+
+
+# role: the block kind for the first line of a block ('fence', 'heading', 'admonition',
+# 'list_item', 'rule', 'html', 'quote', 'paragraph'), 'cont' for later lines of a paragraph,
+# list item or quote (including a setext underline), 'code' for fence content, 'fence_end' for a
+# closing fence, 'html' inside an HTML block, 'frontmatter' or 'blank'.
+# contained: the line's block sits inside an admonition or list item.
+# opener: for 'fence', 'code' and 'fence_end' lines, the Line record of the opening fence.
+StreamLine = namedtuple('StreamLine', 'text info role contained opener')
+
+
+def iter_lines(lines: Iterable[str]) -> Iterator[StreamLine]:
+    """Streaming counterpart of parse_blocks: classify lines one at a time and yield a StreamLine
+    for each, keeping only the open container indents as state, so arbitrarily large files can be
+    processed in constant memory.
+
+    Block boundaries and fence pairing match parse_blocks, except that a paragraph is not known to
+    be a setext heading until its underline arrives and that front matter without a closing
+    delimiter runs to the end of the input (parse_blocks needs the whole file to rule it out).
+    """
+    stack: List[int] = []  # indents of open admonition/list_item blocks
+    mode = None  # text continuation or multi-line block in progress
+    opener = None
+    contained = False
+    para_indent = 0
+    first = True
+    for line in lines:
+        ln = classify_line(line)
+        if first:
+            first = False
+            if line.strip() == '---':
+                mode = 'frontmatter'
+                yield StreamLine(line, ln, 'frontmatter', False, None)
+                continue
+        if mode == 'frontmatter':
+            if line.strip() in ('---', '...'):
+                mode = None
+            yield StreamLine(line, ln, 'frontmatter', False, None)
+            continue
+        if mode == 'fence':
+            if _is_closing_fence(ln, opener):
+                mode = None
+                yield StreamLine(line, ln, 'fence_end', contained, opener)
+            else:
+                yield StreamLine(line, ln, 'code', contained, opener)
+            continue
+        if mode == 'comment':
+            if '-->' in line:
+                mode = None
+            yield StreamLine(line, ln, 'html', contained, None)
+            continue
+        if ln.kind == 'blank':
+            mode = None
+            yield StreamLine(line, ln, 'blank', contained, None)
+            continue
+        if mode == 'html' or (mode in ('para', 'list') and ln.kind == 'text') or \
+                (mode == 'quote' and ln.kind in ('quote', 'text')):
+            yield StreamLine(line, ln, 'html' if mode == 'html' else 'cont', contained, None)
+            continue
+        if mode == 'para' and ln.kind in ('underline', 'rule') and not (stack and ln.indent <= stack[-1]) \
+                and ln.indent - para_indent <= 3 and (ln.kind == 'underline' or (ln.marker == '-'
+                                                                            and line.strip().strip('-') == '')):
+            # setext underline: ends the paragraph, which turns out to be a heading
+            mode = None
+            yield StreamLine(line, ln, 'cont', contained, None)
+            continue
+
+        # a new block starts here: leave every container this line is not indented into
+        while stack and ln.indent <= stack[-1]:
+            stack.pop()
+        contained = bool(stack)
+        kind = ln.kind
+        mode = None
+        if kind == 'fence':
+            mode, opener = 'fence', ln
+            role = 'fence'
+        elif kind in ('heading', 'rule'):
+            role = kind
+        elif kind == 'admonition':
+            stack.append(ln.indent)
+            role = kind
+        elif kind == 'list':
+            stack.append(ln.indent)
+            mode, role = 'list', 'list_item'
+        elif kind == 'html':
+            if not line.lstrip().startswith('<!--'):
+                mode = 'html'
+            elif '-->' not in line:
+                mode = 'comment'
+            role = kind
+        elif kind == 'quote':
+            mode = role = 'quote'
+        else:
+            mode, role = 'para', 'paragraph'
+            para_indent = ln.indent
+        yield StreamLine(line, ln, role, contained, opener if kind == 'fence' else None)
+
+
+class Document:
+    """A parsed Markdown file: its lines, per-line classification and blocks."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = text.splitlines()
+        self.line_info = classify_lines(self.lines)
+        self.blocks = parse_blocks(self.lines, self.line_info)
+        # owner[i] is the index of the innermost block that line i belongs to
+        self.owner = [0] * len(self.lines)
+        for idx, b in enumerate(self.blocks):
+            for k in range(b.start, b.head_end):
+                self.owner[k] = idx
+
+    def iter(self, *kinds: str) -> Iterator[Block]:
+        for b in self.blocks:
+            if not kinds or b.kind in kinds:
+                yield b
+
+    def block_at(self, i: int) -> Block:
+        return self.blocks[self.owner[i]]
+
+    def ancestors(self, block: Block) -> Iterator[Block]:
+        p = block.parent
+        while p is not None:
+            yield self.blocks[p]
+            p = self.blocks[p].parent
+
+    def enclosing(self, block: Block, kind: str) -> Optional[Block]:
+        """Return the innermost enclosing container of the given kind, or None."""
+        for a in self.ancestors(block):
+            if a.kind == kind:
+                return a
+        return None
+
+    def is_code(self, i: int) -> bool:
+        """True when line i is part of a fenced code block (fence lines included)."""
+        return self.block_at(i).kind == 'fence'
+
+    def is_verbatim(self, i: int) -> bool:
+        """True when line i belongs to front matter or fenced code and must not be rewritten."""
+        return self.block_at(i).kind in ('fence', 'frontmatter')
+
+    def render(self, lines: List[str]) -> str:
+        """Join (possibly edited) lines, keeping the original file's trailing-newline convention."""
+        if not lines:
+            return ''
+        return '\n'.join(lines) + ('\n' if self.text.endswith('\n') else '')
+
+
+@lru_cache(maxsize=64)
+def parse(text: str) -> Document:
+    """Parse text into a Document. Results are memoized, so unchanged text is parsed only once;
+    callers must treat the returned Document as read-only."""
+    return Document(text)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print('Usage: mdblocks.py <file.md> [...]')
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        with open(path, 'r', encoding='utf-8') as fh:
+            doc = parse(fh.read())
+        print(path)
+        for b in doc.blocks:
+            extra = b.marker if b.kind != 'paragraph' else ''
+            print(f"  {b.start + 1:>5}-{b.end:<5} {'  ' * (b.depth)}{b.kind} {extra} {b.info}".rstrip())
+
+
+if __name__ == '__main__':
+    main()
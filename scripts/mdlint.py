@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""Check Markdown for the markdownlint rules the docs fixers know, without Node.
+
+The rules are MD012, MD022, MD026, MD031, MD032, MD034 and MD040. They are enabled and configured
+from .markdownlint.json the way markdownlint reads it: "default", then each rule by id or alias,
+as true/false or as an object of parameters. The checks walk the shared block model
+(mdblocks.py), so fences, front matter and lists are recognised exactly as the fixers see them.
+Other rules in the config are not checked here; CI runs markdownlint-cli for those. Like markdownlint, the checks skip the bodies of mkdocs
+admonitions, because to CommonMark those are indented code blocks.
+
+Findings are printed the way markdownlint-cli prints them:
+
+    docs/index.md:12 MD031/blanks-around-fences Fenced code blocks should be surrounded by blank lines [Context: "```bash"]
+
+--json writes the markdownlint --json shape instead: fileName, lineNumber, ruleNames,
+ruleDescription, ruleInformation, errorDetail, errorContext, errorRange and fixInfo. That is
+the input apply_markdownlint_fixes.py, fix_md040_from_json.py and lintplan.py take. --fix skips the
+report and applies the findings directly, in the same process, through lintplan. The exit status
+is 1 if anything was found.
+
+Usage:
+  python3 scripts/mdlint.py docs [--config .markdownlint.json] [--json [--output FILE]]
+  python3 scripts/mdlint.py docs --changed-since origin/master...HEAD
+  python3 scripts/mdlint.py docs --fix
+"""
+
+import argparse
+import json
+import re
+import sys
+
+import atomicio
+import gitselect
+import lintplan
+import mdblocks
+import mdwalk
+
+DEFAULT_CONFIG = '.markdownlint.json'
+INFO_URL = 'https://github.com/DavidAnson/markdownlint/blob/v0.33.0/doc/{}.md'
+
+# bare URLs and email addresses (GFM autolink literals)
+URL_RE = re.compile(r"\b(?:https?|ftp)://[^\s<>\[\]\"'`]+")
+EMAIL_RE = re.compile(r"(?<![\w.+%/:-])[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}\b")
+# what a bare URL check must not look inside: code spans, links and images, autolinks and HTML tags
+CODE_SPAN_RE = re.compile(r"(`+)(?:.+?)\1")
+LINK_RE = re.compile(r"!?\[[^\]]*\](?:\([^)]*\)|\[[^\]]*\])")
+TAG_RE = re.compile(r"<[^\s>][^>]*>")
+LINK_DEF_RE = re.compile(r"^\s{0,3}\[[^\]]+\]:\s")
+# a link literal's trailing punctuation is not part of it
+URL_TRAILING = '.,:;!?*_~\'"'
+# ATX closing sequence and HTML entities (which end in ';' but are not punctuation)
+ATX_CLOSE_RE = re.compile(r"(?:^|[ \t]+)#+[ \t]*$")
+ENTITY_RE = re.compile(r"&(?:#\d+|#[xX][0-9a-fA-F]+|\w+);$")
+
+
+def _finding(line, rule, detail=None, context=None, column=None, length=None, fix=None):
+    return {'lineNumber': line, 'rule': rule, 'errorDetail': detail, 'errorContext': context,
+            'errorRange': [column, length] if column is not None else None, 'fixInfo': fix}
+
+
+def _outside_admonitions(doc, blocks):
+    for b in blocks:
+        if doc.enclosing(b, 'admonition') is None:
+            yield b
+
+
+def _is_blank(doc, i):
+    return doc.line_info[i].kind == 'blank'
+
+
+def _frontmatter_end(doc):
+    first = doc.blocks[0] if doc.blocks else None
+    return first.end if first is not None and first.kind == 'frontmatter' else 0
+
+
+def check_md012(doc, params):
+    maximum = params.get('maximum', 1)
+    for b in _outside_admonitions(doc, doc.iter('blank')):
+        for k in range(b.start + maximum, b.end):
+            yield _finding(k + 1, 'MD012', f"Expected: {maximum}; Actual: {k - b.start + 1}",
+                           fix={'deleteCount': -1})
+
+
+def _blank_run(doc, i, step, stop):
+    """Number of blank lines from line i going in direction step, not crossing stop."""
+    count = 0
+    while i != stop and 0 <= i < len(doc.lines) and _is_blank(doc, i):
+        count += 1
+        i += step
+    return count, i
+
+
+def check_md022(doc, params):
+    above_wanted = params.get('lines_above', 1)
+    below_wanted = params.get('lines_below', 1)
+    top = _frontmatter_end(doc)
+    n = len(doc.lines)
+    for b in _outside_admonitions(doc, doc.iter('heading')):
+        context = doc.lines[b.start].strip()
+        above, i = _blank_run(doc, b.start - 1, -1, top - 1)
+        if above_wanted >= 0 and i >= top and above < above_wanted:
+            yield _finding(b.start + 1, 'MD022', f"Expected: {above_wanted}; Actual: {above}; Above", context,
+                           fix={'insertText': '\n' * (above_wanted - above)})
+        below, i = _blank_run(doc, b.end, 1, n)
+        if below_wanted >= 0 and i < n and below < below_wanted:
+            yield _finding(b.start + 1, 'MD022', f"Expected: {below_wanted}; Actual: {below}; Below", context,
+                           fix={'lineNumber': b.end + 1, 'insertText': '\n' * (below_wanted - below)})
+
+
+def check_md026(doc, params):
+    punctuation = params.get('punctuation', '.,;:!。，；：！')
+    for b in _outside_admonitions(doc, doc.iter('heading')):
+        k = b.end - 2 if b.setext else b.start
+        line = doc.lines[k].rstrip()
+        if not b.setext:
+            line = ATX_CLOSE_RE.sub('', line)
+        if not line or line[-1] not in punctuation or ENTITY_RE.search(line):
+            continue
+        yield _finding(k + 1, 'MD026', f"Punctuation: '{line[-1]}'", column=len(line), length=1,
+                       fix={'editColumn': len(line), 'deleteCount': 1})
+
+
+def check_md031(doc, params):
+    list_items = params.get('list_items', True)
+    top = _frontmatter_end(doc)
+    n = len(doc.lines)
+    for b in _outside_admonitions(doc, doc.iter('fence')):
+        if not list_items and doc.enclosing(b, 'list_item') is not None:
+            continue
+        if b.start > top and not _is_blank(doc, b.start - 1):
+            yield _finding(b.start + 1, 'MD031', context=doc.lines[b.start].strip(), fix={'insertText': '\n'})
+        if b.closed and b.end < n and not _is_blank(doc, b.end):
+            yield _finding(b.end, 'MD031', context=doc.lines[b.end - 1].strip(),
+                           fix={'lineNumber': b.end + 1, 'insertText': '\n'})
+
+
+def _list_kind(marker):
+    # a new bullet character or ordered delimiter starts a new list
+    return marker if not marker[0].isdigit() else marker[-1]
+
+
+def _lists(doc):
+    """Top-level lists as (first item, last item) pairs: runs of sibling items with the same kind
+    of marker, separated by nothing but blank lines."""
+    items = [b for b in doc.iter('list_item') if b.parent is None]
+    run = []
+    for b in items:
+        if run:
+            prev = run[-1]
+            gap_blank = all(_is_blank(doc, k) for k in range(prev.end, b.start))
+            if not gap_blank or _list_kind(prev.marker) != _list_kind(b.marker):
+                yield run[0], run[-1]
+                run = []
+        run.append(b)
+    if run:
+        yield run[0], run[-1]
+
+
+def check_md032(doc, params):
+    top = _frontmatter_end(doc)
+    n = len(doc.lines)
+    for first, last in _lists(doc):
+        if first.start > top and not _is_blank(doc, first.start - 1):
+            yield _finding(first.start + 1, 'MD032', context=doc.lines[first.start].strip(), fix={'insertText': '\n'})
+        if last.end < n and not _is_blank(doc, last.end):
+            yield _finding(last.end, 'MD032', context=doc.lines[last.end - 1].strip(),
+                           fix={'lineNumber': last.end + 1, 'insertText': '\n'})
+
+
+def _mask(line):
+    """line with code spans, links, autolinks and HTML tags blanked out (same length)."""
+    if LINK_DEF_RE.match(line):
+        return ' ' * len(line)
+    blank = lambda m: ' ' * len(m.group())  # noqa: E731
+    if '`' in line:
+        line = CODE_SPAN_RE.sub(blank, line)
+    if '[' in line:
+        line = LINK_RE.sub(blank, line)
+    if '<' in line:
+        line = TAG_RE.sub(blank, line)
+    return line
+
+
+def _trim_url(url):
+    while url and (url[-1] in URL_TRAILING or (url[-1] == ')' and url.count(')') > url.count('('))):
+        url = url[:-1]
+    return url
+
+
+def bare_urls(line):
+    """(column, text) of every bare URL and email address in one line of prose; columns 1-based."""
+    if '://' not in line and '@' not in line:
+        return []
+    masked = _mask(line)
+    found = []
+    for m in URL_RE.finditer(masked):
+        url = _trim_url(m.group())
+        found.append((m.start() + 1, url))
+        masked = masked[:m.start()] + ' ' * len(m.group()) + masked[m.end():]
+    for m in EMAIL_RE.finditer(masked):
+        found.append((m.start() + 1, m.group()))
+    return sorted(found)
+
+
+def check_md034(doc, params):
+    for b in _outside_admonitions(doc, doc.iter('paragraph', 'heading', 'list_item', 'quote')):
+        end = b.head_end if b.kind == 'list_item' else b.end
+        for k in range(b.start, end):
+            for col, url in bare_urls(doc.lines[k]):
+                yield _finding(k + 1, 'MD034', context=url, column=col, length=len(url),
+                               fix={'editColumn': col, 'deleteCount': len(url), 'insertText': f"<{url}>"})
+
+
+def check_md040(doc, params):
+    allowed = params.get('allowed_languages') or []
+    for b in _outside_admonitions(doc, doc.iter('fence')):
+        context = doc.lines[b.start].strip()
+        lang = b.info.split()[0] if b.info else ''
+        if not lang:
+            yield _finding(b.start + 1, 'MD040', context=context)
+        elif allowed and lang not in allowed:
+            yield _finding(b.start + 1, 'MD040', f"Language not allowed: {lang}", context)
+
+
+# id -> (alias, description, check)
+RULES = {
+    'MD012': ('no-multiple-blanks', 'Multiple consecutive blank lines', check_md012),
+    'MD022': ('blanks-around-headings', 'Headings should be surrounded by blank lines', check_md022),
+    'MD026': ('no-trailing-punctuation', 'Trailing punctuation in heading', check_md026),
+    'MD031': ('blanks-around-fences', 'Fenced code blocks should be surrounded by blank lines', check_md031),
+    'MD032': ('blanks-around-lists', 'Lists should be surrounded by blank lines', check_md032),
+    'MD034': ('no-bare-urls', 'Bare URL used', check_md034),
+    'MD040': ('fenced-code-language', 'Fenced code blocks should have a language specified', check_md040),
+}
+
+
+def load_config(path):
+    """{rule id: parameters} for the enabled rules, read from a .markdownlint.json file (all
+    rules with their defaults if path is None or missing)."""
+    config = {}
+    if path is not None:
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                config = json.load(fh)
+        except FileNotFoundError:
+            pass
+    enabled = {}
+    default = config.get('default', True)
+    for rule, (alias, _desc, _check) in RULES.items():
+        value = config.get(rule, config.get(alias, default))
+        if value is False or value is None:
+            continue
+        enabled[rule] = value if isinstance(value, dict) else {}
+    return enabled
+
+
+def lint_text(text, config):
+    """Findings for one file's text, sorted by line: dicts in markdownlint's --json shape,
+    without fileName."""
+    doc = mdblocks.parse(text)
+    out = []
+    for rule, params in config.items():
+        alias, desc, check = RULES[rule]
+        for f in check(doc, params):
+            out.append({'lineNumber': f['lineNumber'], 'ruleNames': [rule, alias], 'ruleDescription': desc,
+                        'ruleInformation': INFO_URL.format(rule.lower()), 'errorDetail': f['errorDetail'],
+                        'errorContext': f['errorContext'], 'errorRange': f['errorRange'], 'fixInfo': f['fixInfo']})
+    out.sort(key=lambda f: (f['lineNumber'], f['ruleNames'][0]))
+    return out
+
+
+def lint_files(paths, config):
+    """{path: findings} for every file with findings, in path order."""
+    results = {}
+    for path in paths:
+        findings = lint_text(atomicio.read_text(path), config)
+        if findings:
+            for f in findings:
+                f['fileName'] = path
+            results[path] = findings
+    return results
+
+
+def format_finding(f):
+    """One finding as markdownlint-cli prints it."""
+    where = f"{f['fileName']}:{f['lineNumber']}"
+    if f['errorRange']:
+        where += f":{f['errorRange'][0]}"
+    text = f"{where} {'/'.join(f['ruleNames'])} {f['ruleDescription']}"
+    if f['errorDetail']:
+        text += f" [{f['errorDetail']}]"
+    if f['errorContext']:
+        text += f" [Context: \"{f['errorContext']}\"]"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check Markdown for the markdownlint rules the fixers handle')
+    parser.add_argument('paths', nargs='+', help='Markdown files or directories')
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help=f"markdownlint config (default: {DEFAULT_CONFIG})")
+    parser.add_argument('--json', action='store_true', help="Print findings as markdownlint --json does")
+    parser.add_argument('--output', metavar='FILE', help='With --json, write the findings to FILE')
+    parser.add_argument('--fix', action='store_true', help='Apply the fixable findings instead of reporting them')
+    gitselect.add_git_args(parser)
+    args = parser.parse_args()
+    config = load_config(args.config)
+    paths = mdwalk.iter_markdown_files(args.paths, selection=gitselect.from_args(args, args.paths))
+    results = lint_files(paths, config)
+    if args.fix:
+        changed = lintplan.apply_findings(results)
+        lintplan.print_summary(changed)
+        remaining = lint_files(sorted(results), config)
+        for findings in remaining.values():
+            for f in findings:
+                print(format_finding(f))
+        sys.exit(1 if remaining else 0)
+    findings = [f for fs in results.values() for f in fs]
+    if args.json:
+        data = json.dumps(findings, indent=2) + '\n'
+        if args.output:
+            atomicio.write_text(args.output, data)
+        else:
+            sys.stdout.write(data)
+    else:
+        for f in findings:
+            print(format_finding(f))
+    sys.exit(1 if findings else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""File selection and (optionally parallel) per-file processing shared by the docs walkers.
+
+process_files() runs a pure text transform over many files, fanning them out over a
+multiprocessing pool when jobs > 1. Results always come back in sorted path order and per-file
+errors are returned with the results instead of being printed from the workers, so the
+"Formatted:" / "Changed files:" reports are identical for any --jobs value.
+
+A transform takes the file text and returns (new_text, detail); detail is passed back to the
+caller untouched (e.g. the list of rules that fired). Transforms must be module-level functions
+(or functools.partial of one) so they can be pickled for the pool.
+
+In CHECK and DIFF mode (the fixers' --check/--diff options) nothing is written: changed files are
+only reported, with a unified diff built per changed file in DIFF mode, and under --check the
+fixer exits with status 1 if any file would change, so CI can gate on it without a write step.
+"""
+
+import difflib
+import functools
+import multiprocessing
+import os
+import sys
+from collections import namedtuple
+
+import atomicio
+import fixcache
+import runprofile
+
+# changed: file rewritten (or would be, in check/diff mode); detail: transform's detail;
+# error: message or None; clean_digest: digest of content the transform left unchanged (for the
+# fixed-point cache); diff: unified diff of the pending change in diff mode, else None;
+# profile: the file's timings under --profile (see runprofile.py), else None
+FileResult = namedtuple('FileResult', 'path changed detail error clean_digest diff profile', defaults=(None,))
+
+# what to do with a changed file: rewrite it, only report it, or report it with a unified diff
+WRITE, CHECK, DIFF = 'write', 'check', 'diff'
+
+
+def iter_markdown_files(roots, skip_hidden=True, selection=None):
+    """Yield .md files under the given files/directories in sorted order. Hidden directories such
+    as .indent_fix_backups and .link_check_backups are skipped unless skip_hidden is False.
+    With a gitselect.GitSelection (--changed-since/--staged) only its changed files are yielded
+    and the trees are not walked at all."""
+    if selection is not None:
+        yield from selection.files_under(roots, skip_hidden=skip_hidden)
+        return
+    for root in roots:
+        if os.path.isfile(root):
+            yield root
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not (skip_hidden and d.startswith('.')))
+            for f in sorted(filenames):
+                if f.endswith('.md'):
+                    yield os.path.join(dirpath, f)
+
+
+def unified_diff(path, before, after):
+    """Unified diff between two versions of path's text, as one string that patch -p1 accepts."""
+    out = []
+    for line in difflib.unified_diff(before.splitlines(True), after.splitlines(True),
+                                     fromfile=f"a/{path}", tofile=f"b/{path}"):
+        out.append(line)
+        if not line.endswith('\n'):
+            out.append('\n\\ No newline at end of file\n')
+    return ''.join(out)
+
+
+def _run_task(task):
+    path, transform, clean, mode = task
+    try:
+        original = atomicio.read_text(path)
+        digest = fixcache.digest(original)
+        if digest in clean:
+            return FileResult(path, False, None, None, digest, None)
+        final, detail = transform(original)
+        if final == original:
+            return FileResult(path, False, detail, None, digest, None)
+        if mode == WRITE:
+            atomicio.write_text(path, final, original=original)
+        # the diff is only built for files that change, so a clean run never pays for it
+        diff = unified_diff(path, original, final) if mode == DIFF else None
+        return FileResult(path, True, detail, None, None, diff)
+    except Exception as e:
+        return FileResult(path, False, None, str(e), None, None)
+
+
+def _run_path_task(task):
+    path, rewrite, mode = task
+    try:
+        changed, detail, diff = rewrite(path, mode)
+        return FileResult(path, changed, detail, None, None if changed else fixcache.file_digest(path), diff)
+    except Exception as e:
+        return FileResult(path, False, None, str(e), None, None)
+
+
+def _profiled_task(func, task):
+    # every task tuple starts with the path and ends with the mode
+    result, profile = runprofile.profile_call(func, task[0], task)
+    profile['bytes_written'] = runprofile.file_size(task[0]) if result.changed and task[-1] == WRITE else 0
+    return result._replace(profile=profile)
+
+
+def _imap(func, tasks, jobs):
+    if runprofile.active():
+        func = functools.partial(_profiled_task, func)
+    if jobs > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+            # imap() keeps input order, so results stay in sorted path order
+            yield from pool.imap(func, tasks, chunksize=max(1, len(tasks) // (jobs * 4)))
+    else:
+        yield from map(func, tasks)
+
+
+def iter_process_files(paths, transform, jobs=1, cache=None, mode=WRITE):
+    """Apply transform to every path (read once, write only on change) and yield FileResults in
+    sorted path order as they complete. Files the cache already knows to be clean are skipped
+    without being read. In CHECK and DIFF mode nothing is written."""
+    paths = sorted(paths)
+    todo = [p for p in paths if cache is None or not cache.is_clean(p)]
+    clean = frozenset(cache.clean_digests) if cache is not None else frozenset()
+    results = []
+    for r in _imap(_run_task, [(p, transform, clean, mode) for p in todo], jobs):
+        runprofile.record(r)
+        results.append(r)
+        yield r
+    _record_clean(results, cache)
+
+
+def process_files(paths, transform, jobs=1, cache=None, mode=WRITE):
+    """iter_process_files() collected into a list."""
+    return list(iter_process_files(paths, transform, jobs, cache, mode))
+
+
+def iter_process_paths(paths, rewrite, jobs=1, cache=None, mode=WRITE):
+    """Like iter_process_files, for rewriters that work on the file itself instead of its text
+    (e.g. streaming ones that never load a whole file): rewrite(path, mode) returns
+    (changed, detail, diff)."""
+    paths = sorted(paths)
+    todo = [p for p in paths if cache is None or not cache.is_clean(p)]
+    results = []
+    for r in _imap(_run_path_task, [(p, rewrite, mode) for p in todo], jobs):
+        runprofile.record(r)
+        results.append(r)
+        yield r
+    _record_clean(results, cache)
+
+
+def _record_clean(results, cache):
+    if cache is not None:
+        for r in results:
+            if r.clean_digest:
+                cache.mark_clean_digest(r.path, r.clean_digest)
+        cache.save()
+
+
+def add_mode_args(parser):
+    """Add the common --check/--diff options to a fixer's argument parser."""
+    parser.add_argument('--check', action='store_true',
+                        help='Write nothing; exit with status 1 if any file would change')
+    parser.add_argument('--diff', action='store_true',
+                        help='Write nothing; print a unified diff for every file that would change')
+
+
+def mode_from_args(args):
+    return DIFF if args.diff else CHECK if args.check else WRITE
+
+
+def report_pending(result, mode):
+    """Report a change that was not written: its diff in DIFF mode, its path in CHECK mode."""
+    if mode == DIFF:
+        sys.stdout.write(result.diff)
+        sys.stdout.flush()
+    else:
+        print(f"Would change: {result.path}")
+
+
+def exit_status(args, changed):
+    """Exit status for a fixer run: 1 under --check when any file would change, else 0."""
+    return 1 if args.check and changed else 0
+
+
+def report_errors(results, label):
+    """Print collected per-file errors after the main report, in path order."""
+    for r in results:
+        if r.error:
+            print(f"Error {label} {r.path}: {r.error}")
+
+
+def jobs_arg(value):
+    """argparse type for --jobs: a positive integer, or 0 for one job per CPU."""
+    n = int(value)
+    if n < 0:
+        raise ValueError(value)
+    return n or os.cpu_count() or 1
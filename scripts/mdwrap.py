@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Wrap Markdown paragraphs without breaking inline constructs.
+
+textwrap.fill() sees a paragraph as plain words. It breaks after any hyphen, splits words longer
+than the width (URLs, paths), and may put a line break inside a code span (`a b`), a link's text
+or an image's alt text. fill() here splits the text into tokens instead: runs of non-space
+characters, where a code span, a link or image ([text](url), [text][ref], ![alt](src)) or an
+autolink is always one token. Lines are then filled greedily, exactly like textwrap, but only
+between tokens. A token longer than the width gets a line of its own and is never split.
+
+fill_lines() wraps the lines of one paragraph: it keeps the first line's indentation (list item
+continuations, admonition bodies) on every output line. A line ending in a hard break (a backslash,
+or two or more spaces) ends a wrapped segment, so the break stays at the end of a line.
+
+Results are memoized by paragraph text (functools.lru_cache), so a paragraph that occurs in many
+places, or on every page (footers, notices), is wrapped once per run. Across runs, files that are
+already formatted are skipped by the fixed-point cache (see fixcache.py) and never reach the
+wrapper.
+
+Usage:
+    mdwrap.fill('Run `pscheduler task --help` for [the task options](pscheduler.md).', width=40)
+"""
+
+import functools
+import re
+
+WIDTH = 120
+# a hard line break at the end of a line
+HARD_BREAK_RE = re.compile(r"(\\| {2,})$")
+# where a token may need more than a scan for the next space: code spans and links/images
+_SPECIAL_RE = re.compile(r"[ \t\n]+|`+|!?\[")
+_BACKTICKS_RE = re.compile(r"`+")
+_WORD_RE = re.compile(r"([ \t\n]*)([^ \t\n]+)")
+
+
+def _code_span_end(text, pos, ticks):
+    """End of the code span whose opening run of ticks backticks ends at pos, or None."""
+    for m in _BACKTICKS_RE.finditer(text, pos):
+        if len(m.group()) == ticks:
+            return m.end()
+    return None
+
+
+def _bracket_end(text, pos, open_ch, close_ch):
+    """Position after the close_ch matching an open_ch just before pos, or None. Backslash
+    escapes are skipped and nested pairs are balanced."""
+    depth = 1
+    i, n = pos, len(text)
+    while i < n:
+        c = text[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == open_ch:
+            depth += 1
+        elif c == close_ch:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+
+def _link_end(text, pos):
+    """End of the link or image whose '[' ends at pos: [text](url), [text][ref] or [text]."""
+    end = _bracket_end(text, pos, '[', ']')
+    if end is None:
+        return None
+    if end < len(text) and text[end] == '(':
+        return _bracket_end(text, end + 1, '(', ')')
+    if end < len(text) and text[end] == '[':
+        return _bracket_end(text, end + 1, '[', ']')
+    return end
+
+
+def tokens(text):
+    """Split text into (separator, token) pairs; separator is the whitespace before the token."""
+    if '`' not in text and '[' not in text:
+        # no code spans or links: tokens are plain words
+        return _WORD_RE.findall(text)
+    out = []
+    sep, cur = '', []
+    i, n = 0, len(text)
+    while i < n:
+        m = _SPECIAL_RE.search(text, i)
+        if m is None:
+            cur.append(text[i:])
+            break
+        if m.start() > i:
+            cur.append(text[i:m.start()])
+        mark = m.group()
+        if mark[0] in ' \t\n':
+            if cur:
+                out.append((sep, ''.join(cur)))
+                cur = []
+            sep = mark
+            i = m.end()
+            continue
+        if mark[0] == '`':
+            end = _code_span_end(text, m.end(), len(mark))
+        else:
+            end = _link_end(text, m.end())
+        if end is None:
+            # an unmatched backtick run or bracket is ordinary text
+            cur.append(mark)
+            i = m.end()
+        else:
+            cur.append(text[m.start():end])
+            i = end
+    if cur:
+        out.append((sep, ''.join(cur)))
+    return out
+
+
+@functools.lru_cache(maxsize=4096)
+def fill(text, width=WIDTH, indent=''):
+    """Wrap one paragraph's text to width (indent included); return the lines joined by '\\n'."""
+    lines = []
+    line, length = [], 0
+    room = width - len(indent)
+    for sep, tok in tokens(text.expandtabs()):
+        if line and length + len(sep) + len(tok) <= room:
+            line += (sep, tok)
+            length += len(sep) + len(tok)
+            continue
+        if line:
+            lines.append(indent + ''.join(line))
+        line, length = [tok], len(tok)
+    if line:
+        lines.append(indent + ''.join(line))
+    return '\n'.join(lines)
+
+
+def fill_lines(lines, width=WIDTH):
+    """Wrap the lines of one paragraph; return the new lines. Every line gets the first line's
+    indentation, and lines ending in a hard break keep it at the end of an output line."""
+    first = lines[0]
+    indent = first[:len(first) - len(first.lstrip())]
+    out = []
+    segment = []
+    for ln in lines:
+        brk = HARD_BREAK_RE.search(ln)
+        segment.append(ln.strip())
+        if brk:
+            out.extend(fill(' '.join(segment), width, indent).split('\n'))
+            if brk.group(1) != '\\':
+                out[-1] += '  '
+            segment = []
+    if segment:
+        out.extend(fill(' '.join(segment), width, indent).split('\n'))
+    return out
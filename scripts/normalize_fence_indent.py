@@ -11,10 +11,13 @@ import os
 import re
 from pathlib import Path
 
+import atomicio
+
 
 def process_file(path: Path):
     changed = False
-    lines = path.read_text(encoding='utf-8').splitlines()
+    text = atomicio.read_text(path)
+    lines = text.splitlines()
     out = []
     fence_re = re.compile(r'^(\s*)(`{3,}|~{3,})(.*)$')
     stack = []  # list of (indent, fence)
@@ -44,7 +47,7 @@ def process_file(path: Path):
         else:
             out.append(line)
     if changed:
-        path.write_text('\n'.join(out) + '\n', encoding='utf-8')
+        atomicio.write_text(path, '\n'.join(out) + '\n', original=text)
         print('Normalized fence indentation in', path)
     return changed
 
@@ -8,14 +8,15 @@ import sys
 import re
 from pathlib import Path
 
+import atomicio
+
 
 def process(path: Path):
-    s = path.read_text()
+    s = atomicio.read_text(path)
     # replace '-   ' and '*   ' and '+   ' and '1.   ' with single space
     s2 = re.sub(r"^([ \t]*[-*+])([ \t]{2,})", r"\1 ", s, flags=re.M)
     s2 = re.sub(r"^([ \t]*\d+\.)[ \t]{2,}", r"\1 ", s2, flags=re.M)
-    if s2 != s:
-        path.write_text(s2)
+    if atomicio.write_text(path, s2, original=s):
         print('Normalized list spacing in', path)
         return True
     return False
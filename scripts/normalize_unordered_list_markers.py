@@ -4,241 +4,56 @@
 This script replaces '-' with '*' for unordered list items, skipping code fences and front matter.
 """
 
-import re
+import argparse
 import sys
-import os
-from pathlib import Path
 
-UNORDERED_RE = re.compile(r"^([ \t]*)-\s+(.*)$")
-
-
-def process_file(p: Path):
-    s = p.read_text()
-    lines = s.splitlines()
-    out = []
-    in_fence = False
-    fm_open = False
-    changed = False
-    for i, line in enumerate(lines):
-        # Handle frontmatter YAML block
-        if i == 0 and line.strip() == '---':
-            fm_open = True
-            out.append(line)
-            continue
-        if fm_open:
-            out.append(line)
-            if line.strip() == '---':
-                fm_open = False
-            continue
-        # detect fence toggles
-        if re.match(r"^\s*(`{3,}|~{3,})", line):
-            in_fence = not in_fence
-            out.append(line)
-            continue
-        if in_fence:
-            out.append(line)
-            continue
-        # replace unordered '-' list markers with '*'
-        m = UNORDERED_RE.match(line)
-        if m:
-            indent, rest = m.groups()
-            new_line = f"{indent}* {rest}"
-            if new_line != line:
-                changed = True
-            out.append(new_line)
-        else:
-            out.append(line)
-    final = '\n'.join(out) + '\n'
-    if final != s:
-        p.write_text(final)
-        print('Patched', p)
-        return True
-    return False
-
-
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: normalize_unordered_list_markers.py <dir>')
-        sys.exit(1)
-    changed = False
-    for r in sys.argv[1:]:
-        for dirpath, _, filenames in os.walk(r):
-            for f in filenames:
-                if f.endswith('.md'):
-                    p = Path(os.path.join(dirpath, f))
-                    try:
-                        if process_file(p):
-                            changed = True
-                    except Exception as e:
-                        print(f"Error processing {p}: {e}")
-    if not changed:
-        print('No changes')
-        sys.exit(0)
-    sys.exit(0)
-
-#!/usr/bin/env python3
-"""Normalize unordered list markers to asterisks (*) instead of dashes (-).
-
-This script replaces '-' with '*' for unordered list items, skipping code fences and front matter.
-"""
-
-import re
-import sys
-import os
-from pathlib import Path
-
-UNORDERED_RE = re.compile(r"^([ \t]*)-\s+(.*)$")
-
-
-def process_file(p: Path):
-    s = p.read_text()
-    lines = s.splitlines()
-    out = []
-    in_fence = False
-    fm_open = False
-    changed = False
-    for i, line in enumerate(lines):
-        # Handle frontmatter YAML block
-        if i == 0 and line.strip() == '---':
-            fm_open = True
-            out.append(line)
-            continue
-        if fm_open:
-            out.append(line)
-            if line.strip() == '---':
-                fm_open = False
-            continue
-        # detect fence toggles
-        if re.match(r"^\s*(`{3,}|~{3,})", line):
-            in_fence = not in_fence
-            out.append(line)
-            continue
-        if in_fence:
-            out.append(line)
-            continue
-        # replace unordered '-' list markers with '*'
-        m = UNORDERED_RE.match(line)
-        if m:
-            indent, rest = m.groups()
-            new_line = f"{indent}* {rest}"
-            if new_line != line:
-                changed = True
-            out.append(new_line)
-        else:
-            out.append(line)
-    final = '\n'.join(out) + '\n'
-    if final != s:
-        p.write_text(final)
-        print('Patched', p)
-        return True
-    return False
-
-
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: normalize_unordered_list_markers.py <dir>')
-        sys.exit(1)
-    changed = False
-    for r in sys.argv[1:]:
-        for dirpath, _, filenames in os.walk(r):
-            for f in filenames:
-                if f.endswith('.md'):
-                    p = Path(os.path.join(dirpath, f))
-                    try:
-                        if process_file(p):
-                            changed = True
-                    except Exception as e:
-                        print(f"Error processing {p}: {e}")
+import gitselect
+import mdblocks
+import mdwalk
+import runprofile
+
+
+def normalize_text(s):
+    doc = mdblocks.parse(s)
+    out = list(doc.lines)
+    for b in doc.iter('list_item'):
+        if b.marker == '-':
+            line = out[b.start]
+            out[b.start] = f"{line[:b.indent]}* {b.info}"
+    return doc.render(out)
+
+
+def _normalize_transform(text):
+    return normalize_text(text), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Normalize unordered list markers to asterisks')
+    parser.add_argument('roots', nargs='+', help='Directories to process, e.g. docs')
+    mdwalk.add_mode_args(parser)
+    gitselect.add_git_args(parser)
+    runprofile.add_profile_args(parser, 'normalize_unordered_list_markers')
+    args = parser.parse_args()
+    mode = mdwalk.mode_from_args(args)
+    runprofile.start(args, 'normalize_unordered_list_markers',
+                     [(sys.modules[__name__], ('normalize_text',), 'normalize_unordered_list_markers.'),
+                      (mdblocks, mdblocks.PROFILED, 'mdblocks.')])
+    paths = mdwalk.iter_markdown_files(args.roots, skip_hidden=False, selection=gitselect.from_args(args, args.roots))
+    changed = []
+    for r in mdwalk.iter_process_files(paths, _normalize_transform, mode=mode):
+        if r.error:
+            print(f"Error processing {r.path}: {r.error}")
+        elif r.changed:
+            changed.append(r.path)
+            if mode == mdwalk.WRITE:
+                print('Patched', r.path)
+            else:
+                mdwalk.report_pending(r, mode)
     if not changed:
         print('No changes')
-        sys.exit(0)
-    sys.exit(0)
-
-#!/usr/bin/env python3
-"""Normalize unordered list markers to asterisks (*) instead of dashes (-).
-
-This script replaces '-' with '*' for unordered list items, skipping code fences and front matter.
-"""
-
-import re
-import sys
-import os
-from pathlib import Path
-
-UNORDERED_RE = re.compile(r"^([ \t]*)-\s+(.*)$")
-
-
-def process_file(p: Path):
-    s = p.read_text()
-    lines = s.splitlines()
-    out = []
-    in_fence = False
-    fm_open = False
-    changed = False
-    for i, line in enumerate(lines):
-        # Handle frontmatter YAML block
-        if i == 0 and line.strip() == '---':
-            fm_open = True
-            out.append(line)
-            continue
-        if fm_open:
-            out.append(line)
-            if line.strip() == '---':
-                fm_open = False
-            continue
-        # detect fence toggles
-        if re.match(r"^\s*(`{3,}|~{3,})", line):
-            in_fence = not in_fence
-            out.append(line)
-            continue
-        if in_fence:
-            out.append(line)
-            continue
-        # replace unordered '-' list markers with '*'
-        m = UNORDERED_RE.match(line)
-        if m:
-            indent, rest = m.groups()
-            new_line = f"{indent}* {rest}"
-            if new_line != line:
-                changed = True
-            out.append(new_line)
-        else:
-            out.append(line)
-    final = '\n'.join(out) + '\n'
-    if final != s:
-        p.write_text(final)
-        print('Patched', p)
-        return True
-    return False
+    runprofile.finish(args)
+    sys.exit(mdwalk.exit_status(args, changed))
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: normalize_unordered_list_markers.py <dir>')
-        sys.exit(1)
-    changed = False
-    for r in sys.argv[1:]:
-        for dirpath, _, filenames in os.walk(r):
-            for f in filenames:
-                if f.endswith('.md'):
-                    p = Path(os.path.join(dirpath, f))
-                    try:
-                        if process_file(p):
-                            changed = True
-                    except Exception as e:
-                        print(f"Error processing {p}: {e}")
-    if not changed:
-        print('No changes')
-        sys.exit(0)
-    sys.exit(0)
-#!/usr/bin/env python3
-"""Normalize unordered list markers to asterisks (*) instead of dashes (-).
-
-This script replaces '-' with '*' for unordered list items, skipping code fences and front matter.
-"""
-
-import re
-import sys
-from pathlib import Path
-
-UNORDERED_RE = re.compile(r"^(	|\s*)-\s+(\
\ No newline at end of file
+    main()
@@ -0,0 +1,13 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Git pre-commit hook: run the docs fixers and the link checker on the staged docs only.
+# Read-only: prints what would change and refuses the commit until it is fixed.
+# Install from the repo root with:
+#   ln -s ../../scripts/pre-commit.sh .git/hooks/pre-commit
+cd "$(git rev-parse --show-toplevel)"
+
+python3 scripts/docsfix.py docs --staged --check --diff || {
+    echo "Run: python3 scripts/docsfix.py docs --staged (then git add the fixed files)" >&2; exit 1; }
+python3 docs/tools/find_and_remove_broken_links.py --staged --check || {
+    echo "Fix the broken links above before committing" >&2; exit 1; }
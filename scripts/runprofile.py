@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Per-rule and per-file profiling for the docs tools (--profile), with a JSON run report.
+
+A tool calls start() after parsing its arguments and finish() before exiting. With --profile,
+start() wraps the tool's transforms (docsfix rules, format_markdown's paragraph wrapping, URL
+wrapping and fence-language passes, the link checks, ...) in timers that record calls, total time
+and self time (total minus the time of timed calls nested inside). Generator stages are timed
+per item pulled, so a streaming pipeline is attributed stage by stage.
+
+mdwalk attaches to every FileResult the file's wall time, bytes read and written, and the rule
+timings spent on it. This also works when a worker process handled the file (--jobs), because
+the workers fork after the timers are installed. Tools with their own file loop use
+file_timer(). finish() writes the run report:
+
+    {"tool", "argv", "wall_seconds",
+     "files": {"scanned", "changed", "errors", "cache_hits", "cache_misses"},
+     "bytes": {"read", "written"},
+     "rules": {name: {"calls", "seconds", "self_seconds"}},   # by self time, slowest first
+     "slowest_files": [{"path", "seconds", "bytes", "changed"}, ...],
+     "pstats": file or null}
+
+--pstats FILE additionally runs cProfile over the main process and dumps it for pstats/snakeviz.
+Without --profile nothing is wrapped and the tools run exactly as before.
+"""
+
+import collections
+import contextlib
+import cProfile
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+
+import atomicio
+
+# process-local timings: name -> [calls, seconds, self seconds]
+STATS = collections.defaultdict(lambda: [0, 0.0, 0.0])
+# child time of the timed calls currently running, innermost last
+_stack = []
+# the RunReport of this process while --profile is active, and the --pstats profiler
+_report = None
+_profiler = None
+
+
+def _timed_call(name, count, call):
+    _stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return call()
+    finally:
+        elapsed = time.perf_counter() - start
+        child = _stack.pop()
+        if _stack:
+            _stack[-1] += elapsed
+        stats = STATS[name]
+        stats[0] += count
+        stats[1] += elapsed
+        stats[2] += elapsed - child
+
+
+def timed(name, func):
+    """Wrap func so its calls are recorded under name; generator functions are timed per item."""
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def gen_wrapper(*args, **kwargs):
+            it = func(*args, **kwargs)
+            first = 1
+            while True:
+                try:
+                    item = _timed_call(name, first, functools.partial(next, it))
+                except StopIteration:
+                    return
+                first = 0
+                yield item
+        return gen_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return _timed_call(name, 1, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+
+def instrument(target, names, prefix=''):
+    """Replace each named function of a module (or entry of a dict of callables) with a timed
+    wrapper, recorded as prefix + name. Calls resolved through the module's globals pick the
+    wrapper up, so internal helpers can be timed without touching their callers."""
+    for name in names:
+        if isinstance(target, dict):
+            target[name] = timed(prefix + name, target[name])
+        else:
+            setattr(target, name, timed(prefix + name, getattr(target, name)))
+
+
+def active():
+    return _report is not None
+
+
+def snapshot():
+    return {name: list(s) for name, s in STATS.items()}
+
+
+def since(before):
+    """Timings recorded since snapshot() returned before, as name -> [calls, seconds, self]."""
+    delta = {}
+    for name, s in STATS.items():
+        b = before.get(name, (0, 0.0, 0.0))
+        if s[0] != b[0] or s[1] != b[1]:
+            delta[name] = [s[0] - b[0], s[1] - b[1], s[2] - b[2]]
+    return delta
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def profile_call(func, path, *args):
+    """Run func(*args) for one file; return (result, profile dict without bytes_written)."""
+    before = snapshot()
+    size = file_size(path)
+    start = time.perf_counter()
+    result = func(*args)
+    return result, {'seconds': time.perf_counter() - start, 'bytes_read': size, 'rules': since(before)}
+
+
+class RunReport:
+    def __init__(self, tool, top):
+        self.tool = tool
+        self.top = top
+        self.start = time.perf_counter()
+        self.files = []
+        self.rules = collections.defaultdict(lambda: [0, 0.0, 0.0])
+        self.errors = 0
+
+    def add(self, path, profile, changed, error=False):
+        self.files.append({'path': str(path), 'seconds': profile['seconds'], 'bytes': profile['bytes_read'],
+                           'changed': bool(changed), 'written': profile['bytes_written']})
+        self.errors += bool(error)
+        for name, s in profile['rules'].items():
+            total = self.rules[name]
+            for i in range(3):
+                total[i] += s[i]
+
+    def to_json(self, cache=None, pstats_path=None):
+        rules = sorted(self.rules.items(), key=lambda kv: -kv[1][2])
+        slowest = sorted(self.files, key=lambda f: -f['seconds'])[:self.top]
+        return {
+            'tool': self.tool,
+            'argv': sys.argv[1:],
+            'wall_seconds': round(time.perf_counter() - self.start, 4),
+            'files': {
+                'scanned': len(self.files),
+                'changed': sum(f['changed'] for f in self.files),
+                'errors': self.errors,
+                'cache_hits': cache.hits if cache is not None else None,
+                'cache_misses': cache.misses if cache is not None else None,
+            },
+            'bytes': {'read': sum(f['bytes'] for f in self.files), 'written': sum(f['written'] for f in self.files)},
+            'rules': {name: {'calls': s[0], 'seconds': round(s[1], 6), 'self_seconds': round(s[2], 6)}
+                      for name, s in rules},
+            'slowest_files': [{'path': f['path'], 'seconds': round(f['seconds'], 6), 'bytes': f['bytes'],
+                               'changed': f['changed']} for f in slowest],
+            'pstats': pstats_path,
+        }
+
+
+def record(result):
+    """Add an mdwalk FileResult (with its profile) to the run report, if profiling."""
+    if _report is not None and result.profile is not None:
+        _report.add(result.path, result.profile, result.changed, bool(result.error))
+
+
+@contextlib.contextmanager
+def file_timer(path):
+    """Time one file in a tool's own loop; set entry['changed'] = True if it was rewritten."""
+    if _report is None:
+        yield {}
+        return
+    before = snapshot()
+    size = file_size(path)
+    start = time.perf_counter()
+    entry = {'changed': False}
+    try:
+        yield entry
+    finally:
+        profile = {'seconds': time.perf_counter() - start, 'bytes_read': size, 'rules': since(before),
+                   'bytes_written': file_size(path) if entry['changed'] else 0}
+        _report.add(path, profile, entry['changed'])
+
+
+def add_profile_args(parser, tool):
+    """Add --profile [REPORT], --pstats FILE and --profile-top N to a tool's argument parser."""
+    default = os.path.join('.cache', f'{tool}-profile.json')
+    parser.add_argument('--profile', nargs='?', const=default, metavar='REPORT',
+                        help=f"Time every rule and file and write a JSON run report (default: {default})")
+    parser.add_argument('--pstats', metavar='FILE',
+                        help='With --profile, also dump a cProfile of the main process to FILE')
+    parser.add_argument('--profile-top', type=int, default=10, metavar='N',
+                        help='Slowest files listed in the run report (default: 10)')
+
+
+def start(args, tool, targets=()):
+    """Begin profiling if --profile was given; targets are (module or dict, names, prefix)."""
+    global _report, _profiler
+    if not args.profile:
+        return
+    for target, names, prefix in targets:
+        instrument(target, names, prefix)
+    _report = RunReport(tool, args.profile_top)
+    if args.pstats:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def finish(args, cache=None):
+    """Write the run report (and pstats dump) and print a short summary to stderr."""
+    if _report is None:
+        return
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(args.pstats)
+    data = _report.to_json(cache, args.pstats)
+    if os.path.dirname(args.profile):
+        os.makedirs(os.path.dirname(args.profile), exist_ok=True)
+    atomicio.write_text(args.profile, json.dumps(data, indent=2) + '\n')
+    # stderr, so --diff output on stdout still applies with patch
+    err = sys.stderr
+    files = data['files']
+    print(f"Profile: {files['scanned']} files scanned, {files['changed']} changed, "
+          f"{data['bytes']['read']} bytes read, {data['bytes']['written']} written in {data['wall_seconds']:.2f}s",
+          file=err)
+    for name, s in list(data['rules'].items())[:10]:
+        print(f"  {name:<45} {s['calls']:>8} calls {s['self_seconds']:>9.3f}s self {s['seconds']:>9.3f}s total",
+              file=err)
+    for f in data['slowest_files'][:5]:
+        print(f"  slow: {f['path']} ({f['seconds']:.3f}s, {f['bytes']} bytes)", file=err)
+    print(f"Wrote run report: {args.profile}", file=err)
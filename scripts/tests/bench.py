@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Benchmark the docs fixers on a seeded synthetic corpus (see gen_corpus.py).
+
+Each fixer runs as its own process, through its normal command line, on a fresh copy of the corpus
+(so every run does the same work), --repeat times. For each fixer the best wall time is reported
+as files/s and MB/s, together with the peak RSS of the fixer process (from wait4()).
+
+The results are compared against a stored baseline JSON (default scripts/tests/bench_baseline.json).
+A fixer regresses when its files/s drops, or its peak RSS grows, by more than the tolerance
+(default 40%); any regression makes the run exit with status 1. The baseline also records the
+corpus options, so the same corpus is regenerated for every comparison. Timings depend on the
+machine: record a baseline with --update-baseline on the machine that runs the comparison.
+
+Usage:
+  python3 scripts/tests/bench.py                        # compare against the stored baseline
+  python3 scripts/tests/bench.py --update-baseline      # record a new baseline
+  python3 scripts/tests/bench.py --pages 200 --only format_markdown,link_scanner --no-baseline
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import gen_corpus
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SCRIPTS = os.path.join(ROOT_DIR, 'scripts')
+DEFAULT_BASELINE = os.path.join(SCRIPTS, 'tests', 'bench_baseline.json')
+DEFAULT_CORPUS = {'pages': 500, 'seed': 1, 'scale': 1.0}
+DEFAULT_TOLERANCE = 0.4
+
+# the link scanner has no option to scan another tree than docs/, so drive scan_docs() directly
+LINK_SCAN = ("import sys; from pathlib import Path; sys.path.insert(0, sys.argv[1]); "
+             "import find_and_remove_broken_links as f; "
+             "f.scan_docs(files=sorted(Path(sys.argv[2]).rglob('*.md')))")
+
+# name -> argv after the interpreter; {dir} is the corpus copy
+FIXERS = {
+    'format_markdown': [os.path.join(SCRIPTS, 'format_markdown.py'), '{dir}', '--no-cache'],
+    'convert_setext_to_atx2': [os.path.join(SCRIPTS, 'convert_setext_to_atx2.py'), '{dir}'],
+    'fix_admonition_indent_better': [os.path.join(SCRIPTS, 'fix_admonition_indent_better.py'),
+                                     '--docs-root', '{dir}', '--apply'],
+    'assign_fence_language': [os.path.join(SCRIPTS, 'assign_fence_language.py'), '{dir}'],
+    'link_scanner': ['-c', LINK_SCAN, os.path.join(ROOT_DIR, 'docs', 'tools'), '{dir}'],
+}
+
+
+def run_once(argv):
+    """Run one fixer process; return (wall seconds, peak RSS in MB)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable] + argv, stdout=subprocess.DEVNULL)
+    # wait4() gives the rusage of this child alone, unlike getrusage(RUSAGE_CHILDREN)
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} exited with status {proc.returncode}")
+    # ru_maxrss is in KiB on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def bench_fixer(name, corpus, files, size, repeat, work_dir):
+    best, rss = None, 0.0
+    for i in range(repeat):
+        copy = os.path.join(work_dir, f"{name}-{i}", 'docs')
+        shutil.copytree(corpus, copy)
+        elapsed, peak = run_once([a.format(dir=copy) for a in FIXERS[name]])
+        shutil.rmtree(os.path.dirname(copy))
+        best = elapsed if best is None else min(best, elapsed)
+        rss = max(rss, peak)
+    return {'seconds': round(best, 3), 'files_per_s': round(files / best, 1),
+            'mb_per_s': round(size / 1e6 / best, 2), 'peak_rss_mb': round(rss, 1)}
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages for results against the baseline results."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if r['files_per_s'] < base['files_per_s'] * (1 - tolerance):
+            regressions.append(f"{name}: {r['files_per_s']} files/s, baseline {base['files_per_s']}")
+        if r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {r['peak_rss_mb']} MB, baseline {base['peak_rss_mb']}")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the docs fixers on a synthetic corpus')
+    parser.add_argument('--pages', type=int, help=f"Corpus pages (default: baseline's, else {DEFAULT_CORPUS['pages']})")
+    parser.add_argument('--seed', type=int, help='Corpus seed (default: the baseline\'s, else 1)')
+    parser.add_argument('--scale', type=float, help='Corpus scale (default: the baseline\'s, else 1.0)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per fixer; the fastest counts (default: 3)')
+    parser.add_argument('--only', help=f"Comma-separated fixers to run (default: all of {', '.join(FIXERS)})")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--no-baseline', action='store_true', help='Only report; do not compare')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float,
+                        help=f"Allowed slowdown/RSS growth as a fraction (default: baseline's, else {DEFAULT_TOLERANCE})")
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    names = list(FIXERS)
+    if args.only:
+        names = [n.strip() for n in args.only.split(',') if n.strip()]
+        unknown = [n for n in names if n not in FIXERS]
+        if unknown:
+            parser.error(f"unknown fixer(s): {', '.join(unknown)}")
+    baseline = None if args.no_baseline else load_baseline(args.baseline)
+    corpus_opts = dict((baseline or {}).get('corpus', DEFAULT_CORPUS))
+    for key in corpus_opts:
+        if getattr(args, key) is not None:
+            corpus_opts[key] = getattr(args, key)
+    tolerance = args.tolerance if args.tolerance is not None else (baseline or {}).get('tolerance', DEFAULT_TOLERANCE)
+    if baseline is not None and not args.update_baseline and corpus_opts != baseline['corpus']:
+        parser.error(f"corpus {corpus_opts} differs from the baseline's {baseline['corpus']}; "
+                     "use --no-baseline or --update-baseline")
+
+    work_dir = tempfile.mkdtemp(prefix='docs-bench-')
+    try:
+        corpus = os.path.join(work_dir, 'corpus')
+        files, size = gen_corpus.generate(corpus, **corpus_opts)
+        print(f"Corpus: {files} pages, {size / 1e6:.1f} MB ({', '.join(f'{k}={v}' for k, v in corpus_opts.items())})")
+        print(f"{'fixer':<30} {'files/s':>9} {'MB/s':>7} {'peak RSS MB':>12} {'baseline files/s':>17}")
+        results = {}
+        for name in names:
+            results[name] = r = bench_fixer(name, corpus, files, size, args.repeat, work_dir)
+            base = (baseline or {}).get('results', {}).get(name, {}).get('files_per_s', '-')
+            print(f"{name:<30} {r['files_per_s']:>9} {r['mb_per_s']:>7} {r['peak_rss_mb']:>12} {base:>17}")
+    finally:
+        shutil.rmtree(work_dir)
+
+    report = {'corpus': corpus_opts, 'tolerance': tolerance, 'results': results}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+    if args.update_baseline:
+        if baseline is not None and baseline['corpus'] == corpus_opts:
+            # keep the entries of fixers that were not run this time
+            report['results'] = dict(baseline['results'], **results)
+        with open(args.baseline, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+        print(f"Wrote baseline: {args.baseline}")
+        return
+    if baseline is None:
+        return
+    regressions = compare(results, baseline['results'], tolerance)
+    for msg in regressions:
+        print(f"REGRESSION: {msg}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions against {args.baseline} (tolerance {tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
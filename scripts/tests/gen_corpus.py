@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Generate a seeded synthetic Markdown corpus for benchmarking the docs tooling.
+
+The same seed and options always produce byte-identical files. Pages are spread over nested
+section directories and mix everything the fixers act on:
+  - YAML front matter, ATX and setext headings, wrapped and over-long paragraphs
+  - bare URLs and e-mail addresses, relative links to other pages (some broken, some with anchors)
+  - deep unordered/ordered lists with mixed markers and loose spacing
+  - nested admonitions, some with over-indented fences
+  - long fenced blocks, with and without a language, including shell sessions
+
+Usage: python3 scripts/tests/gen_corpus.py OUT_DIR [--pages 2000] [--seed 1] [--scale 1.0]
+"""
+
+import argparse
+import os
+import random
+
+WORDS = ('perfsonar testpoint toolkit archive latency throughput pscheduler measurement host tuning '
+         'network interface buffer kernel packet pacing mesh dashboard grafana opensearch logstash '
+         'container podman systemd service configuration certificate firewall route bandwidth jitter '
+         'the a of to and in for with on is are be this that it as by from').split()
+LANGS = ('bash', 'yaml', 'json', 'python', 'ini', 'text', 'console')
+ADMONITIONS = ('note', 'warning', 'tip', 'info', 'danger', 'example')
+SHELL_CMDS = ('sudo systemctl restart pscheduler-scheduler', 'dnf install -y perfsonar-testpoint',
+              'podman ps --format "{{.Names}}"', 'curl -fsSL https://example.org/install.sh | bash',
+              'sysctl -w net.core.rmem_max=536870912', 'ip link set dev eth0 mtu 9000',
+              'journalctl -u perfsonar-lsregistrationdaemon --since today')
+
+
+class PageWriter:
+    """Builds one page; every random choice goes through the shared seeded rng."""
+
+    def __init__(self, rng, page_paths, index, scale):
+        self.rng = rng
+        self.page_paths = page_paths
+        self.path = page_paths[index]
+        self.scale = scale
+        self.out = []
+
+    def words(self, lo, hi):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(lo, hi)))
+
+    def sentence(self):
+        s = self.words(6, 18)
+        r = self.rng.random()
+        if r < 0.15:
+            s += f" see https://example.org/{self.rng.choice(WORDS)}/{self.rng.randint(1, 999)}"
+        elif r < 0.2:
+            s += f" or mail {self.rng.choice(WORDS)}@example.org"
+        elif r < 0.45:
+            s += ' ' + self.link()
+        return s[0].upper() + s[1:] + '.'
+
+    def link(self):
+        r = self.rng.random()
+        if r < 0.2:
+            return f"[{self.words(1, 3)}](https://www.{self.rng.choice(WORDS)}.org/docs/)"
+        if r < 0.3:
+            # a page that does not exist
+            return f"[{self.words(1, 3)}](missing/{self.rng.choice(WORDS)}.md)"
+        target = os.path.relpath(self.rng.choice(self.page_paths), os.path.dirname(self.path) or '.')
+        if r < 0.45:
+            target += f"#{self.rng.choice(WORDS)}-{self.rng.choice(WORDS)}"
+        return f"[{self.words(1, 3)}]({target})"
+
+    def n(self, lo, hi):
+        return max(lo, int(self.rng.randint(lo, hi) * self.scale))
+
+    def paragraph(self, indent=''):
+        text = ' '.join(self.sentence() for _ in range(self.rng.randint(1, 6)))
+        if self.rng.random() < 0.5:
+            # pre-wrapped at a random width, as hand-written pages are
+            width = self.rng.randint(60, 140)
+            line, lines = '', []
+            for w in text.split(' '):
+                if line and len(line) + len(w) > width:
+                    lines.append(line)
+                    line = w
+                else:
+                    line = f"{line} {w}" if line else w
+            lines.append(line)
+        else:
+            lines = [text]
+        self.out += [indent + ln for ln in lines] + ['']
+
+    def heading(self, level):
+        title = self.words(2, 6).title()
+        if level <= 2 and self.rng.random() < 0.3:
+            self.out += [title, ('=' if level == 1 else '-') * len(title), '']
+        else:
+            self.out += ['#' * level + ' ' + title + ('.' if self.rng.random() < 0.1 else ''), '']
+
+    def fence(self, indent='', lines=None):
+        lang = self.rng.choice(LANGS) if self.rng.random() < 0.6 else ''
+        fence = '`' * (4 if self.rng.random() < 0.05 else 3)
+        body = []
+        count = lines if lines is not None else self.n(3, 25)
+        shell = lang in ('bash', 'console', '') and self.rng.random() < 0.6
+        for i in range(count):
+            if shell:
+                body.append(('$ ' if self.rng.random() < 0.5 else '') + self.rng.choice(SHELL_CMDS))
+            else:
+                body.append(f"{self.rng.choice(WORDS)}_{i}: {self.words(1, 8)}")
+        self.out += [indent + fence + lang] + [indent + b for b in body] + [indent + fence, '']
+
+    def list_block(self, depth=0, indent=''):
+        ordered = self.rng.random() < 0.3
+        # fewer items further down keeps deep nesting from exploding
+        for i in range(self.rng.randint(1, max(2, 6 - depth))):
+            marker = f"{i + 1}." if ordered else self.rng.choice('-*+')
+            gap = ' ' * self.rng.choice((1, 1, 1, 2))
+            self.out.append(f"{indent}{marker}{gap}{self.words(3, 14)}")
+            sub = indent + ' ' * (len(marker) + 1 if ordered else 2)
+            r = self.rng.random()
+            if depth < 6 and r < 0.25:
+                self.list_block(depth + 1, sub)
+            elif r < 0.3:
+                self.out.append('')
+                self.fence(sub + '  ' if self.rng.random() < 0.1 else sub, self.n(2, 8))
+            if self.rng.random() < 0.15:
+                self.out.append('')
+        self.out.append('')
+
+    def admonition(self, depth=0, indent=''):
+        kind = self.rng.choice(ADMONITIONS)
+        self.out += [f'{indent}!!! {kind} "{self.words(1, 4).title()}"', '']
+        inner = indent + '    '
+        self.paragraph(inner)
+        r = self.rng.random()
+        if depth < 3 and r < 0.3:
+            self.admonition(depth + 1, inner)
+        elif r < 0.6:
+            # over-indented fences are what fix_admonition_indent_better fixes
+            self.fence(inner + ('    ' if self.rng.random() < 0.4 else ''), self.n(2, 12))
+        elif r < 0.8:
+            self.list_block(4, inner)
+
+    def render(self):
+        if self.rng.random() < 0.7:
+            self.out += ['---', f"title: {self.words(2, 5).title()}",
+                         f"tags: [{', '.join(self.rng.sample(WORDS, 3))}]", '---', '']
+        self.heading(1)
+        self.paragraph()
+        for _ in range(self.n(2, 8)):
+            self.heading(self.rng.randint(2, 4))
+            for _ in range(self.rng.randint(1, 4)):
+                r = self.rng.random()
+                if r < 0.35:
+                    self.paragraph()
+                elif r < 0.55:
+                    self.list_block()
+                elif r < 0.75:
+                    self.fence()
+                elif r < 0.97:
+                    self.admonition()
+                else:
+                    # a long generated listing
+                    self.fence(lines=self.n(100, 400))
+        return '\n'.join(self.out) + '\n'
+
+
+def page_paths(rng, pages):
+    """Relative paths for the pages, spread over nested section directories."""
+    sections = [''] + [f"section{i}" for i in range(max(1, pages // 50))]
+    sections += [f"{rng.choice(sections[1:])}/sub{i}" for i in range(max(1, pages // 200))]
+    return [os.path.join(rng.choice(sections), f"page{i:05d}.md") for i in range(pages)]
+
+
+def generate(out_dir, pages=2000, seed=1, scale=1.0):
+    """Write the corpus under out_dir; return (files, total bytes)."""
+    rng = random.Random(seed)
+    paths = page_paths(rng, pages)
+    total = 0
+    for i, rel in enumerate(paths):
+        text = PageWriter(rng, paths, i, scale).render()
+        dst = os.path.join(out_dir, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        with open(dst, 'w', encoding='utf-8') as fh:
+            fh.write(text)
+        total += len(text.encode('utf-8'))
+    return len(paths), total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a seeded synthetic Markdown corpus')
+    parser.add_argument('out_dir', help='Directory to write the corpus into')
+    parser.add_argument('--pages', type=int, default=2000, help='Number of pages (default: 2000)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiplier for sections per page and block lengths (default: 1.0)')
+    args = parser.parse_args()
+    files, size = generate(args.out_dir, args.pages, args.seed, args.scale)
+    print(f"Wrote {files} pages ({size / 1e6:.1f} MB) to {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
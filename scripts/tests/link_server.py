@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Local HTTP stand-in for the external link checks in the smoke tests.
+
+Serves canned answers by path prefix: /ok (200), /nohead (405 to HEAD, 200 to GET), /redirect
+(301 to /ok/target), /error (503), /slow (200 after SLOW seconds), anything else 404. The port it
+listens on is printed on the first line; every request is then logged as "METHOD PATH" to
+stdout, so a test can count what the checker sent. It also answers as a plain http proxy would:
+a request for an absolute URL is served by its path.
+
+Usage: python3 scripts/tests/link_server.py > server.log &
+"""
+
+import http.server
+import sys
+import threading
+import time
+import urllib.parse
+
+SLOW = 3
+# requests are served on their own threads; one log line is written at a time
+_log_lock = threading.Lock()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body):
+        with _log_lock:
+            sys.stdout.write(f"{self.command} {self.path}\n")
+            sys.stdout.flush()
+        path = urllib.parse.urlsplit(self.path).path
+        if path.startswith('/slow'):
+            time.sleep(SLOW)
+        if path.startswith('/nohead') and self.command == 'HEAD':
+            code = 405
+        elif path.startswith('/redirect'):
+            code = 301
+        elif path.startswith(('/ok', '/nohead', '/slow')):
+            code = 200
+        elif path.startswith('/error'):
+            code = 503
+        else:
+            code = 404
+        self.send_response(code)
+        if code == 301:
+            self.send_header('Location', '/ok/target')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        if body:
+            self.wfile.write(b'ok')
+
+    def do_HEAD(self):
+        self._reply(False)
+
+    def do_GET(self):
+        self._reply(True)
+
+
+def main():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    print(server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,6 +19,589 @@ else
     exit 2
 fi
 
+echo "Testing mdblocks.py based fixers:"
+python3 "$ROOT_DIR/scripts/normalize_unordered_list_markers.py" "$TMP_DIR" >/dev/null || { echo "normalize_unordered_list_markers failed"; exit 1; }
+python3 "$ROOT_DIR/scripts/convert_setext_to_atx2.py" "$TMP_DIR" >/dev/null || { echo "convert_setext_to_atx2 failed"; exit 1; }
+
+if grep -q '^\* second item' "$TMP_DIR/blocks.md" && grep -q '^- docs' "$TMP_DIR/blocks.md" \
+    && grep -q '^- a list item inside a nested fence example' "$TMP_DIR/blocks.md" \
+    && grep -q '^# Block model fixture' "$TMP_DIR/blocks.md"; then
+    echo "OK: list markers and setext headings rewritten outside front matter and fences only"
+else
+    echo "FAIL: block model fixers touched front matter/fences or missed a rewrite" >&2
+    exit 2
+fi
+mkdir -p "$TMP_DIR/nofinal"
+printf -- '- item' > "$TMP_DIR/nofinal/page.md"
+python3 "$ROOT_DIR/scripts/normalize_unordered_list_markers.py" "$TMP_DIR/nofinal" >/dev/null
+if [ "$(od -An -c "$TMP_DIR/nofinal/page.md" | tr -s ' ')" = " * i t e m" ]; then
+    echo "OK: normalize_unordered_list_markers.py keeps a missing final newline missing"
+else
+    echo "FAIL: normalize_unordered_list_markers.py changed the file's trailing newline" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/nofinal"
+
+echo "Testing format_markdown.py --stream:"
+mkdir -p "$TMP_DIR/stream" "$TMP_DIR/memory"
+cp "$FIXTURES_DIR"/*.md "$TMP_DIR/stream/"
+cp "$FIXTURES_DIR"/*.md "$TMP_DIR/memory/"
+python3 "$ROOT_DIR/scripts/format_markdown.py" "$TMP_DIR/stream" --no-cache --stream >/dev/null || { echo "format_markdown --stream failed"; exit 1; }
+python3 "$ROOT_DIR/scripts/format_markdown.py" "$TMP_DIR/memory" --no-cache >/dev/null || { echo "format_markdown failed"; exit 1; }
+if diff -r "$TMP_DIR/stream" "$TMP_DIR/memory" >/dev/null; then
+    echo "OK: streaming and in-memory formatting agree"
+else
+    echo "FAIL: format_markdown.py --stream output differs from the in-memory formatter" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/stream" "$TMP_DIR/memory"
+
+echo "Testing format_markdown.py is idempotent:"
+cp -r "$ROOT_DIR/docs" "$TMP_DIR/twice"
+python3 "$ROOT_DIR/scripts/format_markdown.py" "$TMP_DIR/twice" --no-cache >/dev/null || { echo "format_markdown failed"; exit 1; }
+if python3 "$ROOT_DIR/scripts/format_markdown.py" "$TMP_DIR/twice" --no-cache --check > "$TMP_DIR/twice.out"; then
+    echo "OK: formatting the docs tree a second time changes nothing"
+else
+    echo "FAIL: format_markdown.py changed its own output:" >&2
+    cat "$TMP_DIR/twice.out" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/twice" "$TMP_DIR/twice.out"
+
+echo "Testing docsfix.py pipeline:"
+DOCSFIX=(python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR" --rules format,setext,fence-lang --cache "$TMP_DIR/.cache/docsfix.json" --jobs 2)
+"${DOCSFIX[@]}" >/dev/null || { echo "docsfix failed"; exit 1; }
+if "${DOCSFIX[@]}" | grep '^No changes required.' >/dev/null; then
+    echo "OK: docsfix.py output is stable on a second run"
+else
+    echo "FAIL: docsfix.py changed files on a second run" >&2
+    exit 2
+fi
+if "${DOCSFIX[@]}" | grep '^Cache hits: [1-9]' >/dev/null; then
+    echo "OK: docsfix.py skipped clean files using the cache"
+else
+    echo "FAIL: docsfix.py did not use the fixed-point cache" >&2
+    exit 2
+fi
+
+echo "Testing --profile:"
+"${DOCSFIX[@]}" --no-cache --profile "$TMP_DIR/profile.json" --pstats "$TMP_DIR/profile.pstats" >/dev/null 2>&1 \
+    || { echo "docsfix --profile failed"; exit 1; }
+if python3 - "$TMP_DIR/profile.json" <<'PY' && [ -s "$TMP_DIR/profile.pstats" ]
+import json, sys
+report = json.load(open(sys.argv[1]))
+assert report['files']['scanned'] > 0 and report['bytes']['read'] > 0, report['files']
+assert {'rule:format', 'rule:setext', 'format_markdown._format_paragraph'} <= set(report['rules']), report['rules']
+assert report['slowest_files'] and report['slowest_files'][0]['seconds'] >= report['slowest_files'][-1]['seconds']
+PY
+then
+    echo "OK: --profile writes a run report with per-rule and per-file timings"
+else
+    echo "FAIL: docsfix.py --profile report is incomplete" >&2
+    exit 2
+fi
+
+echo "Testing --check/--diff:"
+cp "$FIXTURES_DIR/blocks.md" "$TMP_DIR/check.md"
+CHECKSUM="$(cksum < "$TMP_DIR/check.md")"
+if python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/check.md" --no-cache --check >/dev/null; then
+    echo "FAIL: docsfix.py --check passed on a file that needs fixing" >&2
+    exit 2
+fi
+python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/check.md" --no-cache --diff > "$TMP_DIR/check.diff"
+if [ "$(cksum < "$TMP_DIR/check.md")" = "$CHECKSUM" ] && grep '^+++ b/' "$TMP_DIR/check.diff" >/dev/null; then
+    echo "OK: --check fails and --diff reports without writing"
+else
+    echo "FAIL: docsfix.py --check/--diff modified the file or printed no diff" >&2
+    exit 2
+fi
+python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/check.md" --no-cache >/dev/null
+if python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/check.md" --no-cache --check >/dev/null; then
+    echo "OK: --check passes once the file is fixed"
+else
+    echo "FAIL: docsfix.py --check still fails after fixing" >&2
+    exit 2
+fi
+
+echo "Testing the paragraph wrapper:"
+mkdir -p "$TMP_DIR/wrap"
+{
+    printf '!!! note\n\n    An admonition body line that is long enough to need wrapping once it is joined with the next one,\n'
+    printf '    with `a code span that must stay whole` and [a link whose text has spaces](https://example.org/a-long-path-name).\n'
+} > "$TMP_DIR/wrap/page.md"
+python3 "$ROOT_DIR/scripts/format_markdown.py" "$TMP_DIR/wrap" --no-cache >/dev/null
+if grep -q '^    .*`a code span that must stay whole`' "$TMP_DIR/wrap/page.md" \
+    && grep -q '^    .*\[a link whose text has spaces\](https://example.org/a-long-path-name)' "$TMP_DIR/wrap/page.md" \
+    && [ "$(grep -c '^    ' "$TMP_DIR/wrap/page.md")" = 2 ]; then
+    echo "OK: paragraphs wrap between inline tokens and keep their indentation"
+else
+    echo "FAIL: format_markdown.py split an inline token or lost the admonition indent" >&2
+    cat "$TMP_DIR/wrap/page.md" >&2
+    exit 2
+fi
+python3 "$ROOT_DIR/scripts/tests/bench_wrap.py" --pages 20 --repeat 1 > "$TMP_DIR/wrap/bench.out"
+if grep -q 'mdwrap in 0' "$TMP_DIR/wrap/bench.out"; then
+    echo "OK: bench_wrap.py compares mdwrap with textwrap"
+else
+    echo "FAIL: bench_wrap.py did not report" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/wrap"
+
+echo "Testing the fence language classifier:"
+mkdir -p "$TMP_DIR/lang/assign" "$TMP_DIR/lang/format"
+{
+    printf '# Fences\n\n```\n$ uname -r\n6.1.0\n```\n\n```\nservices:\n  testpoint:\n    image: perfsonar/testpoint\n```\n\n'
+    printf '```\n{"version": "1.0", "states": []}\n```\n\n```\ntable inet filter {\n    chain input {\n'
+    printf '        type filter hook input priority 0;\n    }\n}\n```\n\n```\n[Unit]\nDescription=Pacing\n```\n\n'
+    printf '```\nimport json\ndef load(path):\n    return json.load(open(path))\n```\n\n```\nSaved States:\n=============\n```\n'
+} > "$TMP_DIR/lang/assign/page.md"
+cp "$TMP_DIR/lang/assign/page.md" "$TMP_DIR/lang/format/page.md"
+python3 "$ROOT_DIR/scripts/assign_fence_language.py" "$TMP_DIR/lang/assign" >/dev/null
+python3 "$ROOT_DIR/scripts/format_markdown.py" "$TMP_DIR/lang/format" --no-cache >/dev/null
+expected='console yaml json nft ini python text'
+assigned="$(grep -o '^``` \?[a-z]\+' "$TMP_DIR/lang/assign/page.md" | tr -d '` ' | xargs)"
+formatted="$(grep -o '^``` \?[a-z]\+' "$TMP_DIR/lang/format/page.md" | tr -d '` ' | xargs)"
+if [ "$assigned" = "$expected" ] && [ "$formatted" = "$expected" ]; then
+    echo "OK: assign_fence_language.py and format_markdown.py label fences alike ($expected)"
+else
+    echo "FAIL: fence languages: assign_fence_language gave '$assigned', format_markdown '$formatted'" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/lang"
+
+echo "Testing markdownlint JSON edit plans:"
+mkdir -p "$TMP_DIR/lint"
+printf '# Title\nSee https://example.org/x here.\n```\nsudo dnf install -y foo\n```\n- item\n\n\nEnd.\n' > "$TMP_DIR/lint/page.md"
+PAGE="$TMP_DIR/lint/page.md"
+cat > "$TMP_DIR/lint/report.json" <<EOF
+[
+  {"fileName": "$PAGE", "lineNumber": 3, "ruleNames": ["MD031"], "fixInfo": {"insertText": "\\n"}},
+  {"fileName": "$PAGE", "lineNumber": 6, "ruleNames": ["MD031"], "fixInfo": {"insertText": "\\n"}},
+  {"fileName": "$PAGE", "lineNumber": 6, "ruleNames": ["MD032"], "fixInfo": {"insertText": "\\n"}},
+  {"fileName": "$PAGE", "lineNumber": 2, "ruleNames": ["MD034"],
+   "fixInfo": {"editColumn": 5, "deleteCount": 21, "insertText": "<https://example.org/x>"}},
+  {"fileName": "$PAGE", "lineNumber": 3, "ruleNames": ["MD040"]},
+  {"fileName": "$PAGE", "lineNumber": 8, "ruleNames": ["MD012"], "fixInfo": {"deleteCount": -1}}
+]
+EOF
+# MD040 edits keep line numbers, so the same report still applies afterwards
+python3 "$ROOT_DIR/scripts/fix_md040_from_json.py" "$TMP_DIR/lint/report.json" >/dev/null
+python3 "$ROOT_DIR/scripts/apply_markdownlint_fixes.py" "$TMP_DIR/lint/report.json" >/dev/null
+expected="$(printf '# Title\nSee <https://example.org/x> here.\n\n``` bash\nsudo dnf install -y foo\n```\n\n- item\n\nEnd.')"
+if [ "$(cat "$PAGE")" = "$expected" ]; then
+    echo "OK: markdownlint findings applied as one plan per file, duplicate edits once"
+else
+    echo "FAIL: markdownlint JSON fixes produced an unexpected page" >&2
+    cat "$PAGE" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/lint"
+
+echo "Testing mdlint.py:"
+mkdir -p "$TMP_DIR/mdlint"
+printf '# Title\nSee https://example.org/x here.\n```\nsudo dnf install -y foo\n```\n- item\n## Next.\n\n\nEnd.\n' > "$TMP_DIR/mdlint/page.md"
+printf '{"default": true, "MD026": false}\n' > "$TMP_DIR/mdlint/config.json"
+if python3 "$ROOT_DIR/scripts/mdlint.py" "$TMP_DIR/mdlint" --config "$TMP_DIR/mdlint/config.json" --json \
+    --output "$TMP_DIR/mdlint/report.json" >/dev/null; then
+    echo "FAIL: mdlint.py found nothing in a page with findings" >&2
+    exit 2
+fi
+rules="$(python3 -c 'import json, sys; print(" ".join(sorted({f["ruleNames"][0] for f in json.load(open(sys.argv[1]))})))' \
+    "$TMP_DIR/mdlint/report.json")"
+python3 "$ROOT_DIR/scripts/mdlint.py" "$TMP_DIR/mdlint" --config "$TMP_DIR/mdlint/config.json" --fix >/dev/null
+if [ "$rules" = "MD012 MD022 MD031 MD032 MD034 MD040" ] \
+    && python3 "$ROOT_DIR/scripts/mdlint.py" "$TMP_DIR/mdlint" --config "$TMP_DIR/mdlint/config.json" >/dev/null \
+    && grep -q '^## Next\.$' "$TMP_DIR/mdlint/page.md"; then
+    echo "OK: mdlint.py reports configured rules as markdownlint JSON and --fix clears them"
+else
+    echo "FAIL: mdlint.py reported '$rules' or --fix left findings" >&2
+    cat "$TMP_DIR/mdlint/page.md" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/mdlint"
+
+echo "Testing the admonition engine:"
+mkdir -p "$TMP_DIR/admon"
+{
+    printf '!!! warning\n\nPort 443 must be open.\n\n!!! note\n\n        ```bash\n        ls -l\n        ```\n\n'
+    printf -- '- item\n\n    !!! tip\n\n                ```\n                uname -r\n                ```\n'
+} > "$TMP_DIR/admon/page.md"
+cp "$TMP_DIR/admon/page.md" "$TMP_DIR/admon/aggressive.md"
+printf '!!! note\n\nFirst paragraph.\n\nSecond paragraph.\n\n## Next\n' > "$TMP_DIR/admon/paragraphs.md"
+python3 "$ROOT_DIR/scripts/fix_admonition_indent.py" "$TMP_DIR/admon/paragraphs.md" >/dev/null
+python3 "$ROOT_DIR/scripts/fix_admonition_indent_better.py" --docs-root "$TMP_DIR/admon" --files page.md --apply >/dev/null
+python3 "$ROOT_DIR/scripts/fix_admonition_indent.py" "$TMP_DIR/admon/aggressive.md" >/dev/null
+# conservative: fences go to one level inside their innermost container, bodies are left alone
+expected="$(printf '!!! warning\n\nPort 443 must be open.\n\n!!! note\n\n    ```bash\n    ls -l\n    ```\n\n- item\n\n    !!! tip\n\n        ```\n        uname -r\n        ```')"
+if [ "$(cat "$TMP_DIR/admon/page.md")" = "$expected" ] \
+    && grep -q '^    Port 443 must be open\.$' "$TMP_DIR/admon/aggressive.md" \
+    && grep -q '^        uname -r$' "$TMP_DIR/admon/aggressive.md" \
+    && [ "$(cat "$TMP_DIR/admon/paragraphs.md")" = "$(printf '!!! note\n\n    First paragraph.\n\n    Second paragraph.\n\n## Next')" ]; then
+    echo "OK: conservative policy dedents nested fences, aggressive policy also indents empty admonition bodies"
+else
+    echo "FAIL: admonition engine produced unexpected pages" >&2
+    cat "$TMP_DIR/admon/page.md" "$TMP_DIR/admon/aggressive.md" "$TMP_DIR/admon/paragraphs.md" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/admon"
+
+echo "Testing anchor links:"
+mkdir -p "$TMP_DIR/anchors"
+printf '# Install `perfSONAR` &amp; more\n\n## Step\n\n## Step\n\nTuning\n------\n\n## Custom {#own-id}\n\n<a name="legacy"></a>\n\n```\n# Not a heading\n```\n' \
+    > "$TMP_DIR/anchors/target.md"
+{
+    printf '[ok](target.md#install-perfsonar-more) [dup](target.md#step_1) [setext](target.md#tuning)\n'
+    printf '[own](target.md#own-id) [html](target.md#legacy) [self](#links)\n\n# Links\n\n'
+    printf '[gone](target.md#removed-section) [code](target.md#not-a-heading) [self](#nowhere)\n'
+} > "$TMP_DIR/anchors/page.md"
+# the link scanner has no option to scan another tree than docs/, so drive scan_docs() directly
+(cd "$TMP_DIR/anchors" && python3 - "$ROOT_DIR/docs/tools" > broken.out <<'EOF'
+import sys; from pathlib import Path; sys.path.insert(0, sys.argv[1])
+import find_and_remove_broken_links as f
+for md, entries in f.scan_docs(files=[Path('page.md').resolve()]).items():
+    for e in entries:
+        print(e.note)
+EOF
+)
+expected="$(printf 'target.md#removed-section (missing anchor)\ntarget.md#not-a-heading (missing anchor)\n#nowhere (missing anchor)')"
+if [ "$(cat "$TMP_DIR/anchors/broken.out")" = "$expected" ] && [ -s "$TMP_DIR/anchors/.cache/anchors.json" ]; then
+    echo "OK: #anchor links are checked against the toc IDs, {#id} and HTML ids of their page"
+else
+    echo "FAIL: anchor checks reported:" >&2
+    cat "$TMP_DIR/anchors/broken.out" >&2
+    python3 "$ROOT_DIR/scripts/anchors.py" "$TMP_DIR/anchors/target.md" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/anchors"
+
+echo "Testing --remove:"
+mkdir -p "$TMP_DIR/remove"
+printf '# Other\n\n## Real\n' > "$TMP_DIR/remove/other.md"
+printf '[good](other.md) [real](other.md#real) [bad](other.md#nope) ![img](gone.png)\n\n[ref][r]\n\n[r]: gone.md\n' \
+    > "$TMP_DIR/remove/page.md"
+(cd "$TMP_DIR/remove" && python3 - "$ROOT_DIR/docs/tools" > remove.out <<'EOF'
+import sys; from pathlib import Path; sys.path.insert(0, sys.argv[1])
+import find_and_remove_broken_links as f
+f.MD_ROOT = Path('.').resolve()
+f.remove_broken_links(f.scan_docs(files=[Path('page.md').resolve()]), Path('backups'))
+EOF
+)
+expected="$(printf '[good](other.md) [real](other.md#real) bad [BROKEN-LINK: other.md#nope] img [BROKEN-LINK: gone.png]\n\n[ref][r]\n\n[r]: gone.md')"
+if [ "$(cat "$TMP_DIR/remove/page.md")" = "$expected" ] \
+    && grep 'page.md: 1 reference, autolink or HTML links left to fix by hand$' "$TMP_DIR/remove/remove.out" >/dev/null; then
+    echo "OK: --remove rewrites only the reported links, by position"
+else
+    echo "FAIL: --remove gave:" >&2
+    cat "$TMP_DIR/remove/remove.out" "$TMP_DIR/remove/page.md" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/remove"
+
+echo "Testing the JSON link report:"
+mkdir -p "$TMP_DIR/fixes"
+printf '# Other\n' > "$TMP_DIR/fixes/other.md"
+{
+    printf '# Page\n\nSee [here](gone.md) and [here](other.md), ![img](missing.png).\n'
+    printf 'Also [here](gone.md#x) twice: [again](gone.md).\n\n```\n[here](gone.md)\n```\n'
+} > "$TMP_DIR/fixes/page.md"
+# both tools only know docs/, so drive them on this tree from Python
+(cd "$TMP_DIR/fixes" && python3 - "$ROOT_DIR/docs/tools" > fixes.out <<'EOF'
+import sys; from pathlib import Path; sys.path.insert(0, sys.argv[1])
+import apply_link_report_fixes as a
+import find_and_remove_broken_links as f
+f.MD_ROOT = a.MD_ROOT = Path('.').resolve()
+f.write_json_report(f.scan_docs(files=[Path('page.md').resolve()]), Path('report.jsonl'))
+a.apply_changes(a.load_report(Path('report.jsonl')), False, None)
+# an entry whose page changed since the scan is skipped, not matched by href
+Path('stale.md').write_text('[x](gone.md)\n')
+f.write_json_report(f.scan_docs(files=[Path('stale.md').resolve()]), Path('stale.jsonl'))
+Path('stale.md').write_text('Intro [x](gone.md)\n')
+a.apply_changes(a.load_report(Path('stale.jsonl')), False, None)
+# the JSON report is kept in the repository root, not in the working directory
+print('default:', a.REPORT_JSON == f.REPORT_JSON == Path(sys.argv[1]).parents[1] / '.cache' / 'broken_links.jsonl')
+EOF
+)
+expected="$(printf '# Page\n\nSee here [BROKEN-LINK: gone.md] and [here](other.md), img [BROKEN-LINK: missing.png].\nAlso here [BROKEN-LINK: gone.md#x] twice: again [BROKEN-LINK: gone.md].\n\n```\n[here](gone.md)\n```')"
+if [ "$(cat "$TMP_DIR/fixes/page.md")" = "$expected" ] && [ "$(wc -l < "$TMP_DIR/fixes/report.jsonl")" = 4 ] \
+    && grep '"line": 3, "column": 5, "offset": 12, "href": "gone.md"' "$TMP_DIR/fixes/report.jsonl" >/dev/null \
+    && [ "$(cat "$TMP_DIR/fixes/stale.md")" = 'Intro [x](gone.md)' ] \
+    && grep 'stale.md: 1 report entries no longer match the page, skipped' "$TMP_DIR/fixes/fixes.out" >/dev/null \
+    && grep '^default: True$' "$TMP_DIR/fixes/fixes.out" >/dev/null; then
+    echo "OK: apply_link_report_fixes.py rewrites exactly the links of the JSON report and skips stale entries"
+else
+    echo "FAIL: applying the JSON link report gave:" >&2
+    cat "$TMP_DIR/fixes/fixes.out" "$TMP_DIR/fixes/report.jsonl" "$TMP_DIR/fixes/page.md" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/fixes"
+
+echo "Testing the link graph:"
+mkdir -p "$TMP_DIR/graph/docs/sub"
+{
+    printf '# Home\n\nSee [the guide][guide], [Sub][] and <a href="sub/c.md">C</a>.\n\n'
+    printf '```\n[not a link](orphan.md)\n```\n\n[guide]: b.md\n[sub]: sub/\n'
+} > "$TMP_DIR/graph/docs/a.md"
+printf '# B\n\nBack to [home](a.md), or <https://example.org/>.\n' > "$TMP_DIR/graph/docs/b.md"
+printf '# Sub\n' > "$TMP_DIR/graph/docs/sub/index.md"
+printf '# C\n' > "$TMP_DIR/graph/docs/sub/c.md"
+printf '# Orphan\n' > "$TMP_DIR/graph/docs/orphan.md"
+printf 'site_name: test\nnav:\n  - Home: a.md\n' > "$TMP_DIR/graph/mkdocs.yml"
+GRAPH=(python3 "$ROOT_DIR/scripts/linkgraph.py" --root "$TMP_DIR/graph/docs" --cache "$TMP_DIR/graph/graph.json"
+       --mkdocs "$TMP_DIR/graph/mkdocs.yml")
+"${GRAPH[@]}" --orphans --referrers "$TMP_DIR/graph/docs/sub/c.md" > "$TMP_DIR/graph/first.out" || true
+rm "$TMP_DIR/graph/docs/sub/c.md"
+"${GRAPH[@]}" --broken > "$TMP_DIR/graph/second.out" || true
+if grep '^5 pages, 5 links: 0 changed, 5 added' "$TMP_DIR/graph/first.out" >/dev/null \
+    && [ "$(grep -c '^orphan:' "$TMP_DIR/graph/first.out")" = 1 ] && grep '^orphan: .*/orphan.md$' "$TMP_DIR/graph/first.out" >/dev/null \
+    && grep '^  .*/a.md (line 3)$' "$TMP_DIR/graph/first.out" >/dev/null \
+    && grep '^4 pages, 5 links: 0 changed, 0 added, 1 removed, 1 referrers to re-validate$' "$TMP_DIR/graph/second.out" >/dev/null \
+    && grep '/a.md:3:[0-9]*: broken html link -> sub/c.md$' "$TMP_DIR/graph/second.out" >/dev/null; then
+    echo "OK: linkgraph.py indexes every kind of link, finds orphans and re-validates only the referrers of a deleted page"
+else
+    echo "FAIL: linkgraph.py reported:" >&2
+    cat "$TMP_DIR/graph/first.out" "$TMP_DIR/graph/second.out" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/graph"
+
+echo "Testing the link rewrite engine:"
+mkdir -p "$TMP_DIR/rewrite/docs"
+{
+    printf '[a](https://old.example.org/x/page.html) <https://old.example.org/deep/y> [ref][]\n'
+    printf '<a href="http://wiki.example.org/bin/view/Main/Topic">t</a> ![i](img/old.png) [m](mailto:old@example.org)\n\n'
+    printf '```\n[code](https://old.example.org/x/page.html)\n```\n\n[ref]: http://wiki.example.org/bin/view/Net/Page\n'
+} > "$TMP_DIR/rewrite/docs/page.md"
+cat > "$TMP_DIR/rewrite/map.json" <<'EOF'
+{
+  "exact": {"mailto:old@example.org": "mailto:new@example.org", "gone.md": "here.md"},
+  "prefix": {"https://old.example.org/": "https://new.example.org/", "https://old.example.org/deep/": "https://deep.example.org/"},
+  "regex": {"https?://wiki\\.example\\.org/bin/view/(\\w+)/(\\w+)": "https://docs.example.org/\\1/\\2/", "img/old\\.(png|jpg)": "img/new.\\1"}
+}
+EOF
+REWRITE=(python3 "$ROOT_DIR/scripts/linkrewrite.py" "$TMP_DIR/rewrite/docs" --map "$TMP_DIR/rewrite/map.json")
+before="$(cat "$TMP_DIR/rewrite/docs/page.md")"
+"${REWRITE[@]}" --check > "$TMP_DIR/rewrite/check.out" && status=0 || status=$?
+"${REWRITE[@]}" --summary "$TMP_DIR/rewrite/summary.json" > "$TMP_DIR/rewrite/write.out"
+expected="$(printf '[a](https://new.example.org/x/page.html) <https://deep.example.org/y> [ref][]\n<a href="https://docs.example.org/Main/Topic/">t</a> ![i](img/new.png) [m](mailto:new@example.org)\n\n```\n[code](https://old.example.org/x/page.html)\n```\n\n[ref]: https://docs.example.org/Net/Page/')"
+if [ "$status" = 1 ] && [ "$(cat "$TMP_DIR/rewrite/docs/page.md")" != "$before" ] \
+    && [ "$(cat "$TMP_DIR/rewrite/docs/page.md")" = "$expected" ] \
+    && grep '^6 rules, 6 links matched in 1 of 1 files:$' "$TMP_DIR/rewrite/check.out" >/dev/null \
+    && grep '^      2 links in   1 files  regex  https?://wiki' "$TMP_DIR/rewrite/check.out" >/dev/null \
+    && grep '^1 rules matched no link' "$TMP_DIR/rewrite/write.out" >/dev/null && grep '^  exact  gone.md$' "$TMP_DIR/rewrite/write.out" >/dev/null \
+    && python3 -c 'import json, sys; s = json.load(open(sys.argv[1]))["rules"]; sys.exit(not [r["old"] for r in s if not r["links"]] == ["gone.md"])' "$TMP_DIR/rewrite/summary.json"; then
+    echo "OK: linkrewrite.py applies exact, prefix and regex rules to every link form and lists unmatched rules"
+else
+    echo "FAIL: linkrewrite.py rewrote:" >&2
+    cat "$TMP_DIR/rewrite/check.out" "$TMP_DIR/rewrite/write.out" "$TMP_DIR/rewrite/docs/page.md" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/rewrite"
+
+echo "Testing concurrent external link checks:"
+mkdir -p "$TMP_DIR/links"
+python3 "$ROOT_DIR/scripts/tests/link_server.py" > "$TMP_DIR/links/server.log" &
+SERVER_PID=$!
+for _ in 1 2 3 4 5 6 7 8 9 10; do [ -s "$TMP_DIR/links/server.log" ] && break; sleep 0.2; done
+URL="http://127.0.0.1:$(head -n 1 "$TMP_DIR/links/server.log")"
+{
+    printf '[a](%s/ok/a) and [again](%s/ok/a), <%s/missing>, [no HEAD](%s/nohead/x)\n' "$URL" "$URL" "$URL" "$URL"
+    printf '[moved](%s/redirect) [down](%s/error) [slow](%s/slow) [mail](mailto:someone@example.org)\n' "$URL" "$URL" "$URL"
+    printf '[a third time](%s/ok/a) [nowhere](http://nonexistent.invalid/)\n' "$URL"
+} > "$TMP_DIR/links/page.md"
+CACHE="$TMP_DIR/links/links.sqlite"
+python3 "$ROOT_DIR/scripts/linkcheck.py" "$TMP_DIR/links/page.md" --timeout 1 --link-cache "$CACHE" \
+    > "$TMP_DIR/links/check.out" || true
+summary="$(tail -n 1 "$TMP_DIR/links/check.out")"
+if echo "$summary" | grep -q '^Checked 7 unique URLs (9 links) in .*: ok 3, 4xx 1, 5xx 1, timeout 1, dns 1$' \
+    && [ "$(grep -c '/ok/a$' "$TMP_DIR/links/server.log")" = 1 ] \
+    && grep -q '^GET /nohead/x$' "$TMP_DIR/links/server.log"; then
+    echo "OK: linkcheck.py checks each URL once, falls back to GET and classifies failures"
+else
+    echo "FAIL: linkcheck.py results: $summary" >&2
+    cat "$TMP_DIR/links/check.out" "$TMP_DIR/links/server.log" >&2
+    exit 2
+fi
+# a slow host holds only its own slots: the fast URL on another host is checked right away
+start="$(wc -l < "$TMP_DIR/links/server.log")"
+python3 "$ROOT_DIR/scripts/linkcheck.py" "$URL/slow/1" "$URL/slow/2" "${URL/127.0.0.1/localhost}/ok/fast" \
+    --workers 2 --per-host 1 --timeout 1 --link-cache none > "$TMP_DIR/links/hosts.out" || true
+if tail -n +"$((start + 1))" "$TMP_DIR/links/server.log" | head -n 2 | grep '^HEAD /ok/fast$' >/dev/null; then
+    echo "OK: linkcheck.py does not hold a fast host behind a slow one"
+else
+    echo "FAIL: linkcheck.py checked the fast host after the slow one" >&2
+    cat "$TMP_DIR/links/hosts.out" "$TMP_DIR/links/server.log" >&2
+    exit 2
+fi
+# with http_proxy set, a host the test can't resolve is reached through the proxy
+env -u no_proxy -u NO_PROXY http_proxy="$URL" python3 "$ROOT_DIR/scripts/linkcheck.py" http://proxied.invalid/ok/p \
+    --link-cache none > "$TMP_DIR/links/proxy.out" || true
+if tail -n 1 "$TMP_DIR/links/proxy.out" | grep -q ': ok 1$' \
+    && grep -q '^HEAD http://proxied.invalid/ok/p$' "$TMP_DIR/links/server.log"; then
+    echo "OK: linkcheck.py sends requests through the environment's http proxy"
+else
+    echo "FAIL: linkcheck.py did not use http_proxy" >&2
+    cat "$TMP_DIR/links/proxy.out" "$TMP_DIR/links/server.log" >&2
+    exit 2
+fi
+# a second run is answered from the link cache, even with the server gone
+kill "$SERVER_PID" 2>/dev/null || true
+requests="$(wc -l < "$TMP_DIR/links/server.log")"
+printf '[new](%s/ok/new)\n' "$URL" >> "$TMP_DIR/links/page.md"
+python3 "$ROOT_DIR/scripts/linkcheck.py" "$TMP_DIR/links/page.md" --link-cache "$CACHE" --offline \
+    > "$TMP_DIR/links/offline.out" || true
+if tail -n 1 "$TMP_DIR/links/offline.out" | grep -q '^Checked 8 unique URLs (10 links) in .*s (7 from the link cache): ok 3, 4xx 1, 5xx 1, timeout 1, dns 1, uncached 1$' \
+    && [ "$(wc -l < "$TMP_DIR/links/server.log")" = "$requests" ] \
+    && python3 "$ROOT_DIR/scripts/linkcache.py" list --broken --db "$CACHE" | grep '^4xx *404 .*/missing$' >/dev/null; then
+    echo "OK: the link cache answers repeated checks offline"
+else
+    echo "FAIL: linkcheck.py --offline did not use the link cache" >&2
+    cat "$TMP_DIR/links/offline.out" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/links"
+
+echo "Testing atomic rewrites:"
+mkdir -p "$TMP_DIR/atomic"
+cp "$FIXTURES_DIR/blocks.md" "$TMP_DIR/atomic/clean.md"
+python3 "$ROOT_DIR/scripts/format_markdown.py" "$TMP_DIR/atomic" --no-cache >/dev/null
+touch -d '2001-01-01 00:00' "$TMP_DIR/atomic/clean.md"
+cp "$FIXTURES_DIR/blocks.md" "$TMP_DIR/atomic/dirty.md"
+chmod 640 "$TMP_DIR/atomic/dirty.md"
+python3 "$ROOT_DIR/scripts/format_markdown.py" "$TMP_DIR/atomic" --no-cache >/dev/null
+if [ "$(stat -c %Y "$TMP_DIR/atomic/clean.md")" = "$(date -d '2001-01-01 00:00' +%s)" ] \
+    && [ "$(stat -c %a "$TMP_DIR/atomic/dirty.md")" = 640 ] \
+    && cmp -s "$TMP_DIR/atomic/clean.md" "$TMP_DIR/atomic/dirty.md" \
+    && [ -z "$(find "$TMP_DIR/atomic" -name '*.tmp')" ]; then
+    echo "OK: unchanged files keep their mtime and rewritten files keep their mode"
+else
+    echo "FAIL: format_markdown.py touched a clean file or lost a file mode" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/atomic"
+
+echo "Testing the backup store:"
+mkdir -p "$TMP_DIR/bk"
+printf '# T\n\n```text\nplain\n```\n' > "$TMP_DIR/bk/orig.md"
+for run in 1 2; do
+    cp "$TMP_DIR/bk/orig.md" "$TMP_DIR/bk/page.md"
+    (cd "$TMP_DIR/bk" && python3 "$ROOT_DIR/scripts/fix_fence_mismatch.py" page.md --apply >/dev/null)
+done
+(cd "$TMP_DIR/bk" && python3 "$ROOT_DIR/scripts/backupstore.py" list page.md > list.out \
+    && python3 "$ROOT_DIR/scripts/backupstore.py" restore page.md >/dev/null)
+if grep -q '^Backups: 1, distinct versions: 1' "$TMP_DIR/bk/list.out" \
+    && [ "$(find "$TMP_DIR/bk/.cache/backups/blobs" -name '*.gz' | wc -l)" = 1 ] \
+    && cmp -s "$TMP_DIR/bk/orig.md" "$TMP_DIR/bk/page.md"; then
+    echo "OK: backing up the same content again adds nothing and restore brings the page back"
+else
+    echo "FAIL: backupstore.py did not deduplicate or restore the backup" >&2
+    exit 2
+fi
+# restore is byte-exact, and processes backing up and pruning at once lose no index entries
+printf '# CRLF\r\n\r\nline\r\n' > "$TMP_DIR/bk/crlf.md"
+cp "$TMP_DIR/bk/crlf.md" "$TMP_DIR/bk/crlf.orig"
+(cd "$TMP_DIR/bk" && python3 - "$ROOT_DIR/scripts" <<'EOF'
+import multiprocessing, sys; sys.path.insert(0, sys.argv[1])
+import atomicio, backupstore
+store = backupstore.BackupStore('store')
+store.add('crlf.md', atomicio.read_bytes('crlf.md'), 'test')
+atomicio.write_text('crlf.md', 'changed\n')
+store.restore(store.find('crlf.md'))
+
+def work(n):
+    for i in range(20):
+        backupstore.BackupStore('store').add(f'page{n}-{i}.md', f'{n} {i}', 'test')
+        backupstore.BackupStore('store').prune()
+
+procs = [multiprocessing.Process(target=work, args=(n,)) for n in range(6)]
+for p in procs:
+    p.start()
+for p in procs:
+    p.join()
+print(len(backupstore.BackupStore('store').entries()), file=open('count.out', 'w'))
+EOF
+)
+if cmp -s "$TMP_DIR/bk/crlf.orig" "$TMP_DIR/bk/crlf.md" && [ "$(cat "$TMP_DIR/bk/count.out")" = 121 ]; then
+    echo "OK: restore is byte-exact and concurrent backups keep every index entry"
+else
+    echo "FAIL: backupstore.py changed the restored bytes or lost index entries ($(cat "$TMP_DIR/bk/count.out"))" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/bk"
+
+echo "Testing --converge:"
+printf '# Title\n\n```\nplain words\n```\n' > "$TMP_DIR/cycle.md"
+CHECKSUM="$(cksum < "$TMP_DIR/cycle.md")"
+if python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/cycle.md" --no-cache --converge --rules fence-lang,fence-mismatch \
+    > "$TMP_DIR/converge.out"; then
+    echo "FAIL: docsfix.py --converge passed on rules that undo each other" >&2
+    exit 2
+fi
+if grep 'rules fence-lang and fence-mismatch undo each other.*line 3' "$TMP_DIR/converge.out" >/dev/null \
+    && [ "$(cksum < "$TMP_DIR/cycle.md")" = "$CHECKSUM" ]; then
+    echo "OK: --converge reports the fighting rules and leaves the file alone"
+else
+    echo "FAIL: docsfix.py --converge did not report the cycle" >&2
+    exit 2
+fi
+cp "$FIXTURES_DIR/blocks.md" "$TMP_DIR/converge.md"
+python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/converge.md" --no-cache --converge >/dev/null \
+    || { echo "docsfix --converge failed"; exit 1; }
+if python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/converge.md" --no-cache --check >/dev/null; then
+    echo "OK: --converge leaves a fixed point"
+else
+    echo "FAIL: docsfix.py --converge output is not a fixed point" >&2
+    exit 2
+fi
+
+echo "Testing --changed-since:"
+mkdir -p "$TMP_DIR/repo"
+cp "$FIXTURES_DIR"/*.md "$TMP_DIR/repo/"
+git -C "$TMP_DIR/repo" init -q
+git -C "$TMP_DIR/repo" add .
+git -C "$TMP_DIR/repo" -c user.name=test -c user.email=test@example.org commit -q -m fixtures
+printf '\nA new line\nunderlined\n----------\n' >> "$TMP_DIR/repo/sample.md"
+python3 "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/repo" --no-cache --check --changed-since HEAD > "$TMP_DIR/changed.out" || true
+if [ "$(grep -c '^Would change' "$TMP_DIR/changed.out")" = 1 ] && grep '^Would change: .*/sample.md' "$TMP_DIR/changed.out" >/dev/null; then
+    echo "OK: --changed-since only selects files changed since the ref"
+else
+    echo "FAIL: docsfix.py --changed-since did not select exactly the changed file" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/repo"
+
+echo "Testing --watch:"
+mkdir -p "$TMP_DIR/watch"
+printf '# Page\n' > "$TMP_DIR/watch/page.md"
+timeout 4 python3 -u "$ROOT_DIR/scripts/docsfix.py" "$TMP_DIR/watch" --watch --poll --no-cache > "$TMP_DIR/watch.out" 2>&1 &
+WATCH_PID=$!
+sleep 1
+printf 'Saved page\n==========\n' > "$TMP_DIR/watch/page.md"
+wait "$WATCH_PID" || true
+# one save, one fix; the watcher's own rewrite must not trigger another run
+if [ "$(grep -c '^Fixed: .*page.md (setext) in [0-9.]* ms$' "$TMP_DIR/watch.out")" = 1 ] \
+    && [ "$(grep -c '^Clean:' "$TMP_DIR/watch.out")" = 0 ] && grep -q '^# Saved page$' "$TMP_DIR/watch/page.md"; then
+    echo "OK: --watch fixes a saved page once and ignores its own write"
+else
+    echo "FAIL: docsfix.py --watch did not fix the saved page exactly once" >&2
+    cat "$TMP_DIR/watch.out" >&2
+    exit 2
+fi
+rm -rf "$TMP_DIR/watch"
+
+echo "Testing the benchmark harness:"
+BENCH=(python3 "$ROOT_DIR/scripts/tests/bench.py" --pages 20 --repeat 1 --only format_markdown,link_scanner)
+"${BENCH[@]}" --no-baseline --json "$TMP_DIR/bench.json" >/dev/null || { echo "bench.py failed"; exit 1; }
+# a baseline no real run can match must be reported as a regression
+sed 's/"files_per_s": [0-9.]*/"files_per_s": 1e9/' "$TMP_DIR/bench.json" > "$TMP_DIR/bench_baseline.json"
+if ! "${BENCH[@]}" --baseline "$TMP_DIR/bench_baseline.json" > "$TMP_DIR/bench.out" \
+    && grep '^REGRESSION: format_markdown' "$TMP_DIR/bench.out" >/dev/null; then
+    echo "OK: bench.py reports regressions against the baseline"
+else
+    echo "FAIL: bench.py did not report a regression" >&2
+    exit 2
+fi
+
 echo "All smoke tests passed. Cleaning up..."
 rm -rf "$TMP_DIR"
 echo "Done"